@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import logging
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from redis.asyncio import Redis
 
@@ -20,11 +20,22 @@ def _as_stream_fields(payload: Dict[str, Any]) -> Dict[str, str]:
     return fields
 
 
+class PublishResult:
+    def __init__(self) -> None:
+        self.ids: List[Optional[str]] = []
+        self.failures: List[Tuple[int, Exception]] = []
+
+    @property
+    def published(self) -> int:
+        return len(self.ids) - len(self.failures)
+
+
 class FundingPublisher:
     def __init__(self, settings: Any) -> None:
         self._redis_url = getattr(settings, "redis_url", "redis://localhost:6379/0")
         self._stream_key = getattr(settings, "funding_stream_key", "funding:snapshots")
         self._maxlen = getattr(settings, "funding_stream_maxlen", 1000)
+        self._chunk_size = max(1, int(getattr(settings, "funding_publish_chunk_size", 500)))
         self._redis: Optional[Redis] = None
 
     async def connect(self) -> None:
@@ -63,9 +74,30 @@ class FundingPublisher:
         )
         return entry_id
 
-    async def publish_many(self, snapshots: Iterable) -> None:
-        for snapshot in snapshots:
+    async def publish_many(self, snapshots: Iterable) -> PublishResult:
+        if self._redis is None:
+            raise RuntimeError("FundingPublisher not connected")
+        result = PublishResult()
+        batch = list(snapshots)
+        for start in range(0, len(batch), self._chunk_size):
+            chunk = batch[start : start + self._chunk_size]
+            pipe = self._redis.pipeline(transaction=False)
+            for snapshot in chunk:
+                pipe.xadd(
+                    self._stream_key,
+                    _as_stream_fields(snapshot.model_dump()),
+                    maxlen=self._maxlen,
+                    approximate=True,
+                )
             try:
-                await self.publish(snapshot)
+                replies = await pipe.execute(raise_on_error=False)
             except Exception as exc:
-                logger.exception("Publish snapshot failed: %s", exc)
+                logger.exception("Publish snapshot chunk failed: %s", exc)
+                replies = [exc] * len(chunk)
+            for offset, reply in enumerate(replies):
+                if isinstance(reply, Exception):
+                    result.ids.append(None)
+                    result.failures.append((start + offset, reply))
+                else:
+                    result.ids.append(reply)
+        return result
@@ -2,10 +2,29 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
-from typing import Any, Dict, Iterable, Optional, Union, Callable, Awaitable
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union, Callable, Awaitable
 
 from redis.asyncio import Redis
 
+from libs.models import FundingSnapshot, PriceTick
+
+from .codec import (
+    CODECS,
+    COMPACT_FIELD,
+    FundingFrame,
+    decode_funding,
+    decode_funding_entry,
+    decode_funding_frame,
+    decode_opportunity,
+    decode_price,
+    encode_funding,
+    encode_funding_frame,
+    encode_opportunity,
+    encode_price,
+    is_funding_frame,
+)
+from .retention import StreamRetention, stream_stats
 
 logger = logging.getLogger("bus")
 
@@ -26,6 +45,49 @@ def _as_stream_fields(payload: Dict[str, Any]) -> Dict[str, str]:
     return fields
 
 
+def frame_seq_key(stream_key: str, exchange: str) -> str:
+    return f"{stream_key}:seq:{exchange}"
+
+
+def latest_index_key(stream_key: str, exchange: str) -> str:
+    """最新值索引：每个交易所一个哈希，field 为合约，value 为该合约最新一条消息。"""
+    return f"{stream_key}:latest:{exchange}"
+
+
+def _latest_value(fields: Dict[str, Any]) -> Union[bytes, str]:
+    # compact 直接存二进制 payload，text 存字段的 JSON；两者首字节不同（版本号 / "{"）
+    payload = fields.get(COMPACT_FIELD)
+    if payload is not None:
+        return payload
+    return json.dumps(fields, separators=(",", ":"))
+
+
+def _decode_latest(value: Union[bytes, str]) -> FundingSnapshot:
+    if isinstance(value, str):
+        return decode_funding(json.loads(value))
+    if value[:1] == b"{":
+        return decode_funding(json.loads(value))
+    return decode_funding({COMPACT_FIELD: value})
+
+
+def _decode_latest_price(value: Union[bytes, str]) -> PriceTick:
+    if isinstance(value, str) or value[:1] == b"{":
+        return decode_price(json.loads(value))
+    return decode_price({COMPACT_FIELD: value})
+
+
+class PublishResult:
+    """批量发布结果：ids 与输入顺序一一对应，失败位置为 None，failures 记录 (下标, 异常)。"""
+
+    def __init__(self) -> None:
+        self.ids: List[Optional[str]] = []
+        self.failures: List[Tuple[int, Exception]] = []
+
+    @property
+    def published(self) -> int:
+        return len(self.ids) - len(self.failures)
+
+
 class FundingPublisher:
     """把资金费率快照写入 Redis Stream 的发布器。"""
 
@@ -33,7 +95,18 @@ class FundingPublisher:
         self._redis_url = getattr(settings, "redis_url", "redis://localhost:6379/0")
         # 默认改为与其余服务一致的命名，避免订阅端取不到数据
         self._stream_key = getattr(settings, "funding_stream_key", "funding_snapshots")
-        self._maxlen = getattr(settings, "funding_stream_maxlen", 1000)
+        self._retention = StreamRetention.from_settings(settings, "funding_stream", max_memory_mb=256.0)
+        self._chunk_size = max(1, int(getattr(settings, "funding_publish_chunk_size", 500)))
+        self._latest_index = bool(getattr(settings, "funding_latest_index_enabled", True))
+        # symbol：每个合约一条（兼容旧消费者）；frame：每个交易所一轮一条列式消息
+        self._format = str(getattr(settings, "funding_publish_format", "symbol")).lower()
+        if self._format not in ("symbol", "frame"):
+            logger.warning("unknown funding_publish_format %r, fallback to symbol", self._format)
+            self._format = "symbol"
+        self._codec = str(getattr(settings, "bus_codec", "text")).lower()
+        if self._codec not in CODECS:
+            logger.warning("unknown bus_codec %r, fallback to text", self._codec)
+            self._codec = "text"
         self._redis: Optional[Redis] = None
 
     async def connect(self) -> None:
@@ -59,31 +132,314 @@ class FundingPublisher:
         """写入单条快照，返回 Redis Stream 生成的 entry id。"""
         if self._redis is None:
             raise RuntimeError("FundingPublisher not connected")
-        payload = snapshot.model_dump()
-        # 这些派生字段在消费者端很常用，直接落到 stream 里减少重复计算
-        payload["rate8h"] = snapshot.rate8h
-        payload["settle_countdown_secs"] = snapshot.settle_countdown_secs
-        fields = _as_stream_fields(payload)
-        entry_id = await self._redis.xadd(
-            self._stream_key,
-            fields,
-            maxlen=self._maxlen,
-            approximate=True,
-        )
+        fields = self._snapshot_fields(snapshot)
+        if self._latest_index:
+            pipe = self._redis.pipeline(transaction=True)
+            pipe.xadd(self._stream_key, fields, **self._retention.xadd_kwargs())
+            pipe.hset(latest_index_key(self._stream_key, snapshot.exchange), snapshot.symbol, _latest_value(fields))
+            entry_id = (await pipe.execute())[0]
+        else:
+            entry_id = await self._redis.xadd(self._stream_key, fields, **self._retention.xadd_kwargs())
         logger.debug(
             "Published funding snapshot exchange=%s symbol=%s entry=%s",
-            payload.get("exchange"),
-            payload.get("symbol"),
+            snapshot.exchange,
+            snapshot.symbol,
             entry_id,
         )
+        await self._enforce_memory()
         return entry_id
 
-    async def publish_many(self, snapshots: Iterable) -> None:
+    async def publish_many(self, snapshots: Iterable) -> PublishResult:
+        """按 chunk 走 Redis pipeline 批量 XADD，一个 chunk 只需一次网络往返。
+
+        开启最新值索引时 chunk 以 MULTI/EXEC 提交，stream 与索引同时可见；
+        索引每个交易所一条 HSET，放在 XADD 之后，回复里只取前 len(chunk) 个。
+        frame 格式下每个交易所只写一条列式消息，ids 里同一交易所的快照共享该条的 id。
+        """
+        if self._redis is None:
+            raise RuntimeError("FundingPublisher not connected")
+        batch = list(snapshots)
+        if self._format == "frame":
+            return await self._publish_frames(batch)
+        result = PublishResult()
+        for start in range(0, len(batch), self._chunk_size):
+            chunk = batch[start : start + self._chunk_size]
+            pipe = self._redis.pipeline(transaction=self._latest_index)
+            latest: Dict[str, Dict[str, Union[bytes, str]]] = {}
+            trim = self._retention.xadd_kwargs()
+            for snapshot in chunk:
+                fields = self._snapshot_fields(snapshot)
+                pipe.xadd(self._stream_key, fields, **trim)
+                if self._latest_index:
+                    latest.setdefault(snapshot.exchange, {})[snapshot.symbol] = _latest_value(fields)
+            for exchange, mapping in latest.items():
+                pipe.hset(latest_index_key(self._stream_key, exchange), mapping=mapping)
+            try:
+                replies = (await pipe.execute(raise_on_error=False))[: len(chunk)]
+            except Exception as exc:
+                # 连接级错误（或事务被拒绝）：整个 chunk 都算失败
+                logger.exception("Publish snapshot chunk failed: %s", exc)
+                replies = [exc] * len(chunk)
+            for offset, reply in enumerate(replies):
+                if isinstance(reply, Exception):
+                    result.ids.append(None)
+                    result.failures.append((start + offset, reply))
+                else:
+                    result.ids.append(reply)
+        if result.failures:
+            logger.warning(
+                "Published %d/%d funding snapshots, %d failed (first error: %s)",
+                result.published,
+                len(batch),
+                len(result.failures),
+                result.failures[0][1],
+            )
+        await self._enforce_memory()
+        return result
+
+    async def _publish_frames(self, batch: List) -> PublishResult:
+        result = PublishResult()
+        result.ids = [None] * len(batch)
+        positions: Dict[str, List[int]] = {}
+        for position, snapshot in enumerate(batch):
+            positions.setdefault(snapshot.exchange, []).append(position)
+        exchanges = list(positions)
+        if not exchanges:
+            return result
+        try:
+            # 轮次序号放在 Redis 里，重启或多个分片 worker 之间也保持递增
+            pipe = self._redis.pipeline(transaction=False)
+            for exchange in exchanges:
+                pipe.incr(frame_seq_key(self._stream_key, exchange))
+            seqs = await pipe.execute()
+            pipe = self._redis.pipeline(transaction=self._latest_index)
+            trim = self._retention.xadd_kwargs()
+            for exchange, seq in zip(exchanges, seqs):
+                group = [batch[position] for position in positions[exchange]]
+                pipe.xadd(self._stream_key, encode_funding_frame(exchange, seq, group), **trim)
+            if self._latest_index:
+                for exchange in exchanges:
+                    mapping = {
+                        batch[position].symbol: _latest_value(self._snapshot_fields(batch[position]))
+                        for position in positions[exchange]
+                    }
+                    pipe.hset(latest_index_key(self._stream_key, exchange), mapping=mapping)
+            replies = (await pipe.execute(raise_on_error=False))[: len(exchanges)]
+        except Exception as exc:
+            logger.exception("Publish funding frames failed: %s", exc)
+            replies = [exc] * len(exchanges)
+        for exchange, reply in zip(exchanges, replies):
+            for position in positions[exchange]:
+                if isinstance(reply, Exception):
+                    result.failures.append((position, reply))
+                else:
+                    result.ids[position] = reply
+        if result.failures:
+            result.failures.sort(key=lambda failure: failure[0])
+            logger.warning(
+                "Published %d/%d funding snapshots as frames, %d failed (first error: %s)",
+                result.published,
+                len(batch),
+                len(result.failures),
+                result.failures[0][1],
+            )
+        await self._enforce_memory()
+        return result
+
+    async def _enforce_memory(self) -> None:
+        try:
+            await self._retention.enforce_memory(self._redis, self._stream_key)
+        except Exception as exc:
+            logger.warning("check funding stream memory failed: %s", exc)
+
+    async def stream_stats(self) -> Dict[str, Any]:
+        """stream 长度、内存占用、最旧消息年龄与保留策略。"""
+        if self._redis is None:
+            raise RuntimeError("FundingPublisher not connected")
+        return await stream_stats(self._redis, self._stream_key, self._retention)
+
+    async def refresh_latest(self, snapshots: Iterable) -> None:
+        """只更新最新值索引、不写 stream：DeltaFilter 压掉的快照没有实质变化，但 captured_at 要跟着刷新，
+        否则读索引的一方会把仍在正常抓取的合约当成过期数据。每个交易所一条 HSET。"""
+        if self._redis is None or not self._latest_index:
+            return
+        latest: Dict[str, Dict[str, Union[bytes, str]]] = {}
         for snapshot in snapshots:
+            latest.setdefault(snapshot.exchange, {})[snapshot.symbol] = _latest_value(self._snapshot_fields(snapshot))
+        if not latest:
+            return
+        pipe = self._redis.pipeline(transaction=False)
+        for exchange, mapping in latest.items():
+            pipe.hset(latest_index_key(self._stream_key, exchange), mapping=mapping)
+        await pipe.execute()
+
+    async def remove_latest(self, exchange: str, symbols: Iterable[str]) -> int:
+        """已下架或放弃重试的合约从最新值索引里删除，避免消费端一直读到旧值。"""
+        symbols = list(symbols)
+        if self._redis is None or not self._latest_index or not symbols:
+            return 0
+        return await self._redis.hdel(latest_index_key(self._stream_key, exchange), *symbols)
+
+    def _snapshot_fields(self, snapshot) -> Dict[str, Any]:
+        if self._codec == "compact":
+            return encode_funding(snapshot)
+        payload = snapshot.model_dump()
+        # 这些派生字段在消费者端很常用，直接落到 stream 里减少重复计算
+        payload["rate8h"] = snapshot.rate8h
+        payload["settle_countdown_secs"] = snapshot.settle_countdown_secs
+        return _as_stream_fields(payload)
+
+
+async def get_latest(
+    redis: Redis,
+    pairs: Iterable[Tuple[str, str]],
+    *,
+    stream_key: str = "funding_snapshots",
+    max_age_secs: Optional[float] = None,
+) -> Dict[Tuple[str, str], FundingSnapshot]:
+    """按 (exchange, symbol) 从最新值索引批量取快照：每个交易所一次 HMGET，合并为一次往返。
+
+    compact 编码的值是二进制，需要 decode_responses=False 的连接（与读 stream 相同）。
+    索引里没有的合约不出现在结果里；超过 max_age_secs 的也不返回。
+    """
+    return await _hmget_latest(redis, pairs, stream_key, _decode_latest, max_age_secs)
+
+
+async def _hmget_latest(
+    redis: Redis,
+    pairs: Iterable[Tuple[str, str]],
+    stream_key: str,
+    decode: Callable[[Union[bytes, str]], Any],
+    max_age_secs: Optional[float],
+) -> Dict[Tuple[str, str], Any]:
+    by_exchange: Dict[str, List[str]] = {}
+    for exchange, symbol in set(pairs):
+        by_exchange.setdefault(exchange, []).append(symbol)
+    if not by_exchange:
+        return {}
+    oldest_ms = None if max_age_secs is None else int((time.time() - max_age_secs) * 1000)
+    pipe = redis.pipeline(transaction=False)
+    for exchange, symbols in by_exchange.items():
+        pipe.hmget(latest_index_key(stream_key, exchange), symbols)
+    latest: Dict[Tuple[str, str], Any] = {}
+    for (exchange, symbols), values in zip(by_exchange.items(), await pipe.execute()):
+        for symbol, value in zip(symbols, values):
+            if value is None:
+                continue
             try:
-                await self.publish(snapshot)
+                item = decode(value)
             except Exception as exc:
-                logger.exception("Publish snapshot failed: %s", exc)
+                logger.warning("parse latest value failed %s %s/%s: %s", stream_key, exchange, symbol, exc)
+                continue
+            if oldest_ms is not None and item.captured_at_ms < oldest_ms:
+                continue
+            latest[(exchange, symbol)] = item
+    return latest
+
+
+async def load_latest(
+    redis: Redis,
+    *,
+    stream_key: str = "funding_snapshots",
+    exchanges: Optional[Iterable[str]] = None,
+) -> Dict[str, Dict[str, FundingSnapshot]]:
+    """读出最新值索引的全部内容（exchange -> symbol -> 快照），供消费者启动时预热，不必回放 stream。
+
+    exchanges 为空时按 {stream_key}:latest:* 扫描出所有交易所。
+    """
+    prefix = latest_index_key(stream_key, "")
+    if exchanges is None:
+        names = set()
+        async for key in redis.scan_iter(match=f"{prefix}*", count=100):
+            key = key.decode() if isinstance(key, bytes) else key
+            names.add(key[len(prefix) :])
+        exchanges = sorted(names)
+    exchanges = list(exchanges)
+    if not exchanges:
+        return {}
+    pipe = redis.pipeline(transaction=False)
+    for exchange in exchanges:
+        pipe.hgetall(latest_index_key(stream_key, exchange))
+    latest: Dict[str, Dict[str, FundingSnapshot]] = {}
+    for exchange, values in zip(exchanges, await pipe.execute()):
+        table = latest.setdefault(exchange, {})
+        for symbol, value in values.items():
+            symbol = symbol.decode() if isinstance(symbol, bytes) else symbol
+            try:
+                table[symbol] = _decode_latest(value)
+            except Exception as exc:
+                logger.warning("parse latest snapshot failed %s/%s: %s", exchange, symbol, exc)
+    return latest
+
+
+# ---------------------------------------------------------------------------
+# Price publisher（持仓合约的标记/指数价，独立于资金费率的高频 stream）
+# ---------------------------------------------------------------------------
+class PricePublisher:
+    """把价格 tick 批量写入 Redis Stream；与 FundingPublisher 共用 bus_codec。"""
+
+    def __init__(self, settings: Any) -> None:
+        self._redis_url = getattr(settings, "redis_url", "redis://localhost:6379/0")
+        self._stream_key = getattr(settings, "price_stream_key", "price_ticks")
+        self._retention = StreamRetention.from_settings(
+            settings, "price_stream", retention_secs=300.0, max_memory_mb=64.0, maxlen=5000
+        )
+        self._codec = str(getattr(settings, "bus_codec", "text")).lower()
+        if self._codec not in CODECS:
+            self._codec = "text"
+        self._redis: Optional[Redis] = None
+
+    async def connect(self) -> None:
+        if self._redis is None:
+            self._redis = Redis.from_url(self._redis_url, decode_responses=True, encoding="utf-8")
+            logger.info("PricePublisher connected (redis=%s stream=%s)", self._redis_url, self._stream_key)
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    async def publish_many(self, ticks: Iterable[PriceTick]) -> List[str]:
+        """XADD 与最新值索引（每个交易所一条 HSET）在同一个 MULTI 里提交，读最新价时按合约 HMGET，不扫 stream。"""
+        if self._redis is None:
+            raise RuntimeError("PricePublisher not connected")
+        ticks = list(ticks)
+        if not ticks:
+            return []
+        pipe = self._redis.pipeline(transaction=True)
+        trim = self._retention.xadd_kwargs()
+        latest: Dict[str, Dict[str, Union[bytes, str]]] = {}
+        for tick in ticks:
+            fields = encode_price(tick) if self._codec == "compact" else tick.to_stream_fields()
+            pipe.xadd(self._stream_key, fields, **trim)
+            latest.setdefault(tick.exchange, {})[tick.symbol] = _latest_value(fields)
+        for exchange, mapping in latest.items():
+            pipe.hset(latest_index_key(self._stream_key, exchange), mapping=mapping)
+        ids = (await pipe.execute())[: len(ticks)]
+        try:
+            await self._retention.enforce_memory(self._redis, self._stream_key)
+        except Exception as exc:
+            logger.warning("check price stream memory failed: %s", exc)
+        return ids
+
+    async def stream_stats(self) -> Dict[str, Any]:
+        if self._redis is None:
+            raise RuntimeError("PricePublisher not connected")
+        return await stream_stats(self._redis, self._stream_key, self._retention)
+
+
+async def fetch_latest_prices(
+    redis: Redis,
+    pairs: Iterable[Tuple[str, str]],
+    *,
+    stream_key: str = "price_ticks",
+    max_age_secs: Optional[float] = None,
+) -> Dict[Tuple[str, str], PriceTick]:
+    """按 (exchange, symbol) 从价格最新值索引批量取 tick（每个交易所一次 HMGET）；超过 max_age_secs 的不返回。
+
+    与 get_latest 一样，compact 编码需要 decode_responses=False 的连接。
+    """
+    return await _hmget_latest(redis, pairs, stream_key, _decode_latest_price, max_age_secs)
 
 
 # ---------------------------------------------------------------------------
@@ -224,7 +580,26 @@ from .opportunity_publisher import OpportunityPublisher
 
 __all__ = [
     "FundingPublisher",
+    "PricePublisher",
+    "PublishResult",
+    "StreamRetention",
     "ConfigNotifier",
     "ConfigSubscriber",
     "OpportunityPublisher",
+    "FundingFrame",
+    "decode_funding",
+    "decode_funding_entry",
+    "decode_funding_frame",
+    "decode_opportunity",
+    "decode_price",
+    "encode_funding",
+    "encode_funding_frame",
+    "is_funding_frame",
+    "encode_opportunity",
+    "encode_price",
+    "fetch_latest_prices",
+    "get_latest",
+    "latest_index_key",
+    "load_latest",
+    "stream_stats",
 ]
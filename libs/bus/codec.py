@@ -0,0 +1,396 @@
+"""总线消息编解码。
+
+text：每个字段一个字符串（旧格式，默认）。
+compact：单字段 ``p`` 存放定长 struct + 短字符串，首字节为版本号；消费端以 bytes 模式读取，
+同时兼容旧的字符串格式，方便灰度切换。
+frame：单字段 ``f`` 存放一个交易所一轮刷新的全部快照，按列存放（合约、费率、周期、时间、价格），
+列数据用 zlib 压缩，带每个交易所递增的轮次序号；消费端可以直接按列处理，不必逐条构造快照。
+"""
+from __future__ import annotations
+
+import math
+import struct
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from libs.models import FundingSnapshot, Opportunity, PriceTick
+
+CODECS = ("text", "compact")
+COMPACT_FIELD = "p"
+FRAME_FIELD = "f"
+COMPACT_VERSION = 1
+
+KIND_FUNDING = 1
+KIND_OPPORTUNITY = 2
+KIND_PRICE = 3
+KIND_FUNDING_FRAME = 4
+
+_HEADER = struct.Struct("<BB")
+# flags, funding_rate_raw, settle_interval_hours, next_funding_time_ms, captured_at_ms, mark_price, index_price
+_FUNDING = struct.Struct("<BdHqqdd")
+# funding_diff, expected_rate8h, created_at (epoch 微秒)
+_OPPORTUNITY = struct.Struct("<ddq")
+# flags, captured_at_ms, mark_price, index_price
+_PRICE = struct.Struct("<Bqdd")
+# flags, seq, count
+_FRAME = struct.Struct("<BqI")
+
+_FRAME_COMPRESSED = 1
+# 小于这个字节数的帧不压缩，zlib 头尾反而更大
+_FRAME_COMPRESS_MIN = 256
+
+_FLAG_MARK = 1
+_FLAG_INDEX = 2
+_FLAG_INSTRUMENT = 4
+
+
+def _pack_str(value: str) -> bytes:
+    raw = value.encode("utf-8")
+    if len(raw) > 255:
+        raise ValueError(f"string too long for compact codec: {value[:32]}...")
+    return bytes((len(raw),)) + raw
+
+
+def _unpack_str(buf: bytes, offset: int) -> Tuple[str, int]:
+    length = buf[offset]
+    start = offset + 1
+    end = start + length
+    return buf[start:end].decode("utf-8"), end
+
+
+def _text(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, (bytes, bytearray)) else str(value)
+
+
+def _compact_payload(fields: Mapping) -> Optional[bytes]:
+    payload = fields.get(COMPACT_FIELD)
+    if payload is None:
+        payload = fields.get(COMPACT_FIELD.encode())
+    if payload is None:
+        return None
+    if isinstance(payload, str):
+        # decode_responses=True 的客户端读不了二进制，这里给出明确错误
+        raise ValueError("compact entry must be read with decode_responses=False")
+    return payload
+
+
+def _text_fields(fields: Mapping) -> Dict[str, str]:
+    return {_text(key): _text(value) for key, value in fields.items()}
+
+
+def _check_header(buf: bytes, kind: int) -> int:
+    version, found_kind = _HEADER.unpack_from(buf, 0)
+    if version != COMPACT_VERSION:
+        raise ValueError(f"unsupported compact codec version {version}")
+    if found_kind != kind:
+        raise ValueError(f"unexpected compact message kind {found_kind}, want {kind}")
+    return _HEADER.size
+
+
+# ---------------------------------------------------------------------------
+# FundingSnapshot
+# ---------------------------------------------------------------------------
+def encode_funding(snapshot: FundingSnapshot) -> Dict[str, bytes]:
+    flags = 0
+    if snapshot.mark_price is not None:
+        flags |= _FLAG_MARK
+    if snapshot.index_price is not None:
+        flags |= _FLAG_INDEX
+    if snapshot.instrument and snapshot.instrument != snapshot.symbol:
+        flags |= _FLAG_INSTRUMENT
+    body = _HEADER.pack(COMPACT_VERSION, KIND_FUNDING) + _FUNDING.pack(
+        flags,
+        snapshot.funding_rate_raw,
+        int(snapshot.settle_interval_hours),
+        snapshot.next_funding_time_ms,
+        snapshot.captured_at_ms,
+        snapshot.mark_price or 0.0,
+        snapshot.index_price or 0.0,
+    )
+    body += _pack_str(snapshot.exchange) + _pack_str(snapshot.symbol)
+    if flags & _FLAG_INSTRUMENT:
+        body += _pack_str(snapshot.instrument or "")
+    return {COMPACT_FIELD: body}
+
+
+def decode_funding(fields: Mapping) -> FundingSnapshot:
+    """兼容 compact / 旧字符串格式，key 和 value 可以是 str 或 bytes。"""
+    payload = _compact_payload(fields)
+    if payload is None:
+        return FundingSnapshot.from_stream(_text_fields(fields))
+
+    offset = _check_header(payload, KIND_FUNDING)
+    flags, rate, interval, next_ms, captured_ms, mark, index = _FUNDING.unpack_from(payload, offset)
+    offset += _FUNDING.size
+    exchange, offset = _unpack_str(payload, offset)
+    symbol, offset = _unpack_str(payload, offset)
+    instrument = symbol
+    if flags & _FLAG_INSTRUMENT:
+        instrument, offset = _unpack_str(payload, offset)
+    # pydantic v2 的校验在 Rust 侧完成，比 model_construct 还快，直接走构造函数
+    return FundingSnapshot(
+        exchange=exchange,
+        symbol=symbol,
+        funding_rate_raw=rate,
+        settle_interval_hours=interval,
+        next_funding_time_ms=next_ms,
+        instrument=instrument,
+        mark_price=mark if flags & _FLAG_MARK else None,
+        index_price=index if flags & _FLAG_INDEX else None,
+        captured_at_ms=captured_ms,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Opportunity
+# ---------------------------------------------------------------------------
+def encode_opportunity(opportunity: Opportunity) -> Dict[str, bytes]:
+    created_at = opportunity.created_at
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    created_us = int(created_at.timestamp() * 1_000_000)
+    body = _HEADER.pack(COMPACT_VERSION, KIND_OPPORTUNITY) + _OPPORTUNITY.pack(
+        opportunity.funding_diff,
+        opportunity.expected_rate8h,
+        created_us,
+    )
+    for value in (
+        opportunity.group_id,
+        opportunity.symbol,
+        opportunity.long_exchange,
+        opportunity.short_exchange,
+    ):
+        body += _pack_str(value)
+    return {COMPACT_FIELD: body}
+
+
+def decode_opportunity(fields: Mapping) -> Opportunity:
+    payload = _compact_payload(fields)
+    if payload is None:
+        return Opportunity.from_stream(_text_fields(fields))
+
+    offset = _check_header(payload, KIND_OPPORTUNITY)
+    funding_diff, expected_rate8h, created_us = _OPPORTUNITY.unpack_from(payload, offset)
+    offset += _OPPORTUNITY.size
+    group_id, offset = _unpack_str(payload, offset)
+    symbol, offset = _unpack_str(payload, offset)
+    long_exchange, offset = _unpack_str(payload, offset)
+    short_exchange, offset = _unpack_str(payload, offset)
+    return Opportunity(
+        group_id=group_id,
+        symbol=symbol,
+        long_exchange=long_exchange,
+        short_exchange=short_exchange,
+        funding_diff=funding_diff,
+        expected_rate8h=expected_rate8h,
+        created_at=datetime.fromtimestamp(created_us / 1_000_000, tz=timezone.utc),
+    )
+
+
+# ---------------------------------------------------------------------------
+# PriceTick
+# ---------------------------------------------------------------------------
+def encode_price(tick: PriceTick) -> Dict[str, bytes]:
+    flags = 0
+    if tick.mark_price is not None:
+        flags |= _FLAG_MARK
+    if tick.index_price is not None:
+        flags |= _FLAG_INDEX
+    if tick.instrument and tick.instrument != tick.symbol:
+        flags |= _FLAG_INSTRUMENT
+    body = _HEADER.pack(COMPACT_VERSION, KIND_PRICE) + _PRICE.pack(
+        flags,
+        tick.captured_at_ms,
+        tick.mark_price or 0.0,
+        tick.index_price or 0.0,
+    )
+    body += _pack_str(tick.exchange) + _pack_str(tick.symbol)
+    if flags & _FLAG_INSTRUMENT:
+        body += _pack_str(tick.instrument or "")
+    return {COMPACT_FIELD: body}
+
+
+def decode_price(fields: Mapping) -> PriceTick:
+    payload = _compact_payload(fields)
+    if payload is None:
+        return PriceTick.from_stream(_text_fields(fields))
+
+    offset = _check_header(payload, KIND_PRICE)
+    flags, captured_ms, mark, index = _PRICE.unpack_from(payload, offset)
+    offset += _PRICE.size
+    exchange, offset = _unpack_str(payload, offset)
+    symbol, offset = _unpack_str(payload, offset)
+    instrument = symbol
+    if flags & _FLAG_INSTRUMENT:
+        instrument, offset = _unpack_str(payload, offset)
+    return PriceTick(
+        exchange=exchange,
+        symbol=symbol,
+        instrument=instrument,
+        mark_price=mark if flags & _FLAG_MARK else None,
+        index_price=index if flags & _FLAG_INDEX else None,
+        captured_at_ms=captured_ms,
+    )
+
+
+# ---------------------------------------------------------------------------
+# FundingFrame：一个交易所一轮刷新的列式消息
+# ---------------------------------------------------------------------------
+class FundingFrame:
+    """按列解码后的一帧；价格缺失为 NaN，instruments 与 symbols 相同时为空字符串。"""
+
+    __slots__ = (
+        "exchange",
+        "seq",
+        "symbols",
+        "instruments",
+        "funding_rate_raw",
+        "settle_interval_hours",
+        "next_funding_time_ms",
+        "captured_at_ms",
+        "mark_price",
+        "index_price",
+    )
+
+    def __init__(
+        self,
+        exchange: str,
+        seq: int,
+        symbols: Sequence[str],
+        instruments: Sequence[str],
+        funding_rate_raw: Sequence[float],
+        settle_interval_hours: Sequence[int],
+        next_funding_time_ms: Sequence[int],
+        captured_at_ms: Sequence[int],
+        mark_price: Sequence[float],
+        index_price: Sequence[float],
+    ) -> None:
+        self.exchange = exchange
+        self.seq = seq
+        self.symbols = symbols
+        self.instruments = instruments
+        self.funding_rate_raw = funding_rate_raw
+        self.settle_interval_hours = settle_interval_hours
+        self.next_funding_time_ms = next_funding_time_ms
+        self.captured_at_ms = captured_at_ms
+        self.mark_price = mark_price
+        self.index_price = index_price
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def snapshots(self) -> List[FundingSnapshot]:
+        result = []
+        for i, symbol in enumerate(self.symbols):
+            mark = self.mark_price[i]
+            index = self.index_price[i]
+            result.append(
+                FundingSnapshot(
+                    exchange=self.exchange,
+                    symbol=symbol,
+                    funding_rate_raw=self.funding_rate_raw[i],
+                    settle_interval_hours=self.settle_interval_hours[i],
+                    next_funding_time_ms=self.next_funding_time_ms[i],
+                    instrument=self.instruments[i] or symbol,
+                    mark_price=None if math.isnan(mark) else mark,
+                    index_price=None if math.isnan(index) else index,
+                    captured_at_ms=self.captured_at_ms[i],
+                )
+            )
+        return result
+
+
+def _nan(value: Optional[float]) -> float:
+    return math.nan if value is None else value
+
+
+def _pack_lines(values: Sequence[str]) -> bytes:
+    raw = "\n".join(values).encode("utf-8")
+    return struct.pack("<I", len(raw)) + raw
+
+
+def _unpack_lines(buf: bytes, offset: int, count: int) -> Tuple[List[str], int]:
+    (length,) = struct.unpack_from("<I", buf, offset)
+    start = offset + 4
+    end = start + length
+    values = buf[start:end].decode("utf-8").split("\n") if count else []
+    return values, end
+
+
+def encode_funding_frame(exchange: str, seq: int, snapshots: Sequence[FundingSnapshot]) -> Dict[str, bytes]:
+    """同一交易所的快照编码成一帧；snapshots 的 exchange 必须都等于 exchange。"""
+    count = len(snapshots)
+    columns = b"".join(
+        (
+            _pack_str(exchange),
+            struct.pack(f"<{count}d", *(snapshot.funding_rate_raw for snapshot in snapshots)),
+            struct.pack(f"<{count}H", *(int(snapshot.settle_interval_hours) for snapshot in snapshots)),
+            struct.pack(f"<{count}q", *(snapshot.next_funding_time_ms for snapshot in snapshots)),
+            struct.pack(f"<{count}q", *(snapshot.captured_at_ms for snapshot in snapshots)),
+            struct.pack(f"<{count}d", *(_nan(snapshot.mark_price) for snapshot in snapshots)),
+            struct.pack(f"<{count}d", *(_nan(snapshot.index_price) for snapshot in snapshots)),
+            _pack_lines([snapshot.symbol for snapshot in snapshots]),
+            _pack_lines(
+                [
+                    snapshot.instrument if snapshot.instrument and snapshot.instrument != snapshot.symbol else ""
+                    for snapshot in snapshots
+                ]
+            ),
+        )
+    )
+    flags = 0
+    if len(columns) >= _FRAME_COMPRESS_MIN:
+        columns = zlib.compress(columns, 1)
+        flags |= _FRAME_COMPRESSED
+    body = _HEADER.pack(COMPACT_VERSION, KIND_FUNDING_FRAME) + _FRAME.pack(flags, seq, count) + columns
+    return {FRAME_FIELD: body}
+
+
+def _frame_payload(fields: Mapping) -> Optional[bytes]:
+    payload = fields.get(FRAME_FIELD)
+    if payload is None:
+        payload = fields.get(FRAME_FIELD.encode())
+    if payload is None:
+        return None
+    if isinstance(payload, str):
+        raise ValueError("frame entry must be read with decode_responses=False")
+    return payload
+
+
+def is_funding_frame(fields: Mapping) -> bool:
+    return FRAME_FIELD in fields or FRAME_FIELD.encode() in fields
+
+
+def decode_funding_frame(fields: Mapping) -> FundingFrame:
+    payload = _frame_payload(fields)
+    if payload is None:
+        raise ValueError("not a funding frame entry")
+    offset = _check_header(payload, KIND_FUNDING_FRAME)
+    flags, seq, count = _FRAME.unpack_from(payload, offset)
+    columns = payload[offset + _FRAME.size :]
+    if flags & _FRAME_COMPRESSED:
+        columns = zlib.decompress(columns)
+    exchange, offset = _unpack_str(columns, 0)
+    rates = struct.unpack_from(f"<{count}d", columns, offset)
+    offset += 8 * count
+    intervals = struct.unpack_from(f"<{count}H", columns, offset)
+    offset += 2 * count
+    next_ms = struct.unpack_from(f"<{count}q", columns, offset)
+    offset += 8 * count
+    captured_ms = struct.unpack_from(f"<{count}q", columns, offset)
+    offset += 8 * count
+    marks = struct.unpack_from(f"<{count}d", columns, offset)
+    offset += 8 * count
+    indexes = struct.unpack_from(f"<{count}d", columns, offset)
+    offset += 8 * count
+    symbols, offset = _unpack_lines(columns, offset, count)
+    instruments, offset = _unpack_lines(columns, offset, count)
+    return FundingFrame(exchange, seq, symbols, instruments, rates, intervals, next_ms, captured_ms, marks, indexes)
+
+
+def decode_funding_entry(fields: Mapping) -> List[FundingSnapshot]:
+    """资金费率 stream 的一条消息解成快照列表：帧展开为多条，逐合约格式（text / compact）为一条。"""
+    if is_funding_frame(fields):
+        return decode_funding_frame(fields).snapshots()
+    return [decode_funding(fields)]
@@ -1,22 +1,36 @@
+from typing import Any, Dict, Optional
+
 from redis.asyncio import Redis
 
 from libs.models import Opportunity
 
+from .codec import encode_opportunity
+from .retention import StreamRetention, stream_stats
+
 
 class OpportunityPublisher:
     STREAM_KEY = "funding_opportunities"
 
-    def __init__(self, redis_url: str):
+    def __init__(self, redis_url: str, codec: str = "text", retention: Optional[StreamRetention] = None):
         self._client = Redis.from_url(redis_url, decode_responses=True)
+        self._codec = codec
+        self._retention = retention or StreamRetention(retention_secs=6 * 3600, max_memory_mb=64.0)
 
     async def publish(self, opportunity: Opportunity) -> str:
+        if self._codec == "compact":
+            fields = encode_opportunity(opportunity)
+        else:
+            fields = opportunity.to_stream_fields()
         entry_id = await self._client.xadd(
             self.STREAM_KEY,
-            opportunity.to_stream_fields(),
-            maxlen=1000,
-            approximate=True,
+            fields,
+            **self._retention.xadd_kwargs(),
         )
+        await self._retention.enforce_memory(self._client, self.STREAM_KEY)
         return entry_id
 
+    async def stream_stats(self) -> Dict[str, Any]:
+        return await stream_stats(self._client, self.STREAM_KEY, self._retention)
+
     async def close(self):
         await self._client.close()
@@ -0,0 +1,151 @@
+"""Redis Stream 的保留策略与状态。
+
+按时间保留：每次 XADD 带 MINID ~（当前时间 - retention_secs），落后不超过这个时长的消费者不会丢消息，
+不再受单轮条数影响（一轮全市场快照就可能超过固定的 maxlen）。
+按内存兜底：每 check_interval_secs 用 MEMORY USAGE 估算一次，超过预算时按平均每条大小 XTRIM MAXLEN ~，
+此时实际保留的时长会短于 retention_secs，计入 memory_trims 并告警。
+retention_secs <= 0 时退回旧的 MAXLEN ~ maxlen。
+"""
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("bus")
+
+
+class StreamRetention:
+    def __init__(
+        self,
+        *,
+        retention_secs: float = 900.0,
+        max_memory_mb: float = 0.0,
+        maxlen: int = 1000,
+        check_interval_secs: float = 10.0,
+    ) -> None:
+        self.retention_secs = float(retention_secs)
+        self.max_memory_bytes = int(float(max_memory_mb) * 1024 * 1024)
+        self.maxlen = max(1, int(maxlen))
+        self.check_interval_secs = max(1.0, float(check_interval_secs))
+        self._last_check = 0.0
+        self.memory_trims = 0
+        self.trimmed_entries = 0
+        self.last_memory_bytes: Optional[int] = None
+
+    @classmethod
+    def from_settings(
+        cls,
+        settings: Any,
+        prefix: str,
+        *,
+        retention_secs: float = 900.0,
+        max_memory_mb: float = 0.0,
+        maxlen: int = 1000,
+    ) -> "StreamRetention":
+        """读取 {prefix}_retention_secs / {prefix}_max_memory_mb / {prefix}_maxlen。"""
+        return cls(
+            retention_secs=getattr(settings, f"{prefix}_retention_secs", retention_secs),
+            max_memory_mb=getattr(settings, f"{prefix}_max_memory_mb", max_memory_mb),
+            maxlen=getattr(settings, f"{prefix}_maxlen", maxlen),
+            check_interval_secs=getattr(settings, "stream_retention_check_secs", 10.0),
+        )
+
+    def xadd_kwargs(self) -> Dict[str, Any]:
+        if self.retention_secs <= 0:
+            return {"maxlen": self.maxlen, "approximate": True}
+        min_ms = int((time.time() - self.retention_secs) * 1000)
+        return {"minid": f"{max(0, min_ms)}-0", "approximate": True}
+
+    async def enforce_memory(self, redis, key: str, *, force: bool = False) -> int:
+        """超过内存预算时按条数裁掉最旧的消息，返回估计删除的条数；未到检查间隔时直接返回 0。"""
+        if self.max_memory_bytes <= 0:
+            return 0
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval_secs:
+            return 0
+        self._last_check = now
+        usage = await redis.memory_usage(key)
+        self.last_memory_bytes = usage
+        if not usage or usage <= self.max_memory_bytes:
+            return 0
+        length = await redis.xlen(key)
+        if not length:
+            return 0
+        # 留 10% 余量，避免每次检查都刚好压线再裁一次
+        keep = max(1, int(length * self.max_memory_bytes / usage * 0.9))
+        trimmed = await redis.xtrim(key, maxlen=keep, approximate=True)
+        self.memory_trims += 1
+        self.trimmed_entries += trimmed
+        oldest = await oldest_entry_age_secs(redis, key)
+        logger.warning(
+            "stream %s over memory budget (%.1f MB > %.1f MB), trimmed %d entries; retained %.0fs < retention %.0fs",
+            key,
+            usage / 1024 / 1024,
+            self.max_memory_bytes / 1024 / 1024,
+            trimmed,
+            oldest or 0.0,
+            self.retention_secs,
+        )
+        return trimmed
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "retention_secs": self.retention_secs,
+            "max_memory_mb": round(self.max_memory_bytes / 1024 / 1024, 1),
+            "maxlen": self.maxlen if self.retention_secs <= 0 else None,
+            "memory_trims": self.memory_trims,
+            "trimmed_entries": self.trimmed_entries,
+        }
+
+
+def _entry_ms(entry_id: Any) -> int:
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode()
+    return int(str(entry_id).split("-", 1)[0])
+
+
+async def oldest_entry_age_secs(redis, key: str) -> Optional[float]:
+    entries = await redis.xrange(key, "-", "+", count=1)
+    if not entries:
+        return None
+    return max(0.0, time.time() - _entry_ms(entries[0][0]) / 1000)
+
+
+async def stream_stats(redis, key: str, retention: Optional[StreamRetention] = None) -> Dict[str, Any]:
+    """长度、内存占用、最旧/最新消息的年龄，以及各消费组的积压（Redis 7+ 才有 lag）。"""
+    pipe = redis.pipeline(transaction=False)
+    pipe.xlen(key)
+    pipe.memory_usage(key)
+    pipe.xrange(key, "-", "+", count=1)
+    pipe.xrevrange(key, "+", "-", count=1)
+    length, memory, first, last = await pipe.execute()
+    now = time.time()
+    stats: Dict[str, Any] = {
+        "key": key,
+        "length": length,
+        "memory_bytes": memory,
+        "oldest_age_secs": round(now - _entry_ms(first[0][0]) / 1000, 1) if first else None,
+        "newest_age_secs": round(now - _entry_ms(last[0][0]) / 1000, 1) if last else None,
+    }
+    groups = []
+    if length:
+        try:
+            for group in await redis.xinfo_groups(key):
+                info = {
+                    (name.decode() if isinstance(name, bytes) else name): value for name, value in group.items()
+                }
+                name = info.get("name")
+                groups.append(
+                    {
+                        "name": name.decode() if isinstance(name, bytes) else name,
+                        "pending": info.get("pending"),
+                        "lag": info.get("lag"),
+                    }
+                )
+        except Exception as exc:
+            logger.debug("xinfo groups %s failed: %s", key, exc)
+    stats["groups"] = groups
+    if retention is not None:
+        stats["retention"] = retention.health()
+    return stats
@@ -39,7 +39,139 @@ class Settings(BaseSettings):
     risk_limits: RiskLimits = RiskLimits()
     telegram_bot_token: str | None = None
     telegram_chat_id: str | None = None
+    # 总线消息编码：text（旧的逐字段字符串）或 compact（单字段二进制，消费端需 bytes 模式读取）
+    bus_codec: str = "text"
 
+    # market-feed 抓取参数
+    # 逗号分隔的交易所列表，为空时启用全部已注册的适配器
+    feed_exchanges: Optional[str] = None
+    # 只抓至少两家交易所都上市的合约（统一符号去掉 1000/1M 等倍数前缀后比较）；overrides 为逗号分隔的监控合约
+    feed_universe_intersection: bool = True
+    feed_universe_overrides: Optional[str] = None
+    funding_refresh_interval_secs: float = 30.0
+    http_timeout_secs: float = 10.0
+    bitget_product_type: str = "USDT-FUTURES"
+    bitget_symbol_limit: Optional[int] = None
+    bitget_concurrency: int = 5
+    bitget_ingest_mode: str = Field("bulk", description="bulk 或 per_symbol")
+    # 每个交易所独立管道；为空时沿用 funding_refresh_interval_secs
+    binance_refresh_interval_secs: Optional[float] = None
+    bitget_refresh_interval_secs: Optional[float] = None
+    binance_fetch_timeout_secs: Optional[float] = None
+    bitget_fetch_timeout_secs: Optional[float] = None
+    binance_error_budget: int = 3
+    bitget_error_budget: int = 3
+    # 每个交易所的最大并发（限速器会在此范围内自适应）；为空时使用适配器默认值，bitget 沿用 bitget_concurrency
+    binance_max_concurrency: Optional[int] = None
+    # 使用交易所公布限额的比例
+    feed_rate_limit_utilization: float = 0.8
+    # 适配器声明支持时启用 HTTP/2（需要 httpx[http2]）；keepalive 应长于轮询间隔，避免每个周期重新握手
+    feed_http2: bool = True
+    feed_keepalive_expiry_secs: float = 90.0
+    # 录制交易所原始响应（gzip JSON Lines，停止时写盘）；或用录制文件回放代替真实请求
+    # replay_speed：1 按录制耗时，0 不等待；faults 形如 "latency=0.05,429=0.02,5xx=0.01,empty=0.01"
+    feed_record_path: Optional[str] = None
+    feed_record_max_responses: int = 5000
+    feed_replay_path: Optional[str] = None
+    feed_replay_speed: float = 1.0
+    feed_replay_faults: Optional[str] = None
+    # 按 endpoint 熔断：最近 window 次里失败率达到阈值（且至少 min_calls 次）即打开，open_secs 后半开探测
+    circuit_breaker_window: int = 20
+    circuit_breaker_min_calls: int = 5
+    circuit_breaker_failure_ratio: float = 0.5
+    circuit_breaker_open_secs: float = 30.0
+    # poll 模式的调度：settlement 按距结算时间分档（hot/warm/cold），fixed 每个间隔全量抓取
+    # warm 档沿用 funding_refresh_interval_secs；每隔 full_refresh_secs 仍做一次全量，发现新合约
+    funding_schedule: str = "settlement"
+    funding_schedule_hot_window_secs: float = 900.0
+    funding_schedule_hot_interval_secs: float = 5.0
+    funding_schedule_warm_window_secs: float = 3600.0
+    funding_schedule_cold_interval_secs: float = 300.0
+    funding_schedule_full_refresh_secs: float = 300.0
+    # 结算时间已过超过 grace_secs（交易所还没给出下一次）或缺失（0）的合约按 warm 档刷新，不再当作 hot
+    funding_schedule_settle_grace_secs: float = 300.0
+    # 有持仓（OPEN 的 PositionGroup）或费率差 >= thresholds.aa - margin 的合约按 hot 档刷新，最多 max_symbols 个（持仓总是入选）
+    funding_priority_enabled: bool = True
+    funding_priority_positions: bool = True
+    funding_priority_refresh_secs: float = 10.0
+    funding_priority_margin: float = 0.0002
+    funding_priority_max_symbols: int = 30
+    # 全量周期里没拿到的合约单独重试：指数退避（base..max 秒，带抖动），连续失败 max_attempts 次后放弃
+    funding_retry_base_secs: float = 1.0
+    funding_retry_max_secs: float = 60.0
+    funding_retry_max_attempts: int = 8
+    # /healthz 里超过这个秒数未更新的合约计为 stale
+    funding_stale_after_secs: float = 600.0
+    # /ws/funding 与 /sse/funding 推送：每 interval 秒合并一次变化发出增量；客户端积压超过 queue_frames 帧即断开
+    feed_push_interval_secs: float = 0.5
+    feed_push_queue_frames: int = 64
+    feed_push_max_clients: int = 1000
+    feed_push_heartbeat_secs: float = 15.0
+    # 多个 market-feed worker 按合约分片：partitions 个分区经 Redis 租约分配给存活的 worker，所有 worker 的 partitions 必须相同
+    # worker_id 为空时用 hostname:pid；worker 崩溃后最多 lease_ttl_secs 秒其分区被接手
+    feed_shard_enabled: bool = False
+    feed_shard_partitions: int = 64
+    feed_shard_lease_ttl_secs: float = 10.0
+    feed_shard_worker_id: Optional[str] = None
+    feed_shard_key_prefix: str = "market_feed:shards"
+    # 持仓合约的标记/指数价单独发布到 price_stream_key，每 interval 秒一次（只在价格变化时发布）
+    # extra_symbols 为逗号分隔的额外合约；持仓列表每 positions_refresh_secs 从数据库重读
+    # 每个合约的最新一条同时写入 {price_stream_key}:latest:{exchange} 哈希，风控与统计按合约 HMGET
+    price_tick_enabled: bool = True
+    price_tick_interval_secs: float = 1.0
+    price_tick_extra_symbols: Optional[str] = None
+    price_tick_positions_refresh_secs: float = 10.0
+    price_stream_key: str = "price_ticks"
+    # 风控与统计只用这个秒数内的价格，更旧时回退到资金费率快照里的价格
+    price_max_age_secs: float = 30.0
+    # poll：定时 REST 轮询；stream：WebSocket 推流 + REST 断线补齐
+    market_feed_mode: str = "poll"
+    stream_flush_interval_secs: float = 1.0
+    stream_backoff_initial_secs: float = 1.0
+    stream_backoff_max_secs: float = 60.0
+    binance_stream_url: Optional[str] = None
+    bitget_stream_url: Optional[str] = None
+    # 合约元数据缓存（保证金币种、结算周期、tick、手续费）
+    contract_cache_path: Optional[str] = None
+    contract_cache_ttl_secs: float = 6 * 3600
+    # 只发布有变化的快照；费率用绝对阈值，价格用相对阈值，每 N 轮强制全量
+    funding_delta_publish: bool = True
+    funding_delta_rate_epsilon: float = 1e-7
+    funding_delta_price_epsilon: float = 1e-4
+    funding_delta_full_refresh_cycles: int = 10
+    # FundingPublisher.publish_many 每个 pipeline 的条数
+    funding_publish_chunk_size: int = 500
+    # symbol：每个合约一条 stream 消息；frame：每个交易所每轮一条压缩的列式消息（带轮次序号，消费端需 bytes 模式读取）
+    funding_publish_format: str = "symbol"
+    # strategy-engine 以消费组读取资金费率 stream：多个实例共享同一组分摊消息，处理完才 ACK；
+    # 空闲超过 claim_idle_secs 的未确认消息（实例崩溃或卡住）由其它实例 XAUTOCLAIM 接手；consumer_name 为空时用 strategy-{hostname}，重启后沿用；
+    # 同一主机跑多个实例时需各自配置 consumer_name
+    strategy_consumer_group: str = "strategy_engine"
+    strategy_consumer_name: Optional[str] = None
+    strategy_claim_idle_secs: float = 30.0
+    strategy_read_count: int = 100
+    # execution_gateway 的消费组：consumer_name 为空时用 executor-{hostname}，重启后沿用；
+    # 推迟或出错的机会空闲 claim_idle_secs 后由 XAUTOCLAIM 重试，投递 max_deliveries 次仍未成功写入死信 stream；
+    # 创建超过 opportunity_ttl_secs 的机会直接丢弃；死信 stream 按 execution_dlq_retention_secs / max_memory_mb 保留
+    execution_consumer_name: Optional[str] = None
+    execution_claim_idle_secs: float = 30.0
+    execution_max_deliveries: int = 5
+    execution_opportunity_ttl_secs: float = 300.0
+    execution_dlq_stream: str = "funding_opportunities:dlq"
+    execution_dlq_retention_secs: float = 7 * 86400.0
+    execution_dlq_max_memory_mb: float = 64.0
+    # 总线 stream 按时间保留（XADD MINID ~ 当前时间 - retention_secs），落后不超过该时长的消费者不丢消息；
+    # max_memory_mb 为内存兜底，超出时按条数裁掉最旧的消息（0 表示不限）；retention_secs <= 0 时退回 MAXLEN ~ maxlen
+    funding_stream_retention_secs: float = 900.0
+    funding_stream_max_memory_mb: float = 256.0
+    price_stream_retention_secs: float = 300.0
+    price_stream_max_memory_mb: float = 64.0
+    opportunity_stream_retention_secs: float = 6 * 3600.0
+    opportunity_stream_max_memory_mb: float = 64.0
+    # 每隔多少秒用 MEMORY USAGE 检查一次内存预算
+    stream_retention_check_secs: float = 10.0
+    # 与 XADD 同一事务维护 {funding_stream_key}:latest:{exchange} 哈希（合约 -> 最新一条），消费端按键 O(1) 取最新值
+    funding_latest_index_enabled: bool = True
 
     class Config:
         env_file = ".env"
@@ -1,2 +1,4 @@
 from .funding import FundingSnapshot
 from .opportunity import Opportunity
+from .price import PriceTick
+from .symbols import canonical_symbol
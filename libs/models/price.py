@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+
+class PriceTick(BaseModel):
+    """持仓合约的标记价 / 指数价，独立于资金费率快照高频发布。"""
+
+    exchange: str
+    symbol: str
+    instrument: Optional[str] = None
+    mark_price: Optional[float] = None
+    index_price: Optional[float] = None
+    captured_at_ms: int
+
+    @property
+    def price(self) -> Optional[float]:
+        return self.mark_price or self.index_price
+
+    @property
+    def age_secs(self) -> float:
+        now_ms = int(datetime.now(tz=timezone.utc).timestamp() * 1000)
+        return max(0, now_ms - self.captured_at_ms) / 1000
+
+    def to_stream_fields(self) -> Dict[str, str]:
+        fields = {"exchange": self.exchange, "symbol": self.symbol, "captured_at_ms": str(self.captured_at_ms)}
+        if self.instrument:
+            fields["instrument"] = self.instrument
+        if self.mark_price is not None:
+            fields["mark_price"] = f"{self.mark_price}"
+        if self.index_price is not None:
+            fields["index_price"] = f"{self.index_price}"
+        return fields
+
+    @classmethod
+    def from_stream(cls, fields: Dict[str, str]) -> "PriceTick":
+        return cls(
+            exchange=fields["exchange"],
+            symbol=fields["symbol"],
+            instrument=fields.get("instrument"),
+            mark_price=float(fields["mark_price"]) if fields.get("mark_price") not in (None, "", "None") else None,
+            index_price=float(fields["index_price"]) if fields.get("index_price") not in (None, "", "None") else None,
+            captured_at_ms=int(fields["captured_at_ms"]),
+        )
@@ -0,0 +1,16 @@
+"""跨交易所统一的合约符号。
+
+低价币在不同交易所按不同倍数上市（Binance 的 1000PEPEUSDT 与 Bitget 的 PEPEUSDT），
+行情、策略、持仓都按去掉倍数前缀后的统一符号配对；交易所原始合约名另存在 instrument 里。
+"""
+import re
+
+# 低价币按 1000/10000/1000000 或 1M 个打包上市；要求后面紧跟字母，避免误伤 1INCHUSDT 之类
+MULTIPLIER_PREFIX = re.compile(r"^(?:1000000|100000|10000|1000|1M)(?=[A-Z])")
+
+
+def canonical_symbol(symbol: str) -> str:
+    """交易所合约名 -> 统一符号；已经是统一符号的原样返回，旧数据里的合约名也可以直接传进来。"""
+    if not symbol:
+        return symbol
+    return MULTIPLIER_PREFIX.sub("", symbol)
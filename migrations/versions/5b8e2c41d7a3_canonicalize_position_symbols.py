@@ -0,0 +1,41 @@
+"""canonicalize position symbols
+
+Revision ID: 5b8e2c41d7a3
+Revises: 0a30f7429c1d
+Create Date: 2026-10-17 08:30:00.000000
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5b8e2c41d7a3"
+down_revision: Union[str, Sequence[str], None] = "0a30f7429c1d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# 与 libs/models/symbols.py 相同的规则；迁移里固定一份，不随代码变化
+MULTIPLIER_PREFIX = re.compile(r"^(?:1000000|100000|10000|1000|1M)(?=[A-Z])")
+TABLES = ("position_groups", "position_events")
+
+
+def upgrade() -> None:
+    """Rename stored exchange contract names (1000PEPEUSDT) to the canonical symbols the feed publishes (PEPEUSDT)."""
+    bind = op.get_bind()
+    for table_name in TABLES:
+        table = sa.table(table_name, sa.column("id", sa.Integer), sa.column("symbol", sa.String))
+        rows = bind.execute(sa.select(table.c.id, table.c.symbol)).all()
+        for row_id, symbol in rows:
+            canonical = MULTIPLIER_PREFIX.sub("", symbol or "")
+            if symbol and canonical != symbol:
+                bind.execute(sa.update(table).where(table.c.id == row_id).values(symbol=canonical))
+
+
+def downgrade() -> None:
+    """Irreversible: the original contract names are not stored; the readers also accept canonical symbols."""
+    pass
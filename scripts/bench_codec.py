@@ -0,0 +1,101 @@
+"""Measure Redis memory per stream entry and decode time for the text and compact bus codecs.
+
+Usage: python scripts/bench_codec.py [--count 2000] [--redis-url redis://localhost:6379/15]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from redis.asyncio import Redis
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from libs.bus import decode_funding, encode_funding
+from libs.bus import _as_stream_fields
+from libs.models import FundingSnapshot
+
+
+def _snapshots(count: int) -> list[FundingSnapshot]:
+    now_ms = int(time.time() * 1000)
+    return [
+        FundingSnapshot(
+            exchange="binance" if i % 2 else "bitget",
+            symbol=f"SYM{i}USDT",
+            funding_rate_raw=0.0001 * (i % 7),
+            settle_interval_hours=8,
+            next_funding_time_ms=now_ms + 3600_000,
+            instrument=f"SYM{i}USDT",
+            mark_price=100.0 + i / 3,
+            index_price=100.0 + i / 7,
+            captured_at_ms=now_ms,
+        )
+        for i in range(count)
+    ]
+
+
+def _text_fields(snapshot: FundingSnapshot) -> dict:
+    payload = snapshot.model_dump()
+    payload["rate8h"] = snapshot.rate8h
+    payload["settle_countdown_secs"] = snapshot.settle_countdown_secs
+    return _as_stream_fields(payload)
+
+
+async def _measure(client: Redis, text_client: Redis, key: str, entries: list[dict], codec: str) -> None:
+    await client.delete(key)
+    pipe = client.pipeline(transaction=False)
+    for fields in entries:
+        pipe.xadd(key, fields)
+    await pipe.execute()
+    memory = await client.memory_usage(key, samples=0) or 0
+
+    # 旧格式消费者用 decode_responses=True + from_stream；新消费者统一 bytes 模式 + decode_funding
+    rows = await client.xrange(key, "-", "+")
+    started = time.perf_counter()
+    for _, fields in rows:
+        decode_funding(fields)
+    decode_bytes = time.perf_counter() - started
+
+    line = (
+        f"{codec:8s} memory/entry={memory / len(entries):7.1f} B  "
+        f"decode(bytes mode)={decode_bytes / len(rows) * 1e6:6.2f} us/msg"
+    )
+    if codec == "text":
+        text_rows = await text_client.xrange(key, "-", "+")
+        started = time.perf_counter()
+        for _, fields in text_rows:
+            FundingSnapshot.from_stream(fields)
+        legacy = time.perf_counter() - started
+        line += f"  decode(legacy from_stream)={legacy / len(text_rows) * 1e6:6.2f} us/msg"
+    print(line)
+    await client.delete(key)
+
+
+async def _run(redis_url: str, count: int) -> None:
+    client = Redis.from_url(redis_url)
+    text_client = Redis.from_url(redis_url, decode_responses=True)
+    snapshots = _snapshots(count)
+    try:
+        print(f"entries={count}")
+        await _measure(client, text_client, "bench:codec:text", [_text_fields(s) for s in snapshots], "text")
+        await _measure(client, text_client, "bench:codec:compact", [encode_funding(s) for s in snapshots], "compact")
+    finally:
+        await client.aclose()
+        await text_client.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    args = parser.parse_args()
+    asyncio.run(_run(args.redis_url, args.count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Compare end-to-end cycle latency of per-symbol funding messages against cycle frames.
+
+For each format a consumer follows the stream with XREAD (bytes mode, as strategy-engine does),
+decodes every entry with decode_funding_entry and runs a strategy-engine style pairing check per
+snapshot. The publisher sends --cycles full-universe cycles (--symbols per venue, two venues)
+through FundingPublisher.publish_many; latency is measured from the start of publish_many until
+the consumer has handled the last snapshot of that cycle.
+
+Uses a throwaway redislite server when no --redis-url is given.
+Usage: python scripts/bench_cycle_frames.py [--symbols 700] [--cycles 20] [--redis-url redis://localhost:6379/15]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from redis.asyncio import Redis
+
+from libs.bus import FundingPublisher, decode_funding_entry
+from libs.models import FundingSnapshot
+
+VARIANTS = (
+    ("symbol/text", "symbol", "text"),
+    ("symbol/compact", "symbol", "compact"),
+    ("frame", "frame", "compact"),
+)
+
+
+def _cycle(symbols: int, cycle: int) -> list[FundingSnapshot]:
+    now_ms = int(time.time() * 1000)
+    return [
+        FundingSnapshot(
+            exchange=exchange,
+            symbol=f"SYM{i}USDT",
+            funding_rate_raw=0.0001 * ((i * 3 + cycle + offset) % 11 - 5),
+            settle_interval_hours=8 if i % 5 else 4,
+            next_funding_time_ms=now_ms + 3600_000,
+            mark_price=100.0 + i / 3 + cycle / 100,
+            index_price=100.0 + i / 7,
+            captured_at_ms=now_ms,
+        )
+        for offset, exchange in enumerate(("binance", "bitget"))
+        for i in range(symbols)
+    ]
+
+
+class _Consumer:
+    """与 strategy-engine 相同的处理：更新最新值表，再与另一家交易所配对比较费率差。"""
+
+    def __init__(self, redis: Redis, key: str) -> None:
+        self._redis = redis
+        self._key = key
+        self.latest = defaultdict(dict)
+        self.handled = 0
+        self.entries = 0
+        self.opportunities = 0
+        self.target = 0
+        self.reached = asyncio.Event()
+
+    async def run(self) -> None:
+        last_id = b"0-0"
+        while True:
+            reply = await self._redis.xread({self._key: last_id}, count=500, block=1000)
+            for _, entries in reply or []:
+                for entry_id, fields in entries:
+                    snapshots = decode_funding_entry(fields)
+                    for snapshot in snapshots:
+                        self.latest[snapshot.exchange][snapshot.symbol] = snapshot
+                    for snapshot in snapshots:
+                        self._evaluate(snapshot)
+                    self.handled += len(snapshots)
+                    self.entries += 1
+                    last_id = entry_id
+            if self.target and self.handled >= self.target:
+                self.reached.set()
+
+    def _evaluate(self, snapshot: FundingSnapshot) -> None:
+        for exchange, rates in self.latest.items():
+            if exchange == snapshot.exchange:
+                continue
+            other = rates.get(snapshot.symbol)
+            if other is not None and abs(snapshot.rate8h - other.rate8h) > 0.0005:
+                self.opportunities += 1
+
+
+async def _bench(redis_url: str, label: str, fmt: str, codec: str, symbols: int, cycles: int) -> dict:
+    key = f"bench:cycle_frames:{fmt}:{codec}:{os.getpid()}"
+    settings = SimpleNamespace(
+        redis_url=redis_url,
+        funding_stream_key=key,
+        funding_publish_format=fmt,
+        bus_codec=codec,
+        funding_latest_index_enabled=True,
+        funding_stream_max_memory_mb=0,
+    )
+    publisher = FundingPublisher(settings=settings)
+    await publisher.connect()
+    reader = Redis.from_url(redis_url)
+    await reader.delete(key)
+    consumer = _Consumer(reader, key)
+    task = asyncio.create_task(consumer.run())
+    publish_ms = []
+    e2e_ms = []
+    try:
+        for cycle in range(cycles):
+            batch = _cycle(symbols, cycle)
+            consumer.target = consumer.handled + len(batch)
+            consumer.reached.clear()
+            started = time.perf_counter()
+            result = await publisher.publish_many(batch)
+            publish_ms.append((time.perf_counter() - started) * 1000)
+            if result.failures:
+                raise RuntimeError(f"publish failed: {result.failures[0][1]}")
+            await asyncio.wait_for(consumer.reached.wait(), timeout=60)
+            e2e_ms.append((time.perf_counter() - started) * 1000)
+        memory = await reader.memory_usage(key, samples=0) or 0
+        entries = await reader.xlen(key)
+    finally:
+        task.cancel()
+        await reader.delete(key)
+        await reader.aclose()
+        await publisher.close()
+    e2e_ms.sort()
+    return {
+        "label": label,
+        "entries_per_cycle": entries / cycles,
+        "bytes_per_cycle": memory / cycles,
+        "publish_ms": statistics.median(publish_ms),
+        "p50_ms": statistics.median(e2e_ms),
+        "p95_ms": e2e_ms[min(len(e2e_ms) - 1, int(len(e2e_ms) * 0.95))],
+    }
+
+
+async def _main(redis_url: str, symbols: int, cycles: int) -> None:
+    print(f"{cycles} cycles x {symbols * 2} snapshots (2 venues)")
+    print(f"{'format':16s} {'entries/cycle':>13s} {'KB/cycle':>9s} {'publish ms':>11s} {'e2e p50 ms':>11s} {'e2e p95 ms':>11s}")
+    rows = []
+    for label, fmt, codec in VARIANTS:
+        row = await _bench(redis_url, label, fmt, codec, symbols, cycles)
+        rows.append(row)
+        print(
+            f"{row['label']:16s} {row['entries_per_cycle']:13.0f} {row['bytes_per_cycle'] / 1024:9.1f} "
+            f"{row['publish_ms']:11.1f} {row['p50_ms']:11.1f} {row['p95_ms']:11.1f}"
+        )
+    baseline = rows[1]["p50_ms"]
+    print(f"frame vs symbol/compact e2e p50: {baseline / rows[2]['p50_ms']:.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--symbols", type=int, default=700, help="symbols per venue in one cycle")
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--redis-url", default=None, help="use an existing Redis instead of redislite")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        server = None
+        redis_url = args.redis_url
+        if redis_url is None:
+            try:
+                import redislite
+            except ImportError:
+                sys.exit("redislite is not installed; pass --redis-url")
+            server = redislite.Redis(os.path.join(workdir, "redis.db"))
+            redis_url = f"unix://{server.socket_file}"
+        try:
+            asyncio.run(_main(redis_url, args.symbols, args.cycles))
+        finally:
+            if server is not None:
+                server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Compare the default httpx client + stdlib JSON against the feed's tuned transport (pooled keepalive,
+HTTP/2 where negotiated, orjson decoding). Reports per-request latency percentiles and CPU time per cycle.
+
+By default both runs hit a local keep-alive HTTP/1.1 server that serves a ~600-entry premiumIndex and
+per-symbol Bitget funding payloads, so the numbers isolate client-side cost (no TLS, no HTTP/2).
+Pass --live to run against the real Binance/Bitget endpoints instead.
+
+Usage: python scripts/bench_feed_http.py [--cycles 20] [--symbols 100] [--concurrency 10] [--cycle-gap 0] [--live]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+FEED_DIR = ROOT / "services" / "market-feed"
+for path in (ROOT, FEED_DIR):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+from adapters import BINANCE_FUNDING_URL, BITGET_BULK_FUNDING_URL, BinanceAdapter, BitgetAdapter
+from contracts import ContractCache
+from ratelimit import HostLimits, RateLimiter
+from transport import CycleStats, ExchangeHttp, decode_json, latency_percentiles
+
+
+def _premium_index(count: int) -> bytes:
+    now_ms = int(time.time() * 1000)
+    return json.dumps(
+        [
+            {
+                "symbol": f"SYM{i}USDT",
+                "markPrice": f"{100 + i / 3:.8f}",
+                "indexPrice": f"{100 + i / 7:.8f}",
+                "estimatedSettlePrice": f"{100 + i / 5:.8f}",
+                "lastFundingRate": f"{0.0001 * (i % 7):.8f}",
+                "interestRate": "0.00010000",
+                "nextFundingTime": now_ms + 3600_000,
+                "time": now_ms,
+            }
+            for i in range(count)
+        ]
+    ).encode()
+
+
+def _bitget_rate(symbol: str) -> bytes:
+    return json.dumps(
+        {
+            "code": "00000",
+            "msg": "success",
+            "requestTime": int(time.time() * 1000),
+            "data": [
+                {
+                    "symbol": symbol,
+                    "fundingRate": "0.0001",
+                    "fundingRateInterval": "8",
+                    "nextUpdate": str(int(time.time() * 1000) + 3600_000),
+                    "minFundingRate": "-0.003",
+                    "maxFundingRate": "0.003",
+                }
+            ],
+        }
+    ).encode()
+
+
+def _serve_local(entries: int, ports) -> None:
+    """最小的 keep-alive HTTP/1.1 服务，跑在独立进程里，避免服务端开销计入客户端 CPU。"""
+    premium = _premium_index(entries)
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()) not in (b"\r\n", b""):
+                    pass
+                target = request_line.split(b" ")[1].decode()
+                if target.startswith("/fapi/v1/premiumIndex"):
+                    body = premium
+                else:
+                    symbol = target.split("symbol=", 1)[-1].split("&", 1)[0]
+                    body = _bitget_rate(symbol)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: keep-alive\r\n"
+                    + f"Content-Length: {len(body)}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve() -> None:
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        ports.put(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+async def _cycle_baseline(client: httpx.AsyncClient, urls, symbols, concurrency: int) -> CycleStats:
+    cycle = CycleStats("bench", "baseline")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def get(url: str, params=None):
+        async with semaphore:
+            started = time.perf_counter()
+            resp = await client.get(url, params=params)
+            cycle.latencies.append(time.perf_counter() - started)
+            cycle.requests += 1
+            resp.raise_for_status()
+            return resp.json()
+
+    await get(urls["binance"])
+    await asyncio.gather(*(get(urls["bitget"], {"symbol": s, "productType": "USDT-FUTURES"}) for s in symbols))
+    return cycle
+
+
+async def _cycle_tuned(binance: ExchangeHttp, bitget: ExchangeHttp, urls, symbols) -> CycleStats:
+    cycle = CycleStats("bench", "tuned")
+
+    async def get(http: ExchangeHttp, url: str, params=None):
+        return decode_json(await http.get(url, cycle=cycle, params=params))
+
+    await get(binance, urls["binance"])
+    await asyncio.gather(
+        *(get(bitget, urls["bitget"], {"symbol": s, "productType": "USDT-FUTURES"}) for s in symbols)
+    )
+    return cycle
+
+
+def _report(label: str, cycles: list[CycleStats], cpu: list[float], versions=None) -> None:
+    latencies = [value for cycle in cycles for value in cycle.latencies]
+    pct = latency_percentiles(latencies)
+    cpu_ms = sorted(value * 1000 for value in cpu)
+    wall_ms = sorted(cycle.wall_secs * 1000 for cycle in cycles)
+    line = (
+        f"{label:9s} requests={len(latencies):5d}  p50={pct['p50_ms']:7.2f}ms p90={pct['p90_ms']:7.2f}ms "
+        f"p99={pct['p99_ms']:7.2f}ms  cpu/cycle={sum(cpu_ms) / len(cpu_ms):7.2f}ms  "
+        f"wall/cycle(p50)={wall_ms[len(wall_ms) // 2]:7.1f}ms"
+    )
+    if versions:
+        line += f"  http={versions}"
+    print(line)
+
+
+def _report_decode(entries: int) -> None:
+    body = _premium_index(entries)
+    resp = httpx.Response(200, content=body)
+    for label, decode in (("stdlib", lambda: json.loads(resp.content)), ("orjson", lambda: decode_json(resp))):
+        started = time.perf_counter()
+        for _ in range(50):
+            decode()
+        print(f"decode premiumIndex ({entries} entries, {len(body)} B) {label}: {(time.perf_counter() - started) / 50 * 1000:.2f} ms")
+
+
+async def _run(args) -> None:
+    server = None
+    symbols = [f"SYM{i}USDT" for i in range(args.symbols)]
+    if args.live:
+        urls = {"binance": BINANCE_FUNDING_URL, "bitget": BITGET_BULK_FUNDING_URL}
+        settings = SimpleNamespace()
+        cache = ContractCache(path=str(FEED_DIR / "contracts_cache.json"))
+        cache.load()
+        symbols = (cache.symbols("bitget") or ["BTCUSDT", "ETHUSDT"])[: args.symbols]
+        limiter = RateLimiter()
+        for adapter_cls in (BinanceAdapter, BitgetAdapter):
+            for host, limits in adapter_cls(settings=settings, contracts=cache).rate_limits().items():
+                limiter.configure(host, limits.scaled(0.8), max_concurrency=args.concurrency)
+    else:
+        ports = multiprocessing.Queue()
+        server = multiprocessing.Process(target=_serve_local, args=(args.entries, ports), daemon=True)
+        server.start()
+        port = ports.get(timeout=10)
+        base = f"http://127.0.0.1:{port}"
+        urls = {"binance": f"{base}/fapi/v1/premiumIndex", "bitget": f"{base}/api/v2/mix/market/current-fund-rate"}
+        limiter = RateLimiter()
+        limiter.configure("127.0.0.1", HostLimits(rate=1e6, burst=1e6), max_concurrency=args.concurrency)
+
+    try:
+        # 基线：和改造前一样的默认客户端 + 标准库 JSON
+        baseline_cycles, baseline_cpu = [], []
+        async with httpx.AsyncClient(timeout=10) as client:
+            for _ in range(args.cycles):
+                cpu_started = time.process_time()
+                baseline_cycles.append(await _cycle_baseline(client, urls, symbols, args.concurrency))
+                baseline_cpu.append(time.process_time() - cpu_started)
+                await asyncio.sleep(args.cycle_gap)
+        _report("baseline", baseline_cycles, baseline_cpu)
+
+        binance = ExchangeHttp("binance", timeout=10, max_connections=2, limiter=limiter)
+        bitget = ExchangeHttp("bitget", timeout=10, max_connections=args.concurrency, limiter=limiter, http2=True)
+        await binance.start()
+        await bitget.start()
+        tuned_cycles, tuned_cpu = [], []
+        try:
+            for _ in range(args.cycles):
+                cpu_started = time.process_time()
+                tuned_cycles.append(await _cycle_tuned(binance, bitget, urls, symbols))
+                tuned_cpu.append(time.process_time() - cpu_started)
+                await asyncio.sleep(args.cycle_gap)
+        finally:
+            versions = {**binance.health()["http_versions"], **bitget.health()["http_versions"]}
+            await binance.close()
+            await bitget.close()
+        _report("tuned", tuned_cycles, tuned_cpu, versions)
+    finally:
+        if server is not None:
+            server.terminate()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--symbols", type=int, default=100, help="per-symbol Bitget requests per cycle")
+    parser.add_argument("--entries", type=int, default=600, help="premiumIndex entries served locally")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--cycle-gap", type=float, default=0.0, help="idle seconds between cycles")
+    parser.add_argument("--live", action="store_true", help="hit the real exchange endpoints")
+    args = parser.parse_args()
+    _report_decode(args.entries)
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Offline, deterministic throughput benchmark of the feed adapters against recorded exchange responses.
+
+Replays a recording made with scripts/record_feed.py (or FEED_RECORD_PATH) through ReplayTransport, optionally
+with injected latency, 429s, 5xx and empty-data payloads, and reports per-exchange cycles, snapshots/s,
+requests/s and latency percentiles. Without --recording a synthetic recording is produced first by recording
+the adapters against an in-process stand-in exchange (--symbols contracts on both venues).
+
+Usage: python scripts/bench_feed_replay.py [--recording feed.jsonl.gz] [--cycles 20] [--speed 0]
+                                          [--faults "latency=0.01,429=0.02,5xx=0.01,empty=0.01"] [--seed 1]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+FEED_DIR = ROOT / "services" / "market-feed"
+for path in (ROOT, FEED_DIR):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+from adapters import build_adapters
+from contracts import ContractCache
+from replay import Faults, Recorder, ReplayTransport, load_recording
+from transport import CycleStats, latency_percentiles
+
+
+def _stand_in_exchange(symbols: int, latency: float) -> httpx.MockTransport:
+    """同时扮演 Binance 与 Bitget 的最小服务端，只用于生成合成录制。"""
+    names = [f"SYM{i}USDT" for i in range(symbols)]
+    next_ms = int(time.time() * 1000) + 3600_000
+
+    def bitget(data):
+        return {"code": "00000", "msg": "success", "requestTime": next_ms, "data": data}
+
+    def rate(name):
+        return {"symbol": name, "fundingRate": "0.0001", "fundingRateInterval": "8", "nextUpdate": str(next_ms)}
+
+    routes = {
+        "/fapi/v1/premiumIndex": [
+            {"symbol": name, "markPrice": "1.0", "indexPrice": "1.0", "lastFundingRate": "0.0001", "nextFundingTime": next_ms}
+            for name in names
+        ],
+        "/fapi/v1/exchangeInfo": {"symbols": [{"symbol": name, "contractType": "PERPETUAL", "marginAsset": "USDT"} for name in names]},
+        "/fapi/v1/fundingInfo": [],
+        "/api/v2/mix/market/contracts": bitget(
+            [{"symbol": name, "marginCoin": "USDT", "fundInterval": "8"} for name in names]
+        ),
+        "/api/v2/mix/market/tickers": bitget([{"symbol": name, "markPrice": "1.0", "indexPrice": "1.0"} for name in names]),
+        "/api/v2/mix/market/current-fund-rate": bitget([rate(name) for name in names]),
+    }
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        payload = routes.get(request.url.path)
+        if payload is None:
+            return httpx.Response(404, json={"msg": "unknown path"})
+        symbol = request.url.params.get("symbol")
+        if symbol and request.url.path.endswith("current-fund-rate"):
+            payload = bitget([rate(symbol)])
+        return httpx.Response(200, content=json.dumps(payload).encode(), headers={"Content-Type": "application/json"})
+
+    return httpx.MockTransport(handler)
+
+
+async def _synthesize(path: Path, symbols: int, latency: float) -> None:
+    recorder = Recorder(str(path), max_records=symbols * 4 + 100)
+    transport = _stand_in_exchange(symbols, latency)
+    # bulk 与 per_symbol 各录一轮，两种模式都能回放
+    for ingest in ("bulk", "per_symbol"):
+        contracts = ContractCache(path=str(path.with_suffix(f".{ingest}.contracts.json")))
+        contracts.load()
+        settings = SimpleNamespace(bitget_ingest_mode=ingest, bitget_concurrency=20)
+        adapters = build_adapters(settings, contracts=contracts, transport=transport, recorder=recorder)
+        if ingest == "per_symbol":
+            adapters.pop("binance")
+        for name, adapter in adapters.items():
+            await adapter.start()
+            try:
+                await adapter.fetch(CycleStats(name, adapter.fetch_strategy))
+            finally:
+                await adapter.close()
+    recorder.save()
+
+
+async def _bench(args, recording: str, ingest: str) -> None:
+    records = load_recording(recording)
+    faults = Faults.parse(args.faults, seed=args.seed)
+    transport = ReplayTransport(records, speed=args.speed, faults=faults)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        contracts = ContractCache(path=str(Path(tmpdir) / "contracts.json"))
+        contracts.load()
+        settings = SimpleNamespace(
+            bitget_ingest_mode=ingest,
+            bitget_concurrency=args.concurrency,
+            binance_max_concurrency=args.concurrency,
+            # 回放时不受真实限额约束，才能测出 feed 自身的吞吐
+            feed_rate_limit_utilization=1000.0,
+        )
+        adapters = build_adapters(settings, contracts=contracts, transport=transport)
+
+        async def run(name, adapter):
+            await adapter.start()
+            cycles, snapshots, failures = [], 0, 0
+            try:
+                for _ in range(args.cycles):
+                    cycle = CycleStats(name, adapter.fetch_strategy)
+                    try:
+                        snapshots += len(await adapter.fetch(cycle))
+                    except Exception:
+                        failures += 1
+                    cycles.append(cycle)
+            finally:
+                await adapter.close()
+            return name, cycles, snapshots, failures
+
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        results = await asyncio.gather(*(run(name, adapter) for name, adapter in adapters.items()))
+        wall = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+
+    print(f"replay {recording} ingest={ingest} speed={args.speed} faults={args.faults or 'none'} seed={args.seed}")
+    for name, cycles, snapshots, failures in results:
+        requests = sum(cycle.requests for cycle in cycles)
+        pct = latency_percentiles([value for cycle in cycles for value in cycle.latencies])
+        print(
+            f"  {name:8s} cycles={len(cycles)} failed={failures} snapshots={snapshots} "
+            f"({snapshots / wall:,.0f}/s) requests={requests} ({requests / wall:,.0f}/s) "
+            f"p50={pct['p50_ms']}ms p99={pct['p99_ms']}ms"
+        )
+    print(
+        f"  wall={wall:.2f}s cpu={cpu:.2f}s served={transport.served} not_recorded={transport.missed} "
+        f"injected={faults.injected}"
+    )
+
+
+async def _run(args) -> None:
+    recording = args.recording
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if recording is None:
+            recording = str(Path(tmpdir) / "synthetic.jsonl.gz")
+            await _synthesize(Path(recording), args.symbols, args.latency)
+            print(f"synthetic recording: {len(load_recording(recording))} responses, {args.symbols} symbols per venue")
+        for ingest in args.ingest.split(","):
+            await _bench(args, recording, ingest)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recording", default=None, help="gzip JSON Lines recording; synthesize one when omitted")
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--speed", type=float, default=0.0, help="1 = recorded timing, 0 = no waiting")
+    parser.add_argument("--faults", default="", help='e.g. "latency=0.01,429=0.02,5xx=0.01,empty=0.01"')
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--ingest", default="bulk,per_symbol", help="bitget ingest modes to replay")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--symbols", type=int, default=300, help="synthetic recording size")
+    parser.add_argument("--latency", type=float, default=0.02, help="synthetic recording per-request latency")
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Compare serial XADD against pipelined FundingPublisher.publish_many on a local Redis.
+
+Usage: python scripts/bench_publish.py [--count 1000] [--redis-url redis://localhost:6379/15]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from libs.bus import FundingPublisher
+from libs.models import FundingSnapshot
+
+BENCH_STREAM = "bench:funding_snapshots"
+
+
+def _snapshots(count: int) -> list[FundingSnapshot]:
+    now_ms = int(time.time() * 1000)
+    return [
+        FundingSnapshot(
+            exchange="binance" if i % 2 else "bitget",
+            symbol=f"SYM{i}USDT",
+            funding_rate_raw=0.0001 * (i % 7),
+            settle_interval_hours=8,
+            next_funding_time_ms=now_ms + 3600_000,
+            instrument=f"SYM{i}USDT",
+            mark_price=100.0 + i,
+            index_price=100.0 + i,
+            captured_at_ms=now_ms,
+        )
+        for i in range(count)
+    ]
+
+
+async def _run(redis_url: str, count: int, chunk_size: int) -> None:
+    settings = SimpleNamespace(
+        redis_url=redis_url,
+        funding_stream_key=BENCH_STREAM,
+        funding_stream_maxlen=count * 2,
+        funding_publish_chunk_size=chunk_size,
+    )
+    publisher = FundingPublisher(settings=settings)
+    await publisher.connect()
+    snapshots = _snapshots(count)
+    try:
+        await publisher._redis.delete(BENCH_STREAM)
+        started = time.perf_counter()
+        for snapshot in snapshots:
+            await publisher.publish(snapshot)
+        serial = time.perf_counter() - started
+
+        await publisher._redis.delete(BENCH_STREAM)
+        started = time.perf_counter()
+        result = await publisher.publish_many(snapshots)
+        batched = time.perf_counter() - started
+
+        length = await publisher._redis.xlen(BENCH_STREAM)
+        print(f"snapshots={count} chunk_size={chunk_size}")
+        print(f"serial publish     : {serial * 1000:8.1f} ms")
+        print(f"pipelined publish  : {batched * 1000:8.1f} ms  ({serial / batched:.1f}x)")
+        print(f"published={result.published} failures={len(result.failures)} stream_len={length}")
+    finally:
+        await publisher._redis.delete(BENCH_STREAM)
+        await publisher.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    args = parser.parse_args()
+    asyncio.run(_run(args.redis_url, args.count, args.chunk_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""Run every registered market-feed adapter against the JSON fixtures in services/market-feed/fixtures.
+
+Requests are answered by an httpx.MockTransport keyed on the URL path, so no network access is needed.
+Usage: python scripts/check_adapters.py
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+from types import SimpleNamespace
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+FEED_DIR = ROOT / "services" / "market-feed"
+FIXTURES = FEED_DIR / "fixtures"
+for path in (ROOT, FEED_DIR):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+from adapters import ADAPTERS, ExchangeAdapter, build_adapters, register_adapter
+from contracts import ContractCache, _parse_binance
+from ratelimit import HostLimits, RateLimiter
+from scheduler import COLD, HOT, WARM, SettlementScheduler
+from transport import CycleStats
+
+# URL path -> 夹具文件；带 symbol 参数的逐个请求用 <name>_<symbol>.json
+ROUTES = {
+    "/fapi/v1/premiumIndex": "binance_premium_index.json",
+    "/fapi/v1/exchangeInfo": "binance_exchange_info.json",
+    "/fapi/v1/fundingInfo": "binance_funding_info.json",
+    "/api/v2/mix/market/contracts": "bitget_contracts.json",
+    "/api/v2/mix/market/tickers": "bitget_tickers.json",
+    "/api/v2/mix/market/current-fund-rate": "bitget_current_fund_rate.json",
+}
+
+
+def _fixture_transport(log: list, routes: Optional[dict] = None) -> httpx.MockTransport:
+    routes = ROUTES if routes is None else routes
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        log.append(request.url.path)
+        name = routes.get(request.url.path)
+        if name is None:
+            return httpx.Response(404, json={"msg": "no fixture"})
+        symbol = request.url.params.get("symbol")
+        if symbol:
+            name = name.replace(".json", f"_{symbol}.json")
+        path = FIXTURES / name
+        if not path.exists():
+            return httpx.Response(404, json={"msg": f"no fixture {name}"})
+        return httpx.Response(200, json=json.loads(path.read_text(encoding="utf-8")))
+
+    return httpx.MockTransport(handler)
+
+
+async def _check_fixtures(tmpdir: str) -> None:
+    log: list = []
+    settings = SimpleNamespace(
+        bitget_ingest_mode="bulk", bitget_product_type="USDT-FUTURES", feed_universe_overrides="XRPUSDT"
+    )
+    contracts = ContractCache(path=str(Path(tmpdir) / "contracts_cache.json"))
+    contracts.load()
+    adapters = build_adapters(settings, contracts=contracts, transport=_fixture_transport(log))
+    assert set(adapters) == set(ADAPTERS), adapters
+
+    results = {}
+    for name, adapter in adapters.items():
+        await adapter.start()
+        cycle = CycleStats(name, adapter.fetch_strategy)
+        try:
+            results[name] = ({s.symbol: s for s in await adapter.fetch(cycle)}, cycle)
+        finally:
+            await adapter.close()
+
+    binance, binance_cycle = results["binance"]
+    assert set(binance) == {"BTCUSDT", "ETHUSDT", "PEPEUSDT"}, sorted(binance)
+    assert binance["PEPEUSDT"].instrument == "1000PEPEUSDT", binance["PEPEUSDT"].instrument
+    assert binance["PEPEUSDT"].settle_interval_hours == 4, "binance interval should come from fundingInfo"
+    assert binance_cycle.requests == 3, binance_cycle.requests
+
+    bitget, bitget_cycle = results["bitget"]
+    # XRPUSDT 只在 Bitget 上市，靠 overrides 保留
+    assert set(bitget) == {"BTCUSDT", "ETHUSDT", "XRPUSDT", "PEPEUSDT"}, sorted(bitget)
+    assert bitget["BTCUSDT"].mark_price == 110510.1
+    assert bitget["XRPUSDT"].next_funding_time_ms > 0, "XRPUSDT should be filled by per-symbol fallback"
+    assert bitget["XRPUSDT"].mark_price == 2.413, "fallback should reuse ticker mark price"
+    assert bitget_cycle.fallback_symbols == 1, bitget_cycle.fallback_symbols
+    print(
+        "fixtures ok:",
+        {name: {"snapshots": len(snaps), "requests": cycle.requests} for name, (snaps, cycle) in results.items()},
+    )
+
+
+async def _check_conditional(tmpdir: str) -> None:
+    """合约列表带 ETag 条件刷新：304 时 fetched_at 前移、缓存的合约不变，Bitget 不退到 v1 地址。"""
+    log: list = []
+    inner = _fixture_transport([])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        log.append((request.url.path, request.headers.get("if-none-match")))
+        if request.url.path.endswith(("exchangeInfo", "/contracts")):
+            etag = f'"{request.url.path}"'
+            if request.headers.get("if-none-match") == etag:
+                return httpx.Response(304, headers={"etag": etag})
+            resp = inner.handle_request(request)
+            return httpx.Response(resp.status_code, content=resp.read(), headers={"etag": etag})
+        return inner.handle_request(request)
+
+    settings = SimpleNamespace(bitget_product_type="USDT-FUTURES")
+    # ttl 0：每次调用都算过期，第二次刷新带上 If-None-Match
+    contracts = ContractCache(path=str(Path(tmpdir) / "conditional_cache.json"), ttl_secs=0)
+    adapters = build_adapters(settings, contracts=contracts, transport=httpx.MockTransport(handler))
+    for name, adapter in adapters.items():
+        await adapter.start()
+        try:
+            await adapter.refresh_contracts(CycleStats(name, "bulk"))
+            symbols, version = contracts.symbols(name), contracts.version(name)
+            first = contracts._raw[name]
+            fetched_at, source = first["fetched_at"], first.get("source")
+            await asyncio.sleep(0.01)
+            log.clear()
+            await adapter.refresh_contracts(CycleStats(name, "bulk"))
+        finally:
+            await adapter.close()
+        raw = contracts._raw[name]
+        assert any(etag for _, etag in log), (name, log)
+        assert raw["fetched_at"] > fetched_at and not raw.get("failed_at"), (name, raw.get("failed_at"))
+        assert raw.get("source") == source and contracts.symbols(name) == symbols, name
+        assert contracts.version(name) == version, name
+        assert not any(path.startswith("/api/mix/v1/") for path, _ in log), (name, log)
+    # 只保留 TRADING 状态的永续合约
+    listed = _parse_binance(
+        {
+            "contracts": [
+                {"symbol": symbol, "contractType": "PERPETUAL", "status": status}
+                for symbol, status in (("BTCUSDT", "TRADING"), ("OLDUSDT", "SETTLING"), ("NEWUSDT", "PENDING_TRADING"))
+            ]
+        }
+    )
+    assert set(listed) == {"BTCUSDT"}, sorted(listed)
+    print(f"conditional refresh ok: {contracts.health()}")
+
+
+async def _check_universe(tmpdir: str) -> None:
+    """逐个请求模式只为两家都上市的合约发请求；1000PEPEUSDT 与 PEPEUSDT 视为同一个合约。"""
+    log: list = []
+    settings = SimpleNamespace(bitget_ingest_mode="per_symbol", bitget_product_type="USDT-FUTURES")
+    contracts = ContractCache(
+        path=str(Path(tmpdir) / "universe_cache.json"), seeds={"bitget": str(FEED_DIR / "bitget_contracts.json")}
+    )
+    contracts.load()
+    # 不提供 Bitget 合约列表接口，沿用种子文件里的全部合约
+    routes = {path: name for path, name in ROUTES.items() if name != "bitget_contracts.json"}
+    adapters = build_adapters(settings, contracts=contracts, transport=_fixture_transport(log, routes))
+    binance, bitget = adapters["binance"], adapters["bitget"]
+    await binance.start()
+    await bitget.start()
+    cycle = CycleStats("bitget", "per_symbol")
+    try:
+        await binance.refresh_contracts(CycleStats("binance", "bulk"))
+        log.clear()
+        await bitget.fetch(cycle)
+    finally:
+        await binance.close()
+        await bitget.close()
+    # 每个合约先打 v2，夹具里没有逐个合约的数据时再退到 v1
+    funding_requests = [path for path in log if path.endswith("current-fund-rate")]
+    tradable = binance.universe.tradable()
+    assert tradable == {"BTCUSDT", "ETHUSDT", "PEPEUSDT"}, tradable
+    assert len(funding_requests) == 3, funding_requests
+    assert len(contracts.symbols("bitget")) > 500
+    assert bitget.pruned_symbols == len(contracts.symbols("bitget")) - 3, bitget.pruned_symbols
+    print(f"universe ok: bitget requests={len(funding_requests)} pruned={bitget.pruned_symbols} {binance.universe.health()}")
+
+
+async def _check_isolation() -> None:
+    """一个慢交易所占满自己的连接池和限速配额，不影响其它交易所的请求。"""
+
+    @register_adapter
+    class SlowAdapter(ExchangeAdapter):
+        name = "slow-check"
+        default_max_concurrency = 1
+
+        def rate_limits(self):
+            return {"slow.test": HostLimits(rate=2.0, burst=1)}
+
+        async def fetch(self, cycle):
+            await asyncio.gather(*(self.http.get("https://slow.test/x", cycle=cycle) for _ in range(4)))
+            return []
+
+    async def slow_handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, json={})
+
+    try:
+        settings = SimpleNamespace()
+        contracts = ContractCache(path=str(Path(tempfile.gettempdir()) / "unused_contracts.json"))
+        limiter = RateLimiter()
+        slow = SlowAdapter(
+            settings=settings, contracts=contracts, limiter=limiter, transport=httpx.MockTransport(slow_handler)
+        )
+        fast = ADAPTERS["binance"](
+            settings=settings, contracts=contracts, limiter=limiter, transport=_fixture_transport([])
+        )
+        await slow.start()
+        await fast.start()
+        slow_task = asyncio.create_task(slow.fetch(CycleStats("slow-check", "bulk")))
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        await fast.http.get("https://fapi.binance.com/fapi/v1/premiumIndex", cycle=CycleStats("binance", "bulk"))
+        fast_secs = time.perf_counter() - started
+        await slow_task
+        await slow.close()
+        await fast.close()
+    finally:
+        ADAPTERS.pop("slow-check", None)
+    assert fast_secs < 0.1, f"binance request waited on another venue: {fast_secs:.3f}s"
+    waited = limiter.health()["slow.test"]["waited_secs_total"]
+    print(f"isolation ok: binance request {fast_secs * 1000:.1f} ms while slow venue waited {waited}s")
+
+
+async def _check_throttle() -> None:
+    """429 + Retry-After 让 host 暂停并减半速率/并发；高权重响应头提前降速；之后逐步恢复。"""
+    calls = {"n": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls["n"] += 1
+        if calls["n"] == 2:
+            return httpx.Response(429, headers={"Retry-After": "0.3"}, json={"code": -1003})
+        used = "2200" if calls["n"] == 3 else "100"
+        return httpx.Response(200, headers={"X-MBX-USED-WEIGHT-1M": used}, json=[])
+
+    limiter = RateLimiter()
+    adapter = ADAPTERS["binance"](
+        settings=SimpleNamespace(binance_max_concurrency=4),
+        contracts=ContractCache(path=str(Path(tempfile.gettempdir()) / "unused_contracts.json")),
+        limiter=limiter,
+        transport=httpx.MockTransport(handler),
+    )
+    await adapter.start()
+    url = "https://fapi.binance.com/fapi/v1/premiumIndex"
+    try:
+        await adapter.http.get(url, cycle=CycleStats("binance", "bulk"))
+        try:
+            await adapter.http.get(url, cycle=CycleStats("binance", "bulk"))
+        except httpx.HTTPStatusError:
+            pass
+        throttled = limiter.health()["fapi.binance.com"]
+        started = time.perf_counter()
+        await adapter.http.get(url, cycle=CycleStats("binance", "bulk"))
+        paused_secs = time.perf_counter() - started
+        backed_off = limiter.health()["fapi.binance.com"]
+        for _ in range(40):
+            await adapter.http.get(url, cycle=CycleStats("binance", "bulk"))
+        recovered = limiter.health()["fapi.binance.com"]
+    finally:
+        await adapter.close()
+
+    assert throttled["throttle_events"] == 1 and throttled["concurrency"] == 2, throttled
+    assert throttled["rate"] < throttled["base_rate"], throttled
+    assert paused_secs >= 0.25, f"request after 429 should honour Retry-After: {paused_secs:.3f}s"
+    assert backed_off["header_backoffs"] == 1 and backed_off["rate"] < throttled["rate"], backed_off
+    assert recovered["concurrency"] == 4 and recovered["rate"] > backed_off["rate"], recovered
+    print(
+        "throttle ok:",
+        {key: recovered[key] for key in ("rate", "base_rate", "concurrency", "throttle_events", "header_backoffs")},
+    )
+
+
+async def _check_failover(tmpdir: str) -> None:
+    """v2 资金费率接口全部 503 时，熔断后其余合约直接走 v1，而不是每个合约都先失败一次。"""
+    hits = {"v2": 0, "v1": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        # 模拟网络延迟，让多个合约的请求真正并发
+        await asyncio.sleep(0.01)
+        path = request.url.path
+        if path == "/api/v2/mix/market/current-fund-rate":
+            hits["v2"] += 1
+            return httpx.Response(503, json={"msg": "service unavailable"})
+        if path == "/api/mix/v1/market/currentFundRate":
+            hits["v1"] += 1
+            symbol = request.url.params["symbol"]
+            return httpx.Response(
+                200,
+                json={"code": "00000", "data": {"symbol": f"{symbol}_UMCBL", "fundingRate": "0.0001", "nextUpdate": "1761264000000"}},
+            )
+        return httpx.Response(503, json={"msg": "service unavailable"})
+
+    settings = SimpleNamespace(bitget_ingest_mode="per_symbol", bitget_symbol_limit=60, bitget_concurrency=4)
+    contracts = ContractCache(
+        path=str(Path(tmpdir) / "failover_cache.json"), seeds={"bitget": str(FEED_DIR / "bitget_contracts.json")}
+    )
+    contracts.load()
+    adapter = ADAPTERS["bitget"](settings=settings, contracts=contracts, transport=httpx.MockTransport(handler))
+    await adapter.start()
+    try:
+        snapshots = await adapter.fetch(CycleStats("bitget", "per_symbol"))
+        first_v2 = hits["v2"]
+        await adapter.fetch(CycleStats("bitget", "per_symbol"))
+    finally:
+        await adapter.close()
+    health = adapter.health()
+    assert len(snapshots) == 60, len(snapshots)
+    assert first_v2 <= 10, f"too many wasted v2 requests: {first_v2}"
+    assert hits["v2"] == first_v2, "second cycle should go straight to v1"
+    assert health["endpoints"]["bitget_funding"]["preferred"].endswith("/currentFundRate"), health["endpoints"]
+    assert health["http"]["breakers"]["api.bitget.com/api/v2/mix/market/current-fund-rate"]["state"] == "open"
+    print(f"failover ok: symbols=60 wasted_v2={first_v2} v1={hits['v1']} endpoints={health['endpoints']}")
+
+
+async def _check_schedule(tmpdir: str) -> None:
+    """按距结算时间分档：hot 每 5 秒、warm 每个轮询间隔、cold 很少抓；少量到期合约走带 symbol 的低权重请求。"""
+    scheduler = SettlementScheduler(
+        hot_window_secs=900,
+        hot_interval_secs=5,
+        warm_window_secs=3600,
+        warm_interval_secs=30,
+        cold_interval_secs=300,
+        full_refresh_secs=300,
+    )
+    now = time.time()
+    snapshots = [
+        SimpleNamespace(symbol=symbol, next_funding_time_ms=int((now + countdown) * 1000))
+        for symbol, countdown in (("HOTUSDT", 300), ("WARMUSDT", 1800), ("COLDUSDT", 7200), ("EDGEUSDT", 3610))
+    ]
+    assert [scheduler.tier(s, now)[0] for s in snapshots] == [HOT, WARM, COLD, COLD]
+    scheduler.update("binance", snapshots, now=now)
+    scheduler.mark_full_refresh("binance", now=now)
+    assert scheduler.pop_due("binance", now=now + 5) == ["HOTUSDT"]
+    # cold 合约不会睡过 warm 窗口的起点
+    assert scheduler.pop_due("binance", now=now + 30) == ["EDGEUSDT", "WARMUSDT"]
+    assert scheduler.pop_due("binance", now=now + 299) == []
+    assert scheduler.full_refresh_due("binance", now=now + 300)
+    # 没有结算时间或结算早已过去的合约按 warm 刷新；刚过结算（grace 内）仍是 hot
+    stale = [
+        SimpleNamespace(symbol="NOTIMEUSDT", next_funding_time_ms=0),
+        SimpleNamespace(symbol="STALEUSDT", next_funding_time_ms=int((now - 3600) * 1000)),
+        SimpleNamespace(symbol="JUSTSETTLEDUSDT", next_funding_time_ms=int((now - 60) * 1000)),
+    ]
+    assert [scheduler.tier(s, now) for s in stale] == [(WARM, 30), (WARM, 30), (HOT, 5)]
+    scheduler.update("bitget", stale, now=now)
+    assert scheduler.pop_due("bitget", now=now + 5) == ["JUSTSETTLEDUSDT"]
+    assert sorted(scheduler.pop_due("bitget", now=now + 30)) == ["NOTIMEUSDT", "STALEUSDT"]
+
+    log: list = []
+    settings = SimpleNamespace()
+    contracts = ContractCache(path=str(Path(tmpdir) / "schedule_cache.json"))
+    limiter = RateLimiter()
+    adapter = ADAPTERS["binance"](settings=settings, contracts=contracts, limiter=limiter, transport=_fixture_transport(log))
+    await adapter.start()
+    cycle = CycleStats("binance", "targeted")
+    try:
+        targeted = await adapter.fetch_symbols(cycle, ["ETHUSDT"])
+    finally:
+        await adapter.close()
+    assert [s.symbol for s in targeted] == ["ETHUSDT"] and cycle.requests == 1, (targeted, cycle.requests)
+    print(f"schedule ok: targeted requests={cycle.requests} health={scheduler.health('binance')}")
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        await _check_fixtures(tmpdir)
+        await _check_failover(tmpdir)
+        await _check_schedule(tmpdir)
+        await _check_conditional(tmpdir)
+        await _check_universe(tmpdir)
+    await _check_isolation()
+    await _check_throttle()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,232 @@
+"""Run several sharded market-feed workers against one Redis and check that rebalancing neither drops
+nor double-publishes symbols.
+
+Each worker is a separate process running FundingFeed with feed_shard_enabled, polling a synthetic
+replay recording (no exchange access needed) and publishing to a shared Redis stream; every entry is
+tagged with the publishing worker. The scenario starts two workers, adds a third, stops one
+gracefully and kills another, then reads the stream back:
+
+  - in every settled window each (exchange, symbol) is published, and by exactly one worker;
+  - each symbol changes publisher at most once per membership change (concurrent owners would
+    alternate every cycle);
+  - the longest publish gap per symbol stays within the lease TTL plus a few cycles.
+
+Uses a throwaway redislite server when no --redis-url is given.
+Usage: python scripts/check_sharded_feed.py [--redis-url redis://localhost:6379/15] [--symbols 60]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[1]
+FEED_DIR = ROOT / "services" / "market-feed"
+for path in (ROOT, FEED_DIR):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+from redis import Redis
+
+from bench_feed_replay import _synthesize
+from check_stream_feed import _load_feed_module
+from libs.bus import FundingPublisher
+
+INTERVAL_SECS = 0.5
+LEASE_TTL_SECS = 2.0
+PARTITIONS = 16
+
+
+class TaggingPublisher(FundingPublisher):
+    """在每条消息里带上发布它的 worker，便于事后核对归属。"""
+
+    def __init__(self, settings, worker_id: str) -> None:
+        super().__init__(settings)
+        self._worker_id = worker_id
+
+    def _snapshot_fields(self, snapshot):
+        fields = super()._snapshot_fields(snapshot)
+        fields["worker"] = self._worker_id
+        return fields
+
+
+async def _run_worker(worker_id: str, redis_url: str, recording: str, workdir: str, stream_key: str) -> None:
+    feed_module = _load_feed_module()
+    settings = SimpleNamespace(
+        redis_url=redis_url,
+        funding_stream_key=stream_key,
+        funding_stream_maxlen=1_000_000,
+        funding_refresh_interval_secs=INTERVAL_SECS,
+        funding_schedule="fixed",
+        funding_delta_publish=False,
+        feed_replay_path=recording,
+        feed_replay_speed=0.0,
+        feed_rate_limit_utilization=1000.0,
+        bitget_ingest_mode="bulk",
+        contract_cache_path=os.path.join(workdir, f"{worker_id}.contracts.json"),
+        feed_shard_enabled=True,
+        feed_shard_worker_id=worker_id,
+        feed_shard_partitions=PARTITIONS,
+        feed_shard_lease_ttl_secs=LEASE_TTL_SECS,
+        feed_shard_key_prefix=f"{stream_key}:shards",
+    )
+    publisher = TaggingPublisher(settings, worker_id)
+    await publisher.connect()
+    feed = feed_module.FundingFeed(settings=settings, publisher=publisher)
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    await feed.start()
+    try:
+        await stop.wait()
+    finally:
+        await feed.stop()
+        await publisher.close()
+
+
+def _worker_main(*args) -> None:
+    logging.basicConfig(level=logging.WARNING, format=f"%(asctime)s {args[0]} %(name)s %(message)s")
+    logging.getLogger("market_feed.sharding").setLevel(logging.INFO)
+    asyncio.run(_run_worker(*args))
+
+
+def _analyze(entries, events, expected_changes: int):
+    """entries: [(ms, exchange, symbol, worker)]，按流顺序；events: [(ms, 描述)]。"""
+    keys = sorted({(exchange, symbol) for _, exchange, symbol, _ in entries})
+    problems = []
+
+    # 每次成员变化后留出 TTL + 若干周期让租约稳定，检查到下一次变化之间的窗口
+    settle_ms = int((LEASE_TTL_SECS + 4 * INTERVAL_SECS) * 1000)
+    windows = []
+    for (start, label), (end, _) in zip(events, events[1:]):
+        if end - (start + settle_ms) > 500:
+            windows.append((label, start + settle_ms, end))
+    for label, start, end in windows:
+        publishers = {}
+        for ms, exchange, symbol, worker in entries:
+            if start <= ms < end:
+                publishers.setdefault((exchange, symbol), set()).add(worker)
+        missing = [key for key in keys if key not in publishers]
+        doubled = {key: sorted(workers) for key, workers in publishers.items() if len(workers) > 1}
+        owners = {}
+        for workers in publishers.values():
+            for worker in workers:
+                owners[worker] = owners.get(worker, 0) + 1
+        print(f"  window after {label:14s} {(end - start) / 1000:4.1f}s  symbols by worker {dict(sorted(owners.items()))}")
+        if missing:
+            problems.append(f"{label}: {len(missing)} symbols not published, e.g. {missing[:3]}")
+        if doubled:
+            problems.append(f"{label}: {len(doubled)} symbols published by several workers, e.g. {list(doubled.items())[:3]}")
+
+    switches = {}
+    gaps = {}
+    last = {}
+    for ms, exchange, symbol, worker in entries:
+        key = (exchange, symbol)
+        if key in last:
+            previous_ms, previous_worker = last[key]
+            gaps[key] = max(gaps.get(key, 0), ms - previous_ms)
+            if worker != previous_worker:
+                switches[key] = switches.get(key, 0) + 1
+        last[key] = (ms, worker)
+    most_switches = max(switches.values(), default=0)
+    max_gap = max(gaps.values(), default=0) / 1000
+    gap_bound = LEASE_TTL_SECS * 2 + 4 * INTERVAL_SECS
+    print(
+        f"  {len(entries)} entries, {len(keys)} symbols, max publisher switches per symbol {most_switches} "
+        f"(membership changes {expected_changes}), max publish gap {max_gap:.2f}s (bound {gap_bound:.1f}s)"
+    )
+    if most_switches > expected_changes:
+        flapping = sorted(switches.items(), key=lambda item: -item[1])[:3]
+        problems.append(f"publisher alternates more often than membership changes: {flapping}")
+    if max_gap > gap_bound:
+        worst = max(gaps.items(), key=lambda item: item[1])
+        problems.append(f"symbol {worst[0]} went {worst[1] / 1000:.2f}s without a publish")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--redis-url", default=None, help="use an existing Redis instead of redislite")
+    parser.add_argument("--symbols", type=int, default=60, help="synthetic symbols per venue")
+    parser.add_argument("--phase-secs", type=float, default=8.0, help="time between membership changes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server = None
+        redis_url = args.redis_url
+        if redis_url is None:
+            try:
+                import redislite
+            except ImportError:
+                sys.exit("redislite is not installed; pass --redis-url")
+            server = redislite.Redis(os.path.join(workdir, "redis.db"))
+            redis_url = f"unix://{server.socket_file}"
+        client = Redis.from_url(redis_url, decode_responses=True)
+        stream_key = f"check_sharded_feed:{os.getpid()}"
+
+        recording = os.path.join(workdir, "synthetic.jsonl.gz")
+        asyncio.run(_synthesize(Path(recording), args.symbols, 0.0))
+
+        context = multiprocessing.get_context("spawn")
+        workers = {}
+        events = []
+
+        def start(worker_id):
+            process = context.Process(
+                target=_worker_main, args=(worker_id, redis_url, recording, workdir, stream_key), daemon=True
+            )
+            process.start()
+            workers[worker_id] = process
+
+        def mark(label):
+            events.append((int(time.time() * 1000), label))
+            print(f"{label} ({len(workers)} processes)")
+
+        try:
+            start("w1")
+            start("w2")
+            mark("start w1 w2")
+            time.sleep(args.phase_secs)
+            start("w3")
+            mark("join w3")
+            time.sleep(args.phase_secs)
+            workers["w1"].terminate()
+            workers.pop("w1").join(10)
+            mark("stop w1")
+            time.sleep(args.phase_secs)
+            workers["w2"].kill()
+            workers.pop("w2").join(10)
+            mark("kill w2")
+            time.sleep(args.phase_secs + LEASE_TTL_SECS)
+            mark("end")
+        finally:
+            for process in workers.values():
+                process.terminate()
+                process.join(10)
+
+        entries = []
+        for entry_id, fields in client.xrange(stream_key):
+            entries.append((int(entry_id.split("-")[0]), fields["exchange"], fields["symbol"], fields["worker"]))
+        client.delete(stream_key)
+        client.close()
+        if server is not None:
+            server.shutdown()
+
+    problems = _analyze(entries, events, expected_changes=len(events) - 2)
+    if problems:
+        for problem in problems:
+            print("FAIL", problem)
+        sys.exit(1)
+    print("sharded feed ok")
+
+
+if __name__ == "__main__":
+    main()
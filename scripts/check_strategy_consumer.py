@@ -0,0 +1,152 @@
+"""Check that a lagging strategy-engine consumer still evaluates funding changes.
+
+The feed's delta filter refreshes captured_at in the latest-value index for snapshots it suppresses,
+so when the consumer falls behind, the index can be newer than the stream entry being processed.
+Two cases are run against one Redis stream:
+
+  - catch-up: the consumer is running but reads a real change only after the index was refreshed;
+  - restart: the consumer restarts (warm-loading the refreshed index) and then reads the change.
+
+In both, the change must produce an opportunity instead of being dropped as a stale entry.
+
+Uses a throwaway redislite server when no --redis-url is given.
+Usage: python scripts/check_strategy_consumer.py [--redis-url redis://localhost:6379/15]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from redis.asyncio import Redis
+
+from libs.bus import FundingPublisher
+from libs.models import FundingSnapshot
+
+STRATEGY_APP = ROOT / "services" / "strategy-engine" / "app.py"
+NEXT_FUNDING_MS = int(time.time() * 1000) + 3600_000
+
+
+class RecordingPublisher:
+    def __init__(self) -> None:
+        self.opportunities: list = []
+
+    async def publish(self, opportunity) -> str:
+        self.opportunities.append(opportunity)
+        return "0-0"
+
+
+def _load_engine(stream_key: str, consumer: str):
+    spec = importlib.util.spec_from_file_location(f"strategy_engine_{consumer}", STRATEGY_APP)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)  # type: ignore[union-attr]
+    module.FUNDING_STREAM = stream_key
+    module.CONSUMER_NAME = consumer
+    module.opportunity_publisher = RecordingPublisher()
+    return module
+
+
+def _snapshot(exchange: str, symbol: str, rate: float, captured_at_ms: int) -> FundingSnapshot:
+    return FundingSnapshot(
+        exchange=exchange,
+        symbol=symbol,
+        funding_rate_raw=rate,
+        settle_interval_hours=8,
+        next_funding_time_ms=NEXT_FUNDING_MS,
+        captured_at_ms=captured_at_ms,
+    )
+
+
+async def _lagging_change(publisher: FundingPublisher, symbol: str) -> None:
+    """Binance 的费率大幅变化进入 stream；随后几轮没变化，只刷新了索引里的 captured_at。"""
+    now = int(time.time() * 1000)
+    change = _snapshot("binance", symbol, 0.003, now)
+    await publisher.publish_many([change])
+    await publisher.refresh_latest([_snapshot("binance", symbol, 0.003, now + 30_000)])
+
+
+async def _read_and_process(engine, client: Redis) -> None:
+    while True:
+        reply = await client.xreadgroup(engine.GROUP_NAME, engine.CONSUMER_NAME, {engine.FUNDING_STREAM: ">"}, count=100)
+        if not reply:
+            return
+        await engine.process_entries(client, reply[0][1])
+
+
+async def _main(redis_url: str) -> int:
+    stream_key = f"check_strategy_consumer:{os.getpid()}"
+    publisher = FundingPublisher(
+        SimpleNamespace(redis_url=redis_url, funding_stream_key=stream_key, bus_codec="compact")
+    )
+    await publisher.connect()
+    client = Redis.from_url(redis_url)
+    failed = 0
+    try:
+        now = int(time.time() * 1000)
+        await publisher.publish_many(
+            [_snapshot(exchange, symbol, 0.0001, now) for exchange in ("binance", "bitget") for symbol in ("AUSDT", "BUSDT")]
+        )
+        engine = _load_engine(stream_key, "check-a")
+        await engine.ensure_consumer_group(client)
+        await engine.warm_load(client)
+
+        await _lagging_change(publisher, "AUSDT")
+        await _read_and_process(engine, client)
+        found = [o.symbol for o in engine.opportunity_publisher.opportunities]
+        print(f"catch-up: opportunities={found} stats={engine.consumer_stats}")
+        if "AUSDT" not in found:
+            print("FAIL catch-up: change newer in the index than in the stream was dropped")
+            failed = 1
+
+        await _lagging_change(publisher, "BUSDT")
+        restarted = _load_engine(stream_key, "check-a")
+        await restarted.warm_load(client)
+        await _read_and_process(restarted, client)
+        found = [o.symbol for o in restarted.opportunity_publisher.opportunities]
+        print(f"restart: opportunities={found} stats={restarted.consumer_stats}")
+        if "BUSDT" not in found:
+            print("FAIL restart: change warm-loaded from the index was never evaluated")
+            failed = 1
+    finally:
+        await client.delete(stream_key, f"{stream_key}:latest:binance", f"{stream_key}:latest:bitget")
+        await client.aclose()
+        await publisher.close()
+    if not failed:
+        print("strategy consumer ok")
+    return failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--redis-url", default=None, help="use an existing Redis instead of redislite")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        server = None
+        redis_url = args.redis_url
+        if redis_url is None:
+            try:
+                import redislite
+            except ImportError:
+                sys.exit("redislite is not installed; pass --redis-url")
+            server = redislite.Redis(os.path.join(workdir, "redis.db"))
+            redis_url = f"unix://{server.socket_file}"
+        try:
+            failed = asyncio.run(_main(redis_url))
+        finally:
+            if server is not None:
+                server.shutdown()
+    sys.exit(failed)
+
+
+if __name__ == "__main__":
+    main()
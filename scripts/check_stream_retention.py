@@ -0,0 +1,190 @@
+"""Load-test funding stream retention: a lagging consumer must not lose entries.
+
+A publisher writes full-universe cycles (--symbols per venue, two venues) through
+FundingPublisher.publish_many every --cycle-secs. A consumer follows the stream with XREAD
+but pauses for --lag-secs every few reads, so it falls well behind by more than one cycle.
+Every published entry id must come back to the consumer.
+
+The same run is repeated with the old fixed ``MAXLEN ~ 1000`` trimming for comparison (expected to
+lose entries, since one cycle is already larger than 1000), and the memory budget path is
+exercised by a short run with a tiny --memory-mb budget.
+
+Uses a throwaway redislite server when no --redis-url is given.
+Usage: python scripts/check_stream_retention.py [--symbols 700] [--cycles 12] [--lag-secs 3]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from redis.asyncio import Redis
+
+from libs.bus import FundingPublisher
+from libs.models import FundingSnapshot
+
+
+def _cycle(symbols: int, cycle: int) -> list[FundingSnapshot]:
+    now_ms = int(time.time() * 1000)
+    return [
+        FundingSnapshot(
+            exchange=exchange,
+            symbol=f"SYM{i}USDT",
+            funding_rate_raw=0.0001 * ((i + cycle) % 7),
+            settle_interval_hours=8,
+            next_funding_time_ms=now_ms + 3600_000,
+            mark_price=100.0 + i + cycle,
+            index_price=100.0 + i,
+            captured_at_ms=now_ms,
+        )
+        for exchange in ("binance", "bitget")
+        for i in range(symbols)
+    ]
+
+
+async def _consume(redis: Redis, key: str, seen: set, done: asyncio.Event, lag_secs: float) -> None:
+    last_id = "0-0"
+    reads = 0
+    while True:
+        reply = await redis.xread({key: last_id}, count=500, block=200)
+        if not reply:
+            if done.is_set():
+                return
+            continue
+        for _, entries in reply:
+            for entry_id, _ in entries:
+                seen.add(entry_id)
+                last_id = entry_id
+        reads += 1
+        if lag_secs and reads % 10 == 0:
+            # 模拟处理变慢 / 短暂卡顿的消费者
+            await asyncio.sleep(lag_secs)
+
+
+async def _run(redis_url: str, label: str, args, **retention) -> dict:
+    key = f"check_stream_retention:{label}:{os.getpid()}"
+    settings = SimpleNamespace(
+        redis_url=redis_url,
+        funding_stream_key=key,
+        funding_latest_index_enabled=False,
+        stream_retention_check_secs=1.0,
+        **retention,
+    )
+    publisher = FundingPublisher(settings=settings)
+    await publisher.connect()
+    reader = Redis.from_url(redis_url, decode_responses=True)
+    published: set = set()
+    seen: set = set()
+    done = asyncio.Event()
+    consumer = asyncio.create_task(_consume(reader, key, seen, done, args.lag_secs))
+    try:
+        for cycle in range(args.cycles):
+            started = time.monotonic()
+            result = await publisher.publish_many(_cycle(args.symbols, cycle))
+            if result.failures:
+                raise RuntimeError(f"publish failed: {result.failures[0][1]}")
+            published.update(result.ids)
+            await asyncio.sleep(max(0.0, args.cycle_secs - (time.monotonic() - started)))
+        done.set()
+        await asyncio.wait_for(consumer, timeout=args.cycles * (args.cycle_secs + args.lag_secs) + 30)
+        stats = await publisher.stream_stats()
+    finally:
+        consumer.cancel()
+        await reader.delete(key)
+        await reader.aclose()
+        await publisher.close()
+    lost = len(published - seen)
+    print(
+        f"{label:10s} published={len(published)} consumed={len(seen & published)} lost={lost} "
+        f"length={stats['length']} memory={(stats['memory_bytes'] or 0) / 1024 / 1024:.1f}MB "
+        f"oldest={stats['oldest_age_secs']}s retention={json.dumps(stats['retention'])}"
+    )
+    return {"lost": lost, "stats": stats}
+
+
+async def _main(args, redis_url: str) -> int:
+    per_cycle = args.symbols * 2
+    print(f"{args.cycles} cycles x {per_cycle} snapshots every {args.cycle_secs}s, consumer pauses {args.lag_secs}s every 10 reads")
+    minid = await _run(
+        redis_url,
+        "minid",
+        args,
+        funding_stream_retention_secs=args.retention_secs,
+        funding_stream_max_memory_mb=0,
+    )
+    legacy = await _run(
+        redis_url,
+        "maxlen1000",
+        args,
+        funding_stream_retention_secs=0,
+        funding_stream_maxlen=1000,
+        funding_stream_max_memory_mb=0,
+    )
+    budget_args = SimpleNamespace(**{**vars(args), "lag_secs": 0.0, "cycles": 24})
+    budget = await _run(
+        redis_url,
+        "memory",
+        budget_args,
+        funding_stream_retention_secs=args.retention_secs,
+        funding_stream_max_memory_mb=args.memory_mb,
+    )
+
+    failed = 0
+    if minid["lost"]:
+        print(f"FAIL time-based retention lost {minid['lost']} entries")
+        failed = 1
+    if not legacy["lost"]:
+        print("note: legacy maxlen=1000 did not lose entries at this load; raise --symbols or --lag-secs")
+    if args.memory_mb and not budget["stats"]["retention"]["memory_trims"]:
+        print("FAIL memory budget was never enforced")
+        failed = 1
+    # 预算每 stream_retention_check_secs 检查一次，两次检查之间允许多出约两轮的数据
+    elif budget["stats"]["memory_bytes"] and budget["stats"]["memory_bytes"] > args.memory_mb * 1024 * 1024 * 1.5:
+        print(f"FAIL stream stayed at {budget['stats']['memory_bytes']} bytes over a {args.memory_mb}MB budget")
+        failed = 1
+    if not failed:
+        print("stream retention ok")
+    return failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--redis-url", default=None, help="use an existing Redis instead of redislite")
+    parser.add_argument("--symbols", type=int, default=700, help="symbols per venue in one cycle")
+    parser.add_argument("--cycles", type=int, default=12)
+    parser.add_argument("--cycle-secs", type=float, default=0.5)
+    parser.add_argument("--lag-secs", type=float, default=3.0, help="consumer pause every 10 reads")
+    parser.add_argument("--retention-secs", type=float, default=60.0)
+    parser.add_argument("--memory-mb", type=float, default=2.0, help="budget for the memory-trim run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server = None
+        redis_url = args.redis_url
+        if redis_url is None:
+            try:
+                import redislite
+            except ImportError:
+                sys.exit("redislite is not installed; pass --redis-url")
+            server = redislite.Redis(os.path.join(workdir, "redis.db"))
+            redis_url = f"unix://{server.socket_file}"
+        try:
+            failed = asyncio.run(_main(args, redis_url))
+        finally:
+            if server is not None:
+                server.shutdown()
+    sys.exit(failed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Record raw Binance/Bitget responses from the feed adapters into a gzip JSON Lines file for offline replay.
+
+Runs a few full fetch cycles per exchange with the production adapters (same pools, rate limits and
+endpoints) and saves every response with headers, raw body and timing.
+Usage: python scripts/record_feed.py --out recordings/feed.jsonl.gz [--cycles 3] [--gap 5] [--ingest per_symbol]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parents[1]
+FEED_DIR = ROOT / "services" / "market-feed"
+for path in (ROOT, FEED_DIR):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+from adapters import build_adapters
+from contracts import ContractCache
+from replay import Recorder
+from transport import CycleStats
+
+
+async def _run(args) -> None:
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    recorder = Recorder(str(out), max_records=args.max_records)
+    settings = SimpleNamespace(
+        bitget_ingest_mode=args.ingest,
+        bitget_symbol_limit=args.symbol_limit,
+        feed_exchanges=args.exchanges,
+    )
+    # 独立的缓存文件，确保合约列表接口也被录下来
+    contracts = ContractCache(
+        path=str(out.with_suffix(".contracts.json")),
+        seeds={"bitget": str(FEED_DIR / "bitget_contracts.json")},
+    )
+    contracts.load()
+    adapters = build_adapters(settings, contracts=contracts, recorder=recorder)
+    for adapter in adapters.values():
+        await adapter.start()
+    try:
+        for index in range(args.cycles):
+            for name, adapter in adapters.items():
+                cycle = CycleStats(name, adapter.fetch_strategy)
+                started = time.perf_counter()
+                try:
+                    snapshots = await adapter.fetch(cycle)
+                except Exception as exc:
+                    print(f"cycle {index} {name}: failed {exc!r}")
+                    continue
+                print(
+                    f"cycle {index} {name}: {len(snapshots)} snapshots, {cycle.requests} requests, "
+                    f"{time.perf_counter() - started:.2f}s"
+                )
+            if index + 1 < args.cycles:
+                await asyncio.sleep(args.gap)
+    finally:
+        for adapter in adapters.values():
+            await adapter.close()
+        recorder.save()
+    print(f"recorded {len(recorder.records)} responses -> {out}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--gap", type=float, default=5.0, help="seconds between cycles")
+    parser.add_argument("--ingest", choices=("bulk", "per_symbol"), default="bulk", help="bitget ingest mode")
+    parser.add_argument("--symbol-limit", type=int, default=None)
+    parser.add_argument("--exchanges", default=None, help="comma separated, default all")
+    parser.add_argument("--max-records", type=int, default=20000)
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
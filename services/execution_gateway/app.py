@@ -1,9 +1,11 @@
 import asyncio
 import contextlib
 import logging
+import socket
 import sys
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from fastapi import FastAPI
 from redis.asyncio import Redis
@@ -12,7 +14,7 @@ ROOT_DIR = Path(__file__).resolve().parents[2]
 if str(ROOT_DIR) not in sys.path:
     sys.path.append(str(ROOT_DIR))
 
-from libs.bus import ConfigSubscriber
+from libs.bus import ConfigSubscriber, StreamRetention, decode_opportunity, get_latest, stream_stats
 from libs.config import get_settings
 from libs.db.session import AsyncSessionLocal
 from libs.models import FundingSnapshot, Opportunity
@@ -28,10 +30,30 @@ settings = get_settings()
 redis_client: Optional[Redis] = None
 config_subscriber: Optional[ConfigSubscriber] = None
 config_task: Optional[asyncio.Task] = None
+consumer_tasks: List[asyncio.Task] = []
 
 STREAM_KEY = "funding_opportunities"
 GROUP_NAME = "execution_gateway"
 FUNDING_STREAM = "funding_snapshots"
+# 重启后沿用同一个 consumer，名下未确认的消息不会变成无人认领的孤儿
+CONSUMER_NAME = getattr(settings, "execution_consumer_name", None) or f"executor-{socket.gethostname()}"
+CLAIM_IDLE_MS = int(float(getattr(settings, "execution_claim_idle_secs", 30.0)) * 1000)
+MAX_DELIVERIES = max(1, int(getattr(settings, "execution_max_deliveries", 5)))
+OPPORTUNITY_TTL_SECONDS = float(getattr(settings, "execution_opportunity_ttl_secs", 300.0))
+DLQ_STREAM = getattr(settings, "execution_dlq_stream", f"{STREAM_KEY}:dlq")
+DLQ_RETENTION = StreamRetention.from_settings(settings, "execution_dlq", retention_secs=7 * 86400.0, max_memory_mb=64.0)
+# 没有未确认消息、空闲超过这个时长的其它 consumer（旧的 executor-{id} 等）从组里删除
+STALE_CONSUMER_MS = 3600 * 1000
+
+consumer_stats: Dict[str, int] = {
+    "handled": 0,
+    "deferred": 0,
+    "failed": 0,
+    "reclaimed": 0,
+    "expired": 0,
+    "dead_lettered": 0,
+    "consumers_removed": 0,
+}
 
 
 def _entry_price(snapshot: Optional[FundingSnapshot]) -> float:
@@ -43,20 +65,6 @@ def _entry_price(snapshot: Optional[FundingSnapshot]) -> float:
     return 1.0
 
 
-async def get_latest_snapshot(exchange: str, symbol: str) -> Optional[FundingSnapshot]:
-    if not redis_client:
-        return None
-    entries = await redis_client.xrevrange(FUNDING_STREAM, "+", "-", count=200)
-    for _, fields in entries:
-        if fields.get("exchange") == exchange and fields.get("symbol") == symbol:
-            try:
-                return FundingSnapshot.from_stream(fields)
-            except Exception as exc:  # pragma: no cover
-                logger.warning("parse snapshot failed %s/%s: %s", exchange, symbol, exc)
-                continue
-    return None
-
-
 async def ensure_consumer_group(client: Redis):
     try:
         await client.xgroup_create(STREAM_KEY, GROUP_NAME, id="0-0", mkstream=True)
@@ -65,15 +73,88 @@ async def ensure_consumer_group(client: Redis):
             raise
 
 
-async def handle_opportunity(fields: Dict[str, str]) -> bool:
-    opportunity = Opportunity.from_stream(fields)
+def _text(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def _is_expired(opportunity: Opportunity) -> bool:
+    created_at = opportunity.created_at
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - created_at).total_seconds() > OPPORTUNITY_TTL_SECONDS
+
+
+async def dead_letter(client: Redis, entry_id, fields: Dict, reason: str, deliveries: int, error: str = "") -> None:
+    """原消息连同原因写入死信 stream，并在同一事务里 ACK，不再占用 PEL。"""
+    payload = dict(fields)
+    payload.update(
+        {
+            "dlq_source_id": _text(entry_id),
+            "dlq_reason": reason,
+            "dlq_deliveries": str(deliveries),
+            "dlq_error": error[:500],
+        }
+    )
+    pipe = client.pipeline(transaction=True)
+    pipe.xadd(DLQ_STREAM, payload, **DLQ_RETENTION.xadd_kwargs())
+    pipe.xack(STREAM_KEY, GROUP_NAME, entry_id)
+    await pipe.execute()
+    consumer_stats["dead_lettered"] += 1
+    logger.warning(
+        "Dead-lettered opportunity id=%s reason=%s deliveries=%d %s", _text(entry_id), reason, deliveries, error
+    )
+
+
+async def process_entry(client: Redis, entry_id, fields: Dict, deliveries: int) -> None:
+    """处理一条机会：成功、过期或进入死信时 ACK；推迟或出错时留在 PEL，空闲 claim_idle_secs 后由回收任务重试。"""
+    if not fields:
+        # 未确认期间已被 stream 保留策略裁掉，没有内容可处理
+        await client.xack(STREAM_KEY, GROUP_NAME, entry_id)
+        consumer_stats["expired"] += 1
+        return
+    try:
+        opportunity = decode_opportunity(fields)
+    except Exception as exc:
+        await dead_letter(client, entry_id, fields, "undecodable", deliveries, str(exc))
+        return
+    if _is_expired(opportunity):
+        await client.xack(STREAM_KEY, GROUP_NAME, entry_id)
+        consumer_stats["expired"] += 1
+        logger.info("Drop stale opportunity %s id=%s", opportunity.group_id, _text(entry_id))
+        return
+    try:
+        success = await handle_opportunity(fields)
+    except Exception as exc:
+        consumer_stats["failed"] += 1
+        logger.exception("Processing opportunity id=%s failed (delivery %d): %s", _text(entry_id), deliveries, exc)
+        if deliveries >= MAX_DELIVERIES:
+            await dead_letter(client, entry_id, fields, "failed", deliveries, str(exc) or type(exc).__name__)
+        return
+    if success:
+        await client.xack(STREAM_KEY, GROUP_NAME, entry_id)
+        consumer_stats["handled"] += 1
+        return
+    consumer_stats["deferred"] += 1
+    if deliveries >= MAX_DELIVERIES:
+        await dead_letter(client, entry_id, fields, "deferred", deliveries)
+    else:
+        logger.info("Defer opportunity id=%s for retry (delivery %d/%d)", _text(entry_id), deliveries, MAX_DELIVERIES)
+
+
+async def handle_opportunity(fields: Dict) -> bool:
+    opportunity = decode_opportunity(fields)
     config = get_runtime_config()
     if not config.global_enable:
         logger.info("Global switch off, skip %s", opportunity.group_id)
         return True
 
-    long_snapshot = await get_latest_snapshot(opportunity.long_exchange, opportunity.symbol)
-    short_snapshot = await get_latest_snapshot(opportunity.short_exchange, opportunity.symbol)
+    long_key = (opportunity.long_exchange, opportunity.symbol)
+    short_key = (opportunity.short_exchange, opportunity.symbol)
+    snapshots = (
+        await get_latest(redis_client, [long_key, short_key], stream_key=FUNDING_STREAM) if redis_client else {}
+    )
+    long_snapshot = snapshots.get(long_key)
+    short_snapshot = snapshots.get(short_key)
     entry_price_long = _entry_price(long_snapshot)
     entry_price_short = _entry_price(short_snapshot)
 
@@ -123,29 +204,90 @@ async def handle_opportunity(fields: Dict[str, str]) -> bool:
     return True
 
 
-async def consume_loop(consumer_name: str):
+async def consume_loop():
     assert redis_client
     await ensure_consumer_group(redis_client)
+    # 启动时先回收一次：上次退出前没确认的、其它实例遗留的消息不必等下一轮
+    await reclaim_pending(redis_client)
     while True:
-        entries = await redis_client.xreadgroup(
-            GROUP_NAME,
-            consumer_name,
-            streams={STREAM_KEY: ">"},
-            count=20,
-            block=5000,
-        )
-        if not entries:
-            continue
-        for stream_name, stream_entries in entries:
-            for entry_id, fields in stream_entries:
-                try:
-                    success = await handle_opportunity(fields)
-                    if success:
-                        await redis_client.xack(STREAM_KEY, GROUP_NAME, entry_id)
-                    else:
-                        logger.info("Defer opportunity id=%s for retry", entry_id)
-                except Exception as exc:  # pragma: no cover
-                    logger.exception("Processing opportunity failed: %s", exc)
+        try:
+            entries = await redis_client.xreadgroup(
+                GROUP_NAME,
+                CONSUMER_NAME,
+                streams={STREAM_KEY: ">"},
+                count=20,
+                block=5000,
+            )
+            for stream_name, stream_entries in entries or []:
+                for entry_id, fields in stream_entries:
+                    await process_entry(redis_client, entry_id, fields, deliveries=1)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            if "NOGROUP" in str(exc):
+                await ensure_consumer_group(redis_client)
+                continue
+            logger.exception("Opportunity consumer failed: %s", exc)
+            await asyncio.sleep(1.0)
+
+
+async def _delivery_counts(client: Redis, entry_ids: List) -> Dict[str, int]:
+    """逐条按 id 查投递次数；按区间查会被本 consumer 名下区间内其它未确认的消息挤掉。"""
+    if not entry_ids:
+        return {}
+    pipe = client.pipeline(transaction=False)
+    for entry_id in entry_ids:
+        pipe.xpending_range(STREAM_KEY, GROUP_NAME, min=entry_id, max=entry_id, count=1, consumername=CONSUMER_NAME)
+    counts: Dict[str, int] = {}
+    for rows in await pipe.execute():
+        for row in rows:
+            counts[_text(row["message_id"])] = int(row["times_delivered"])
+    return counts
+
+
+async def reclaim_pending(client: Redis) -> int:
+    """XAUTOCLAIM 接手空闲超过 claim_idle_secs 的未确认消息（推迟的、出错的、其它实例崩溃遗留的），
+    按投递次数重试或进入死信。"""
+    start = "0-0"
+    claimed = 0
+    while True:
+        reply = await client.xautoclaim(STREAM_KEY, GROUP_NAME, CONSUMER_NAME, CLAIM_IDLE_MS, start_id=start, count=50)
+        start, entries = _text(reply[0]), [(entry_id, fields) for entry_id, fields in reply[1] if entry_id is not None]
+        # Redis 7+ 额外返回已被裁掉的消息 id，它们已从 PEL 移除
+        if entries:
+            counts = await _delivery_counts(client, [entry_id for entry_id, _ in entries])
+            for entry_id, fields in entries:
+                await process_entry(client, entry_id, fields, deliveries=counts.get(_text(entry_id), 1))
+            claimed += len(entries)
+        if start == "0-0":
+            break
+    if claimed:
+        consumer_stats["reclaimed"] += claimed
+        logger.info("Reclaimed %d pending opportunities", claimed)
+    return claimed
+
+
+async def _remove_stale_consumers(client: Redis) -> None:
+    for consumer in await client.xinfo_consumers(STREAM_KEY, GROUP_NAME):
+        name = _text(consumer["name"])
+        if name != CONSUMER_NAME and not consumer.get("pending") and consumer.get("idle", 0) > STALE_CONSUMER_MS:
+            await client.xgroup_delconsumer(STREAM_KEY, GROUP_NAME, name)
+            consumer_stats["consumers_removed"] += 1
+            logger.info("Removed idle consumer %s from %s", name, GROUP_NAME)
+
+
+async def reclaim_loop():
+    assert redis_client
+    interval = max(1.0, CLAIM_IDLE_MS / 1000 / 2)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reclaim_pending(redis_client)
+            await _remove_stale_consumers(redis_client)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.warning("Reclaim pending opportunities failed: %s", exc)
 
 
 async def _config_listener():
@@ -158,10 +300,11 @@ async def _config_listener():
 async def on_startup():
     global redis_client, config_subscriber, config_task
     await load_initial()
-    redis_client = Redis.from_url(settings.redis_url, decode_responses=True)
+    # bytes 模式读取，兼容 compact 编码
+    redis_client = Redis.from_url(settings.redis_url)
     config_task = asyncio.create_task(_config_listener())
-    consumer_name = f"executor-{id(app)}"
-    asyncio.create_task(consume_loop(consumer_name))
+    logger.info("Opportunity consumer %s in group %s", CONSUMER_NAME, GROUP_NAME)
+    consumer_tasks[:] = [asyncio.create_task(consume_loop()), asyncio.create_task(reclaim_loop())]
 
 
 @app.on_event("shutdown")
@@ -171,7 +314,26 @@ async def on_shutdown():
         config_task.cancel()
         with contextlib.suppress(asyncio.CancelledError):
             await config_task
+    for task in consumer_tasks:
+        task.cancel()
+    for task in consumer_tasks:
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
     if config_subscriber:
         await config_subscriber.stop()
     if redis_client:
         await redis_client.close()
+
+
+@app.get("/healthz")
+async def healthz():
+    health: Dict[str, Any] = {"status": "ok", "consumer": CONSUMER_NAME, "group": GROUP_NAME, **consumer_stats}
+    if redis_client:
+        try:
+            pending = await redis_client.xpending(STREAM_KEY, GROUP_NAME)
+            health["pel_size"] = pending["pending"]
+            health["pel_oldest_id"] = _text(pending["min"]) if pending["min"] else None
+            health["dlq"] = await stream_stats(redis_client, DLQ_STREAM, DLQ_RETENTION)
+        except Exception as exc:
+            health["error"] = str(exc) or type(exc).__name__
+    return health
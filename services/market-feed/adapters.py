@@ -0,0 +1,742 @@
+"""交易所适配器。
+
+每家交易所一个子类，声明抓取策略、限速参数、符号规范化与推流源；FundingFeed 只负责调度。
+每个适配器持有独立的连接池和限速器，新增交易所不会挤占已有交易所的连接与配额。
+新增交易所时继承 ExchangeAdapter 并用 ``@register_adapter`` 注册即可。
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type
+from urllib.parse import urlsplit
+
+import httpx
+
+from libs.models.funding import FundingSnapshot
+from libs.models.price import PriceTick
+from contracts import BITGET_CONTRACTS_URLS, ContractCache, ContractMeta, parse_interval_hours
+from breaker import CircuitBreaker, CircuitOpenError, EndpointSelector
+from ratelimit import EndpointLimit, HostLimits, RateLimiter
+from replay import Recorder
+from transport import DEFAULT_KEEPALIVE_EXPIRY, CycleStats, ExchangeHttp, decode_json
+from sharding import ShardCoordinator
+from universe import SymbolUniverse, canonical_symbol, parse_symbol_list
+from streaming import (
+    BINANCE_STREAM_URL,
+    BITGET_STREAM_URL,
+    BinanceMarkPriceSource,
+    BitgetTickerSource,
+    StreamSource,
+)
+
+logger = logging.getLogger("market_feed")
+
+BINANCE_FUNDING_URL = "https://fapi.binance.com/fapi/v1/premiumIndex"
+# 交易所实际使用的结算周期（小时），用于校验从 nextFundingTime 跳变推算出的周期
+SETTLE_INTERVAL_HOURS = (1, 2, 4, 8)
+BITGET_FUNDING_ENDPOINTS = [
+    # (url, include_margin_coin_param)
+    ("https://api.bitget.com/api/v2/mix/market/current-fund-rate", True),
+    ("https://api.bitget.com/api/mix/v1/market/currentFundRate", False),
+]
+# 批量模式：一次拿到整个 productType 的行情（含标记/指数价）和资金费率（含下次结算时间）
+BITGET_TICKERS_URL = "https://api.bitget.com/api/v2/mix/market/tickers"
+BITGET_BULK_FUNDING_URL = "https://api.bitget.com/api/v2/mix/market/current-fund-rate"
+
+BITGET_INGEST_MODES = ("bulk", "per_symbol")
+
+ADAPTERS: Dict[str, Type["ExchangeAdapter"]] = {}
+
+
+def register_adapter(cls: Type["ExchangeAdapter"]) -> Type["ExchangeAdapter"]:
+    if not cls.name:
+        raise ValueError(f"{cls.__name__} must declare a name")
+    ADAPTERS[cls.name] = cls
+    return cls
+
+
+def enabled_exchanges(settings) -> List[str]:
+    """feed_exchanges 为空时启用全部已注册的交易所，否则按逗号分隔的列表过滤。"""
+    configured = getattr(settings, "feed_exchanges", None)
+    if not configured:
+        return list(ADAPTERS)
+    names = [name.strip().lower() for name in str(configured).split(",") if name.strip()]
+    unknown = [name for name in names if name not in ADAPTERS]
+    if unknown:
+        logger.warning("ignore unknown exchanges in feed_exchanges: %s", unknown)
+    return [name for name in names if name in ADAPTERS]
+
+
+def build_adapters(
+    settings,
+    *,
+    contracts: ContractCache,
+    limiter: Optional[RateLimiter] = None,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+    recorder: Optional[Recorder] = None,
+) -> Dict[str, "ExchangeAdapter"]:
+    limiter = limiter or RateLimiter()
+    adapters = {
+        name: ADAPTERS[name](
+            settings=settings, contracts=contracts, limiter=limiter, transport=transport, recorder=recorder
+        )
+        for name in enabled_exchanges(settings)
+    }
+    # 只抓至少两家交易所都上市的合约（以及 feed_universe_overrides 里只做监控的合约）
+    if getattr(settings, "feed_universe_intersection", True):
+        universe = SymbolUniverse(
+            contracts,
+            {name: adapter.normalize_symbol for name, adapter in adapters.items()},
+            overrides=parse_symbol_list(getattr(settings, "feed_universe_overrides", None)),
+        )
+        for adapter in adapters.values():
+            adapter.universe = universe
+    return adapters
+
+
+class ExchangeAdapter:
+    """交易所适配器基类。子类至少声明 name 并实现 fetch。"""
+
+    name = ""
+    fetch_strategy = "bulk"
+    default_max_concurrency = 4
+    # 到期合约不超过这个数时按合约定向抓取更省额度，超过则直接全量抓取
+    max_targeted_symbols = 0
+    # 需要大量并发小请求的交易所开启 HTTP/2，多路复用到少量连接上
+    http2 = False
+    # 由 build_adapters 注入，所有适配器共享
+    universe: Optional[SymbolUniverse] = None
+    # 分片部署时由 FundingFeed 注入，只抓本 worker 持有分区内的合约
+    shard: Optional[ShardCoordinator] = None
+
+    def __init__(
+        self,
+        *,
+        settings,
+        contracts: ContractCache,
+        limiter: Optional[RateLimiter] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        recorder: Optional[Recorder] = None,
+    ) -> None:
+        self._settings = settings
+        self._contracts = contracts
+        self.limiter = limiter or RateLimiter()
+        # 最近一次全量抓取因不可配对（或分片部署时归其它 worker）而跳过的合约数
+        self.pruned_symbols = 0
+        # 统一符号 -> 合约名，合约列表版本不变时复用；多个合约名映射到同一统一符号时只保留一个
+        self._instrument_map: Optional[Dict[str, str]] = None
+        self._instrument_version = -1
+        self._shadowed: Set[str] = set()
+        self.symbol_collisions: Dict[str, List[str]] = {}
+        max_concurrency = self._max_concurrency()
+        # 只用交易所公布额度的一部分，给同 IP 的其它程序留余量
+        utilization = float(getattr(settings, "feed_rate_limit_utilization", 0.8))
+        for host, limits in self.rate_limits().items():
+            self.limiter.configure(host, limits.scaled(utilization), max_concurrency=max_concurrency)
+        self.http = ExchangeHttp(
+            self.name,
+            timeout=getattr(settings, "http_timeout_secs", 10),
+            max_connections=max_concurrency,
+            limiter=self.limiter,
+            http2=self.http2 and bool(getattr(settings, "feed_http2", True)),
+            keepalive_expiry=float(getattr(settings, "feed_keepalive_expiry_secs", DEFAULT_KEEPALIVE_EXPIRY)),
+            breaker_factory=lambda endpoint: CircuitBreaker(
+                endpoint,
+                window=int(getattr(settings, "circuit_breaker_window", 20)),
+                min_calls=int(getattr(settings, "circuit_breaker_min_calls", 5)),
+                failure_ratio=float(getattr(settings, "circuit_breaker_failure_ratio", 0.5)),
+                open_secs=float(getattr(settings, "circuit_breaker_open_secs", 30.0)),
+            ),
+            transport=transport,
+            recorder=recorder,
+        )
+
+    def rate_limits(self) -> Dict[str, HostLimits]:
+        """host -> 交易所公布的限额；未声明的 host 由 RateLimiter 给保守默认值。"""
+        return {}
+
+    def _max_concurrency(self) -> int:
+        return getattr(self._settings, f"{self.name}_max_concurrency", None) or self.default_max_concurrency
+
+    async def start(self) -> None:
+        await self.http.start()
+
+    async def close(self) -> None:
+        await self.http.close()
+
+    def normalize_symbol(self, raw: str) -> str:
+        """交易所合约名 -> 统一符号（策略引擎按它跨交易所配对）。"""
+        return canonical_symbol(raw)
+
+    def is_tradable(self, instrument: str) -> bool:
+        """合约能否跨交易所配对（或在 overrides 里）且归本 worker 负责；可配对集合未知时一律放行。"""
+        self._instruments()
+        if instrument in self._shadowed:
+            # 与另一个合约撞了统一符号，不发布，避免两份快照互相覆盖
+            return False
+        symbol = self.normalize_symbol(instrument)
+        if self.shard is not None and not self.shard.owns(symbol):
+            return False
+        return self.universe is None or self.universe.allows(symbol)
+
+    def _instruments(self) -> Dict[str, str]:
+        """统一符号 -> 合约名。
+
+        同一交易所两个合约映射到同一统一符号（如同时上市 PEPEUSDT 与 1000PEPEUSDT）时记为冲突并告警：
+        优先保留与统一符号同名的合约，否则取字典序最小的，其余合约不再发布。
+        """
+        version = self._contracts.version(self.name)
+        if self._instrument_map is not None and version == self._instrument_version:
+            return self._instrument_map
+        candidates: Dict[str, List[str]] = {}
+        for instrument in self._contracts.symbols(self.name):
+            candidates.setdefault(self.normalize_symbol(instrument), []).append(instrument)
+        instruments: Dict[str, str] = {}
+        collisions: Dict[str, List[str]] = {}
+        for symbol, names in candidates.items():
+            names.sort(key=lambda name: (name != symbol, name))
+            instruments[symbol] = names[0]
+            if len(names) > 1:
+                collisions[symbol] = names
+                if names != self.symbol_collisions.get(symbol):
+                    logger.warning(
+                        "%s instruments %s all map to %s; publishing %s only", self.name, names, symbol, names[0]
+                    )
+        self._shadowed = {name for names in collisions.values() for name in names[1:]}
+        self.symbol_collisions = collisions
+        self._instrument_map = instruments
+        self._instrument_version = version
+        return instruments
+
+    async def fetch(self, cycle: CycleStats) -> List[FundingSnapshot]:
+        raise NotImplementedError
+
+    async def fetch_symbols(self, cycle: CycleStats, symbols: List[str]) -> List[FundingSnapshot]:
+        """只抓指定合约；默认退化为全量抓取后过滤。"""
+        wanted = set(symbols)
+        return [snapshot for snapshot in await self.fetch(cycle) if snapshot.symbol in wanted]
+
+    async def fetch_prices(self, cycle: CycleStats, symbols: List[str]) -> List[PriceTick]:
+        """指定合约的标记/指数价；默认从定向抓取的资金费率快照里取。"""
+        ticks: List[PriceTick] = []
+        for snapshot in await self.fetch_symbols(cycle, symbols):
+            if snapshot.mark_price is not None or snapshot.index_price is not None:
+                ticks.append(
+                    PriceTick(
+                        exchange=self.name,
+                        symbol=snapshot.symbol,
+                        instrument=snapshot.instrument,
+                        mark_price=snapshot.mark_price,
+                        index_price=snapshot.index_price,
+                        captured_at_ms=snapshot.captured_at_ms,
+                    )
+                )
+        return ticks
+
+    def _price_ticks(self, items: List[dict], symbols: List[str]) -> List[PriceTick]:
+        """从交易所原始记录（markPrice / indexPrice 字段）里挑出指定合约。"""
+        wanted = set(symbols)
+        now_ms = int(datetime.now(tz=timezone.utc).timestamp() * 1000)
+        ticks: List[PriceTick] = []
+        for item in items:
+            instrument = item.get("symbol") or ""
+            symbol = self.normalize_symbol(instrument)
+            if symbol not in wanted:
+                continue
+            try:
+                mark = float(item["markPrice"]) if item.get("markPrice") not in (None, "") else None
+                index = float(item["indexPrice"]) if item.get("indexPrice") not in (None, "") else None
+            except (TypeError, ValueError) as exc:
+                logger.warning("skip %s price for %s because %s", self.name, instrument, exc)
+                continue
+            if mark is None and index is None:
+                continue
+            ticks.append(
+                PriceTick(
+                    exchange=self.name,
+                    symbol=symbol,
+                    instrument=instrument,
+                    mark_price=mark,
+                    index_price=index,
+                    captured_at_ms=now_ms,
+                )
+            )
+        return ticks
+
+    def stream_source(self, lookup: Callable[[str], Optional[FundingSnapshot]]) -> Optional[StreamSource]:
+        """推流模式使用的数据源；不支持推流的交易所返回 None，仍按轮询抓取。"""
+        return None
+
+    async def refresh_contracts(self, cycle: CycleStats) -> None:
+        async def fetch(url: str, params: Optional[dict] = None, headers: Optional[dict] = None):
+            return await self.http.get(url, cycle=cycle, params=params, headers=headers)
+
+        await self._contracts.ensure_fresh(self.name, fetch)
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "fetch_strategy": self.fetch_strategy,
+            "pruned_symbols": self.pruned_symbols,
+            "symbol_collisions": dict(self.symbol_collisions),
+            "http": self.http.health(),
+            "endpoints": {selector.kind: selector.health() for selector in self.endpoint_selectors()},
+        }
+
+    def endpoint_selectors(self) -> List[EndpointSelector]:
+        return []
+
+
+@register_adapter
+class BinanceAdapter(ExchangeAdapter):
+    name = "binance"
+    fetch_strategy = "bulk"
+    default_max_concurrency = 2
+    # 全量 premiumIndex 权重 10，带 symbol 权重 1
+    max_targeted_symbols = 9
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        # 合约名 -> (上次看到的 nextFundingTime, 看到的时间)；以及据此推算出的实际周期
+        self._settle_seen: Dict[str, Tuple[int, int]] = {}
+        self._live_intervals: Dict[str, int] = {}
+
+    def rate_limits(self) -> Dict[str, HostLimits]:
+        # REQUEST_WEIGHT 2400/分钟；premiumIndex 不带 symbol 权重 10，fundingInfo 不计权重但单独限 500 次/5 分钟
+        return {
+            "fapi.binance.com": HostLimits(
+                rate=2400 / 60,
+                burst=200,
+                weight_limit=2400,
+                used_weight_header="X-MBX-USED-WEIGHT-1M",
+                endpoints={
+                    "/fapi/v1/premiumIndex": EndpointLimit(weight=10),
+                    "/fapi/v1/exchangeInfo": EndpointLimit(weight=1),
+                    "/fapi/v1/fundingInfo": EndpointLimit(weight=0, rate=500 / 300, burst=5),
+                },
+            )
+        }
+
+    async def fetch(self, cycle: CycleStats) -> List[FundingSnapshot]:
+        await self.refresh_contracts(cycle)
+        resp = await self.http.get(BINANCE_FUNDING_URL, cycle=cycle)
+        payload = decode_json(resp)
+        # premiumIndex 总是返回全部合约，不可配对的只在本地丢弃
+        items = [item for item in payload if self.is_tradable(item.get("symbol") or "")]
+        self.pruned_symbols = len(payload) - len(items)
+
+        snapshots: List[FundingSnapshot] = []
+        for item in items:
+            try:
+                snapshots.append(self._make_snapshot(item))
+            except Exception as exc:
+                logger.warning(
+                    "skip binance item %s because %s", item.get("symbol"), exc
+                )
+        logger.info("Fetched %d binance funding entries", len(snapshots))
+        return snapshots
+
+    async def fetch_symbols(self, cycle: CycleStats, symbols: List[str]) -> List[FundingSnapshot]:
+        instruments = self._instruments()
+
+        async def fetch_one(symbol: str) -> FundingSnapshot:
+            params = {"symbol": instruments.get(symbol, symbol)}
+            resp = await self.http.get(BINANCE_FUNDING_URL, cycle=cycle, params=params, weight=1)
+            return self._make_snapshot(decode_json(resp))
+
+        results = await asyncio.gather(*(fetch_one(symbol) for symbol in symbols), return_exceptions=True)
+        snapshots: List[FundingSnapshot] = []
+        for symbol, result in zip(symbols, results):
+            if isinstance(result, Exception):
+                logger.warning("binance funding fetch failed (%s): %s", symbol, result)
+            else:
+                snapshots.append(result)
+        return snapshots
+
+    async def fetch_prices(self, cycle: CycleStats, symbols: List[str]) -> List[PriceTick]:
+        """合约少时逐个请求 premiumIndex（weight 1），多时一次全量（weight 10）。"""
+        if len(symbols) <= self.max_targeted_symbols:
+            instruments = self._instruments()
+
+            async def fetch_one(symbol: str) -> Any:
+                params = {"symbol": instruments.get(symbol, symbol)}
+                return decode_json(await self.http.get(BINANCE_FUNDING_URL, cycle=cycle, params=params, weight=1))
+
+            results = await asyncio.gather(*(fetch_one(symbol) for symbol in symbols), return_exceptions=True)
+            items = []
+            for symbol, result in zip(symbols, results):
+                if isinstance(result, Exception):
+                    logger.warning("binance price fetch failed (%s): %s", symbol, result)
+                else:
+                    items.extend(result if isinstance(result, list) else [result])
+        else:
+            items = decode_json(await self.http.get(BINANCE_FUNDING_URL, cycle=cycle))
+        return self._price_ticks(items, symbols)
+
+    def _make_snapshot(self, item: dict) -> FundingSnapshot:
+        snapshot = FundingSnapshot.from_binance(item)
+        live_hours = parse_interval_hours(item.get("fundingIntervalHours"), default=0) or self._observed_interval(
+            snapshot.symbol, snapshot.next_funding_time_ms, snapshot.captured_at_ms
+        )
+        meta = self._contracts.get("binance", snapshot.symbol)
+        if live_hours:
+            # 交易所盘中会调整周期（如 8h -> 4h），以实时数据为准，合约缓存（最长 6 小时）只作兜底
+            snapshot.settle_interval_hours = live_hours
+        elif meta is not None:
+            snapshot.settle_interval_hours = meta.funding_interval_hours
+        # instrument 保留交易所合约名（如 1000PEPEUSDT），symbol 用统一符号
+        snapshot.symbol = self.normalize_symbol(snapshot.symbol)
+        return snapshot
+
+    def _observed_interval(self, instrument: str, next_ms: int, now_ms: int) -> int:
+        """premiumIndex 不带周期：从相邻两次观测到的 nextFundingTime 跳变推算实际结算周期，推算不出返回 0。
+
+        只有上次观测距今不到 1 小时（最短周期）时才采信，否则中间可能错过了一次结算。
+        """
+        if next_ms <= 0:
+            return 0
+        previous = self._settle_seen.get(instrument)
+        self._settle_seen[instrument] = (next_ms, now_ms)
+        if previous is not None:
+            prev_next, prev_seen = previous
+            step_hours = (next_ms - prev_next) / 3_600_000
+            if prev_next != next_ms and now_ms - prev_seen < 3_600_000 and step_hours in SETTLE_INTERVAL_HOURS:
+                self._live_intervals[instrument] = int(step_hours)
+        return self._live_intervals.get(instrument, 0)
+
+    def stream_source(self, lookup: Callable[[str], Optional[FundingSnapshot]]) -> Optional[StreamSource]:
+        return BinanceMarkPriceSource(getattr(self._settings, "binance_stream_url", None) or BINANCE_STREAM_URL)
+
+
+@register_adapter
+class BitgetAdapter(ExchangeAdapter):
+    name = "bitget"
+    http2 = True
+    # 批量模式一轮只要 2 个请求，只有 1 个合约到期时逐个请求才更省
+    max_targeted_symbols = 1
+
+    def __init__(self, *, settings, contracts: ContractCache, limiter=None, transport=None, recorder=None) -> None:
+        super().__init__(
+            settings=settings, contracts=contracts, limiter=limiter, transport=transport, recorder=recorder
+        )
+        self._symbol_limit = getattr(settings, "bitget_symbol_limit", None)
+        self._product_type = getattr(settings, "bitget_product_type", "USDT-FUTURES").upper()
+        self.fetch_strategy = str(getattr(settings, "bitget_ingest_mode", "bulk")).lower()
+        if self.fetch_strategy not in BITGET_INGEST_MODES:
+            logger.warning("unknown bitget_ingest_mode %r, fallback to bulk", self.fetch_strategy)
+            self.fetch_strategy = "bulk"
+        self._debug_logged = 0
+        # v2/v1 资金费率接口，记住上次成功的那个
+        self._funding_endpoints = EndpointSelector(
+            "bitget_funding", BITGET_FUNDING_ENDPOINTS, key=lambda endpoint: endpoint[0]
+        )
+
+    def rate_limits(self) -> Dict[str, HostLimits]:
+        # 公共行情接口每个 endpoint 按 IP 限 20 次/秒，整体 6000 次/分钟；
+        # x-mbx-used-remain-limit 是本秒剩余次数，返回时用来提前降速
+        paths = [urlsplit(url).path for url, _ in BITGET_FUNDING_ENDPOINTS]
+        paths += [urlsplit(url).path for url in (BITGET_TICKERS_URL, *BITGET_CONTRACTS_URLS)]
+        return {
+            "api.bitget.com": HostLimits(
+                rate=6000 / 60,
+                burst=100,
+                remaining_header="x-mbx-used-remain-limit",
+                endpoints={path: EndpointLimit(rate=20, burst=20) for path in paths},
+            )
+        }
+
+    def endpoint_selectors(self) -> List[EndpointSelector]:
+        return [self._funding_endpoints]
+
+    def _max_concurrency(self) -> int:
+        # 沿用旧配置项 bitget_concurrency
+        return getattr(self._settings, "bitget_concurrency", None) or self.default_max_concurrency
+
+    def normalize_symbol(self, raw: str) -> str:
+        if not raw:
+            return raw
+        if raw.endswith("_UMCBL") or raw.endswith("_DMCBL"):
+            raw = raw.split("_", 1)[0]
+        return canonical_symbol(raw)
+
+    def stream_source(self, lookup: Callable[[str], Optional[FundingSnapshot]]) -> Optional[StreamSource]:
+        return BitgetTickerSource(
+            getattr(self._settings, "bitget_stream_url", None) or BITGET_STREAM_URL,
+            inst_type=self._product_type,
+            lookup=lookup,
+        )
+
+    async def fetch(self, cycle: CycleStats) -> List[FundingSnapshot]:
+        self._debug_logged = 0
+        logger.debug("start bitget refresh: strategy=%s limit=%s", self.fetch_strategy, self._symbol_limit)
+
+        # 合约列表走本地缓存，TTL 到期才发条件请求
+        await self.refresh_contracts(cycle)
+        listed = self._contracts.symbols("bitget")
+        if not listed:
+            return []
+        # 只有一家交易所上市的合约无法配对，不为它们发逐个请求
+        symbols = [symbol for symbol in listed if self.is_tradable(symbol)]
+        self.pruned_symbols = len(listed) - len(symbols)
+        contract_margin = self._contracts.margin_coins("bitget")
+
+        if self._symbol_limit:
+            symbols = symbols[: self._symbol_limit]
+
+        snapshots: List[FundingSnapshot] = []
+        pending = symbols
+        tickers: Dict[str, dict] = {}
+        if self.fetch_strategy == "bulk":
+            bulk_snapshots, tickers = await self._fetch_bulk(symbols, cycle)
+            snapshots.extend(bulk_snapshots)
+            covered = {snapshot.instrument for snapshot in bulk_snapshots}
+            pending = [symbol for symbol in symbols if symbol not in covered]
+            cycle.fallback_symbols = len(pending)
+            if pending:
+                logger.info("bitget bulk missed %d symbols, fallback to per-symbol fetch", len(pending))
+
+        if pending:
+            snapshots.extend(await self._fetch_per_symbol(pending, contract_margin, tickers, cycle))
+
+        logger.info("Fetched %d bitget funding entries", len(snapshots))
+        return snapshots
+
+    async def fetch_symbols(self, cycle: CycleStats, symbols: List[str]) -> List[FundingSnapshot]:
+        # 调度器用统一符号，请求需要合约名
+        instruments = self._instruments()
+        targets = [instruments.get(symbol, symbol) for symbol in symbols]
+        return await self._fetch_per_symbol(targets, self._contracts.margin_coins("bitget"), {}, cycle)
+
+    async def fetch_prices(self, cycle: CycleStats, symbols: List[str]) -> List[PriceTick]:
+        """一次 tickers 请求拿到整个 productType 的标记/指数价。"""
+        tickers = await self._fetch_bulk_records(BITGET_TICKERS_URL, {"productType": self._product_type}, cycle)
+        return self._price_ticks(list(tickers.values()), symbols)
+
+    async def _fetch_bulk(
+        self, symbols: List[str], cycle: CycleStats
+    ) -> Tuple[List[FundingSnapshot], Dict[str, dict]]:
+        """两次请求拿到整个 productType 的资金费率、下次结算时间与标记/指数价。"""
+        params = {"productType": self._product_type}
+        tickers = await self._fetch_bulk_records(BITGET_TICKERS_URL, params, cycle)
+        rates = await self._fetch_bulk_records(BITGET_BULK_FUNDING_URL, params, cycle)
+
+        snapshots: List[FundingSnapshot] = []
+        for symbol in symbols:
+            rate = rates.get(symbol)
+            # 没有下次结算时间的记录交给逐个请求兜底，避免发布错误的倒计时
+            if not rate or rate.get("nextUpdate") in (None, ""):
+                continue
+            merged = dict(tickers.get(symbol) or {})
+            merged.update({key: value for key, value in rate.items() if value not in (None, "")})
+            merged["symbol"] = symbol
+            try:
+                snapshots.append(self.make_snapshot(merged, self._contracts.get("bitget", symbol)))
+            except Exception as exc:
+                logger.warning("normalize bitget bulk funding failed (%s): %s", symbol, exc)
+        return snapshots, tickers
+
+    async def _fetch_bulk_records(
+        self, url: str, params: dict, cycle: CycleStats
+    ) -> Dict[str, dict]:
+        try:
+            resp = await self.http.get(url, cycle=cycle, params=params)
+            payload = decode_json(resp)
+        except Exception as exc:
+            logger.warning("bitget bulk request failed via %s: %s", url, exc)
+            return {}
+
+        data = payload.get("data") if isinstance(payload, dict) else None
+        if not isinstance(data, list):
+            logger.warning("bitget bulk response unexpected via %s: %s", url, str(payload)[:200])
+            return {}
+
+        records: Dict[str, dict] = {}
+        for item in data:
+            if isinstance(item, dict) and item.get("symbol"):
+                records[item["symbol"]] = item
+        logger.debug("bitget bulk %s returned %d records", url, len(records))
+        return records
+
+    async def _fetch_per_symbol(
+        self,
+        symbols: List[str],
+        contract_margin: Dict[str, str],
+        tickers: Dict[str, dict],
+        cycle: CycleStats,
+    ) -> List[FundingSnapshot]:
+        snapshots: List[FundingSnapshot] = []
+
+        async def fetch_one(contract_symbol: str) -> Optional[FundingSnapshot]:
+            # 并发与速率由 self.http 统一控制
+            params_base = {
+                "symbol": contract_symbol.split("_", 1)[0],
+                "productType": self._product_type,
+                "marginCoin": contract_margin.get(contract_symbol, "USDT"),
+            }
+
+            for endpoint in self._funding_endpoints.ordered():
+                url, with_margin = endpoint
+                params = dict(params_base)
+                if not with_margin:
+                    params.pop("marginCoin", None)
+                try:
+                    resp = await self.http.get(url, cycle=cycle, params=params)
+                except CircuitOpenError:
+                    continue
+                except Exception as exc:
+                    logger.debug("bitget funding request failed via %s: %s", url, exc)
+                    continue
+
+                payload = decode_json(resp)
+                data = payload.get("data")
+                if not data:
+                    logger.warning(
+                        "bitget funding response empty (%s via %s): %s",
+                        contract_symbol,
+                        url,
+                        payload,
+                    )
+                    if self._debug_logged < 5:
+                        logger.error(
+                            "bitget empty data payload (%s via %s): %s",
+                            contract_symbol,
+                            url,
+                            payload,
+                        )
+                        self._debug_logged += 1
+                    continue
+                if isinstance(data, dict):
+                    # v1 接口返回 dict，资金费率位于 data["data"][0]
+                    if "data" in data and isinstance(data["data"], list):
+                        records = data["data"]
+                    elif "list" in data and isinstance(data["list"], list):
+                        records = data["list"]
+                    else:
+                        records = [data]
+                else:
+                    records = data if isinstance(data, list) else []
+
+                if not records:
+                    logger.warning(
+                        "bitget funding records empty (%s via %s): %s",
+                        contract_symbol,
+                        url,
+                        payload,
+                    )
+                    if self._debug_logged < 5:
+                        logger.error(
+                            "bitget empty records payload (%s via %s): %s",
+                            contract_symbol,
+                            url,
+                            payload,
+                        )
+                        self._debug_logged += 1
+                    continue
+
+                snapshot_raw = dict(records[0])
+                if self._debug_logged < 5:
+                    logger.warning(
+                        "bitget raw snapshot sample (%s): %s",
+                        contract_symbol,
+                        snapshot_raw,
+                    )
+                    self._debug_logged += 1
+                else:
+                    logger.debug(
+                        "bitget raw snapshot (%s): %s",
+                        contract_symbol,
+                        snapshot_raw,
+                    )
+                snapshot_raw.setdefault("symbol", contract_symbol)
+                # 批量行情里已有的标记/指数价顺带补上
+                ticker = tickers.get(contract_symbol) or {}
+                for key in ("markPrice", "indexPrice"):
+                    if snapshot_raw.get(key) in (None, "") and ticker.get(key) not in (None, ""):
+                        snapshot_raw[key] = ticker[key]
+                self._funding_endpoints.succeeded(endpoint)
+                try:
+                    return self.make_snapshot(snapshot_raw, self._contracts.get("bitget", contract_symbol))
+                except Exception as exc:
+                    logger.warning("normalize bitget funding failed (%s): %s", contract_symbol, exc)
+                    return None
+
+            return None
+
+        tasks = [asyncio.create_task(fetch_one(symbol)) for symbol in symbols]
+        if not tasks:
+            return []
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for symbol_name, result in zip(symbols, results):
+            if isinstance(result, Exception):
+                logger.warning("bitget fetch task failed (%s): %s", symbol_name, result)
+                continue
+            if result:
+                snapshots.append(result)
+            else:
+                logger.warning("bitget funding empty after parse for %s", symbol_name)
+        return snapshots
+
+    def make_snapshot(self, item: dict, meta: Optional[ContractMeta] = None) -> FundingSnapshot:
+        # Handle both v1 and v2 field names from Bitget responses.
+        def _first_non_null(*keys, default=None):
+            for key in keys:
+                if key in item:
+                    value = item.get(key)
+                    if value is not None and value != "":
+                        return value
+            return default
+
+        def _coerce_float(value, default=0.0) -> float:
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return float(default)
+
+        def _coerce_int(value, default=0) -> int:
+            try:
+                return int(float(value))
+            except (TypeError, ValueError):
+                return int(default)
+
+        raw_rate_value = _first_non_null("fundingRate", "fundRate", "realTimeFundRate", default=0.0)
+        raw_rate = _coerce_float(raw_rate_value, 0.0)
+
+        # 交易所盘中会调整周期，优先用本次返回的周期；没带时才用合约缓存
+        interval_value = _first_non_null(
+            "fundingRateInterval",
+            "fundingInterval",
+            "fundInterval",
+            "fundingTimeInterval",
+        )
+        if interval_value is not None:
+            settle_hours = parse_interval_hours(interval_value)
+        elif meta is not None:
+            settle_hours = meta.funding_interval_hours
+        else:
+            settle_hours = 8
+
+        next_time_value = _first_non_null(
+            "nextUpdate",
+            "nextFundTime",
+            "nextFundingTime",
+            "nextTimestamp",
+            default=0,
+        )
+        next_time_ms = _coerce_int(next_time_value, 0)
+
+        symbol = _first_non_null("symbol", "symbolName", "instId", default="")
+        mark_value = _first_non_null("markPrice", "markPr", default=None)
+        index_value = _first_non_null("indexPrice", "indexPr", default=None)
+        captured_at_ms = int(datetime.now(tz=timezone.utc).timestamp() * 1000)
+
+        return FundingSnapshot(
+            exchange="bitget",
+            symbol=self.normalize_symbol(symbol),
+            funding_rate_raw=raw_rate,
+            settle_interval_hours=settle_hours,
+            next_funding_time_ms=next_time_ms,
+            instrument=symbol,
+            mark_price=_coerce_float(mark_value) if mark_value is not None else None,
+            index_price=_coerce_float(index_value) if index_value is not None else None,
+            captured_at_ms=captured_at_ms,
+        )
@@ -2,366 +2,877 @@ import os
 import sys
 import asyncio
 import logging
+import time
 from contextlib import asynccontextmanager       
-from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
-import httpx
-from fastapi import FastAPI, HTTPException
+import orjson
+from redis.asyncio import Redis
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 
 # 让 Python 能导入项目根目录下的 libs.*
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 if ROOT_DIR not in sys.path:
     sys.path.append(ROOT_DIR)
+# 同目录下的辅助模块（目录名带连字符，不能作为包导入）
+FEED_DIR = os.path.dirname(os.path.abspath(__file__))
+if FEED_DIR not in sys.path:
+    sys.path.append(FEED_DIR)
 
-from libs.bus import FundingPublisher
+from libs.bus import FundingPublisher, PricePublisher
 from libs.config import get_settings
 from libs.models.funding import FundingSnapshot
+from libs.models.price import PriceTick
+from libs.runtime_config import get_runtime_config
+from adapters import ExchangeAdapter, build_adapters
+from contracts import ContractCache
+from prices import PriceSampler
+from priority import PriorityTracker, load_open_positions
+from push import PushHub, Subscriber
+from query import SnapshotIndex
+from ratelimit import RateLimiter
+from replay import Faults, Recorder, ReplayTransport
+from retry import RetryQueue
+from scheduler import SettlementScheduler
+from sharding import ShardCoordinator
+from transport import CycleStats
+from universe import canonical_symbol, parse_symbol_list
+from streaming import StreamIngestor
 
 logger = logging.getLogger("market_feed")
 logging.basicConfig(level=logging.INFO)
 
-BINANCE_FUNDING_URL = "https://fapi.binance.com/fapi/v1/premiumIndex"
-BITGET_CONTRACTS_URLS = [
-    "https://api.bitget.com/api/v2/mix/market/contracts",
-    "https://api.bitget.com/api/mix/v1/market/contracts",
-]
-BITGET_FUNDING_ENDPOINTS = [
-    # (url, include_margin_coin_param)
-    ("https://api.bitget.com/api/v2/mix/market/current-fund-rate", True),
-    ("https://api.bitget.com/api/mix/v1/market/currentFundRate", False),
-]
+FEED_MODES = ("poll", "stream")
+SCHEDULE_MODES = ("fixed", "settlement")
+# 调度循环的最短睡眠，避免同一时刻大量合约到期时空转
+MIN_SCHEDULE_SLEEP_SECS = 0.2
+
+
+class PipelineState:
+    """单个交易所抓取管道的调度参数与健康状态。"""
+
+    def __init__(self, name: str, *, interval: float, timeout: float, error_budget: int) -> None:
+        self.name = name
+        self.interval = max(1.0, float(interval))
+        self.timeout = max(1.0, float(timeout))
+        self.error_budget = max(1, int(error_budget))
+        self.last_success_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_duration_secs: Optional[float] = None
+        self.consecutive_failures = 0
+        self.cycles = 0
+
+    @property
+    def degraded(self) -> bool:
+        return self.consecutive_failures >= self.error_budget
+
+    def mark_success(self, duration: float) -> None:
+        self.cycles += 1
+        self.last_success_at = time.time()
+        self.last_duration_secs = duration
+        self.consecutive_failures = 0
+        self.last_error = None
+
+    def mark_failure(self, duration: float, error: str) -> None:
+        self.cycles += 1
+        self.last_duration_secs = duration
+        self.consecutive_failures += 1
+        self.last_error = error
+
+    def next_delay(self) -> float:
+        # 连续失败超过预算后按指数退避，最多放慢到 10 倍间隔，避免持续打满故障交易所
+        if not self.degraded:
+            return self.interval
+        overshoot = self.consecutive_failures - self.error_budget
+        return min(self.interval * 10, self.interval * (2 ** (overshoot + 1)))
+
+    def health(self) -> Dict[str, Any]:
+        age = None
+        if self.last_success_at is not None:
+            age = round(time.time() - self.last_success_at, 1)
+        return {
+            "status": "degraded" if self.degraded else ("ok" if age is not None else "starting"),
+            "last_success_age_secs": age,
+            "consecutive_failures": self.consecutive_failures,
+            "error_budget": self.error_budget,
+            "interval_secs": self.interval,
+            "timeout_secs": self.timeout,
+            "last_duration_secs": None if self.last_duration_secs is None else round(self.last_duration_secs, 3),
+            "last_error": self.last_error,
+        }
+
+
+class DeltaFilter:
+    """只放行有实质变化的快照：记住每个 (exchange, symbol) 上次发布的值，每 N 轮全量抓取强制全部发布一次。
+
+    只有全量抓取（full=True）计入轮数；推流批次、定向抓取和重试批次只按变化过滤。
+    """
+
+    def __init__(
+        self,
+        *,
+        rate_epsilon: float,
+        price_epsilon: float,
+        full_refresh_cycles: int,
+    ) -> None:
+        self._rate_epsilon = rate_epsilon
+        self._price_epsilon = price_epsilon
+        self._full_refresh_cycles = max(1, int(full_refresh_cycles))
+        self._published: Dict[Tuple[str, str], FundingSnapshot] = {}
+        self._cycles: Dict[str, int] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def select(self, exchange: str, snapshots: List[FundingSnapshot], *, full: bool = False) -> List[FundingSnapshot]:
+        force = False
+        if full:
+            cycle = self._cycles.get(exchange, 0)
+            self._cycles[exchange] = cycle + 1
+            force = cycle % self._full_refresh_cycles == 0
+        counters = self._counters.setdefault(
+            exchange, {"emitted": 0, "suppressed": 0, "forced_cycles": 0}
+        )
+        if force:
+            counters["forced_cycles"] += 1
+
+        selected: List[FundingSnapshot] = []
+        for snapshot in snapshots:
+            key = (snapshot.exchange, snapshot.symbol)
+            if force or self._changed(self._published.get(key), snapshot):
+                self._published[key] = snapshot
+                selected.append(snapshot)
+        counters["emitted"] += len(selected)
+        counters["suppressed"] += len(snapshots) - len(selected)
+        return selected
+
+    def forget(self, exchange: str, symbols: Iterable[str]) -> None:
+        """合约从最新值索引删除（或交给其它分片）后，再出现时不论是否变化都要重新发布。"""
+        for symbol in symbols:
+            self._published.pop((exchange, symbol), None)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {exchange: dict(counters) for exchange, counters in self._counters.items()}
+
+    def _changed(self, previous: Optional[FundingSnapshot], current: FundingSnapshot) -> bool:
+        if previous is None:
+            return True
+        if previous.next_funding_time_ms != current.next_funding_time_ms:
+            return True
+        if previous.settle_interval_hours != current.settle_interval_hours:
+            return True
+        if abs(previous.funding_rate_raw - current.funding_rate_raw) > self._rate_epsilon:
+            return True
+        return self._price_moved(previous.mark_price, current.mark_price) or self._price_moved(
+            previous.index_price, current.index_price
+        )
+
+    def _price_moved(self, previous: Optional[float], current: Optional[float]) -> bool:
+        # 价格用相对阈值，不同币种价位差几个数量级
+        if previous is None or current is None:
+            return previous is not current
+        if previous == 0:
+            return current != 0
+        return abs(current - previous) / abs(previous) > self._price_epsilon
 
 
 class FundingFeed:
     """定时抓取资金费率并推送到消息总线。"""
 
-    def __init__(self, *, settings, publisher: FundingPublisher) -> None:
+    def __init__(self, *, settings, publisher: FundingPublisher, price_publisher: Optional[PricePublisher] = None) -> None:
         self._settings = settings
         self._publisher = publisher
-        self._client: Optional[httpx.AsyncClient] = None
-        self._task: Optional[asyncio.Task] = None
-        self._latest: Dict[str, List[FundingSnapshot]] = {
-            "binance": [],
-            "bitget": [],
-        }
+        self._price_publisher = price_publisher
+        self._tasks: Dict[str, asyncio.Task] = {}
         self._interval = getattr(settings, "funding_refresh_interval_secs", 30)
-        self._timeout = getattr(settings, "http_timeout_secs", 10)
-        self._bitget_symbol_limit = getattr(settings, "bitget_symbol_limit", None)
-        self._bitget_concurrency = getattr(settings, "bitget_concurrency", 5)
-        self._bitget_debug_logged = 0
+        self._contracts = ContractCache(
+            path=getattr(settings, "contract_cache_path", None)
+            or os.path.join(FEED_DIR, "contracts_cache.json"),
+            seeds={"bitget": os.path.join(FEED_DIR, "bitget_contracts.json")},
+            ttl_secs=float(getattr(settings, "contract_cache_ttl_secs", 6 * 3600)),
+            bitget_product_type=getattr(settings, "bitget_product_type", "USDT-FUTURES"),
+        )
+        # 每个交易所一个适配器和连接池；限速器全 feed 共享，按 host/endpoint 分桶
+        self._limiter = RateLimiter()
+        # 录制真实响应供离线回放，或直接用录制文件代替交易所（两者都配置时回放优先）
+        self._recorder: Optional[Recorder] = None
+        transport = None
+        replay_path = getattr(settings, "feed_replay_path", None)
+        if replay_path:
+            transport = ReplayTransport.from_file(
+                replay_path,
+                speed=float(getattr(settings, "feed_replay_speed", 1.0)),
+                faults=Faults.parse(getattr(settings, "feed_replay_faults", None) or ""),
+            )
+            logger.warning("market feed replaying recorded responses from %s", replay_path)
+        elif getattr(settings, "feed_record_path", None):
+            self._recorder = Recorder(
+                settings.feed_record_path, max_records=int(getattr(settings, "feed_record_max_responses", 5000))
+            )
+        self._adapters: Dict[str, ExchangeAdapter] = build_adapters(
+            settings, contracts=self._contracts, limiter=self._limiter, transport=transport, recorder=self._recorder
+        )
+        # exchange -> symbol -> 最新快照；轮询整表替换，推流按合约覆盖
+        self._latest: Dict[str, Dict[str, FundingSnapshot]] = {name: {} for name in self._adapters}
+        # 查询接口的索引与预序列化缓存；_latest 有变化时 touch
+        self.index = SnapshotIndex(self._latest)
+        # WebSocket / SSE 订阅：与 index 同步记录变化，按固定间隔合并推送增量
+        self.push = PushHub(
+            self.index,
+            interval_secs=float(getattr(settings, "feed_push_interval_secs", 0.5)),
+            max_frames=int(getattr(settings, "feed_push_queue_frames", 64)),
+            max_clients=int(getattr(settings, "feed_push_max_clients", 1000)),
+            heartbeat_secs=float(getattr(settings, "feed_push_heartbeat_secs", 15.0)),
+        )
+        # key 为 "exchange:mode"，记录每种抓取模式的请求数与周期耗时
+        self._stats: Dict[str, Dict[str, float]] = {}
+        # 每个交易所独立调度：各自的间隔、超时和错误预算，互不阻塞
+        self._pipelines: Dict[str, PipelineState] = {
+            name: PipelineState(
+                name,
+                interval=getattr(settings, f"{name}_refresh_interval_secs", None) or self._interval,
+                timeout=getattr(settings, f"{name}_fetch_timeout_secs", None) or self._interval,
+                error_budget=getattr(settings, f"{name}_error_budget", 3),
+            )
+            for name in self._adapters
+        }
+        self._mode = str(getattr(settings, "market_feed_mode", "poll")).lower()
+        if self._mode not in FEED_MODES:
+            logger.warning("unknown market_feed_mode %r, fallback to poll", self._mode)
+            self._mode = "poll"
+        # settlement：按各合约距结算的时间调度抓取频率；fixed：每个间隔全量抓取
+        schedule = str(getattr(settings, "funding_schedule", "settlement")).lower()
+        if schedule not in SCHEDULE_MODES:
+            logger.warning("unknown funding_schedule %r, fallback to fixed", schedule)
+            schedule = "fixed"
+        self._scheduler: Optional[SettlementScheduler] = None
+        if schedule == "settlement":
+            self._scheduler = SettlementScheduler(
+                hot_window_secs=float(getattr(settings, "funding_schedule_hot_window_secs", 900)),
+                hot_interval_secs=float(getattr(settings, "funding_schedule_hot_interval_secs", 5)),
+                warm_window_secs=float(getattr(settings, "funding_schedule_warm_window_secs", 3600)),
+                warm_interval_secs=float(self._interval),
+                cold_interval_secs=float(getattr(settings, "funding_schedule_cold_interval_secs", 300)),
+                full_refresh_secs=float(getattr(settings, "funding_schedule_full_refresh_secs", 300)),
+                settle_grace_secs=float(getattr(settings, "funding_schedule_settle_grace_secs", 300)),
+            )
+        # 有持仓或费率差接近开仓阈值的合约提到 hot 档；依赖调度器
+        self._priority: Optional[PriorityTracker] = None
+        if self._scheduler is not None and getattr(settings, "funding_priority_enabled", True):
+            self._priority = PriorityTracker(
+                margin=float(getattr(settings, "funding_priority_margin", 0.0002)),
+                max_symbols=int(getattr(settings, "funding_priority_max_symbols", 30)),
+            )
+        self._priority_interval = float(getattr(settings, "funding_priority_refresh_secs", 10.0))
+        self._priority_positions = bool(getattr(settings, "funding_priority_positions", True))
+        # 优先合约变化时唤醒正在睡眠的调度循环
+        self._wakeups: Dict[str, asyncio.Event] = {name: asyncio.Event() for name in self._pipelines}
+        # 全量周期里没拿到的合约逐个重试
+        self._retries = RetryQueue(
+            base_secs=float(getattr(settings, "funding_retry_base_secs", 1.0)),
+            max_secs=float(getattr(settings, "funding_retry_max_secs", 60.0)),
+            max_attempts=int(getattr(settings, "funding_retry_max_attempts", 8)),
+        )
+        self._retry_wakeups: Dict[str, asyncio.Event] = {name: asyncio.Event() for name in self._pipelines}
+        self._stale_after = float(getattr(settings, "funding_stale_after_secs", 600.0))
+        # 分片部署：只抓取、发布本 worker 经 Redis 租约持有的分区；交出分区前等进行中的发布结束
+        self._shards: Optional[ShardCoordinator] = None
+        self._shard_redis: Optional[Redis] = None
+        if getattr(settings, "feed_shard_enabled", False):
+            self._shard_redis = Redis.from_url(
+                getattr(settings, "redis_url", "redis://localhost:6379/0"), decode_responses=True, encoding="utf-8"
+            )
+            self._shards = ShardCoordinator(
+                self._shard_redis,
+                worker_id=getattr(settings, "feed_shard_worker_id", None),
+                partitions=int(getattr(settings, "feed_shard_partitions", 64)),
+                lease_ttl_secs=float(getattr(settings, "feed_shard_lease_ttl_secs", 10.0)),
+                key_prefix=getattr(settings, "feed_shard_key_prefix", "market_feed:shards"),
+                on_change=self._on_shards_changed,
+            )
+            for adapter in self._adapters.values():
+                adapter.shard = self._shards
+        self._emitting = 0
+        self._emit_idle = asyncio.Event()
+        self._emit_idle.set()
+        # 持仓合约的标记/指数价单独高频采样，发布到价格 stream
+        self._prices: Optional[PriceSampler] = None
+        if price_publisher is not None and getattr(settings, "price_tick_enabled", True):
+            self._prices = PriceSampler(
+                self._adapters,
+                self._publish_prices,
+                interval_secs=float(getattr(settings, "price_tick_interval_secs", 1.0)),
+                positions_refresh_secs=float(getattr(settings, "price_tick_positions_refresh_secs", 10.0)),
+                extra_symbols=parse_symbol_list(getattr(settings, "price_tick_extra_symbols", None)),
+                load_positions=load_open_positions,
+            )
+        self._stream_flush_interval = float(getattr(settings, "stream_flush_interval_secs", 1.0))
+        self._ingestors: Dict[str, StreamIngestor] = {}
+        # 推流模式下按 (exchange, symbol) 合并待发布的更新，flush 时只发最新值
+        self._pending: Dict[Tuple[str, str], FundingSnapshot] = {}
+        # 从最新值表移除、待同步删除出 Redis 最新值索引的合约，下次发布时一并处理
+        self._removed: Dict[str, Set[str]] = {}
+        self._delta: Optional[DeltaFilter] = None
+        if getattr(settings, "funding_delta_publish", True):
+            self._delta = DeltaFilter(
+                rate_epsilon=float(getattr(settings, "funding_delta_rate_epsilon", 1e-7)),
+                price_epsilon=float(getattr(settings, "funding_delta_price_epsilon", 1e-4)),
+                full_refresh_cycles=int(getattr(settings, "funding_delta_full_refresh_cycles", 10)),
+            )
 
     async def start(self) -> None:
-        if self._client is None:
-            self._client = httpx.AsyncClient(timeout=self._timeout)
-        if self._task is None:
-            self._task = asyncio.create_task(self._loop())
-            logger.info("Funding feed loop started (interval=%ss)", self._interval)
+        self._contracts.load()
+        for adapter in self._adapters.values():
+            await adapter.start()
+        if self._shards is not None and "shards" not in self._tasks:
+            # 先拿一轮租约再开始抓取；失败时由后台循环继续尝试
+            try:
+                await self._shards.rebalance()
+            except Exception as exc:
+                logger.warning("initial shard rebalance failed: %s", exc)
+            self._tasks["shards"] = asyncio.create_task(self._shards.run())
+        streamed = self._start_streams() if self._mode == "stream" else set()
+        for name, state in self._pipelines.items():
+            # 推流模式下没有推流源的交易所仍按轮询抓取
+            if name in self._tasks or name in streamed:
+                continue
+            loop = self._scheduled_loop(state) if self._scheduler else self._pipeline_loop(state)
+            self._tasks[name] = asyncio.create_task(loop)
+            logger.info(
+                "Funding pipeline %s started (schedule=%s interval=%ss timeout=%ss)",
+                name,
+                "settlement" if self._scheduler else "fixed",
+                state.interval,
+                state.timeout,
+            )
+        # 推流模式断线补齐时漏掉的合约也走重试队列
+        for name, state in self._pipelines.items():
+            if f"{name}-retry" not in self._tasks:
+                self._tasks[f"{name}-retry"] = asyncio.create_task(self._retry_loop(state))
+        if self._priority is not None and self._mode == "poll" and "priority" not in self._tasks:
+            self._tasks["priority"] = asyncio.create_task(self._priority_loop())
+        if "push" not in self._tasks:
+            self._tasks["push"] = asyncio.create_task(self.push.run())
+        if self._prices is not None and "prices" not in self._tasks:
+            self._tasks["prices"] = asyncio.create_task(self._prices.run())
 
     async def stop(self) -> None:
-        if self._task:
-            self._task.cancel()
+        for task in self._tasks.values():
+            task.cancel()
+        for task in self._tasks.values():
             try:
-                await self._task
+                await task
             except asyncio.CancelledError:
                 pass
-            self._task = None
-        if self._client:
-            await self._client.aclose()
-            self._client = None
+        self._tasks = {}
+        if self._shards is not None:
+            # 抓取与发布都已停止，交出租约让其它 worker 立即接手
+            await self._shards.release_all()
+            await self._shard_redis.close()
+        for adapter in self._adapters.values():
+            await adapter.close()
+        if self._recorder is not None:
+            self._recorder.save()
         logger.info("Funding feed loop stopped")
 
-    async def latest(self, exchange: str) -> List[FundingSnapshot]:
-        return self._latest.get(exchange, [])
+    def _start_streams(self) -> Set[str]:
+        backoff_initial = float(getattr(self._settings, "stream_backoff_initial_secs", 1.0))
+        backoff_max = float(getattr(self._settings, "stream_backoff_max_secs", 60.0))
+        started: Set[str] = set()
+        for name, adapter in self._adapters.items():
+            source = adapter.stream_source(
+                lambda instrument, name=name, adapter=adapter: self._latest[name].get(adapter.normalize_symbol(instrument))
+            )
+            if source is None:
+                continue
+            started.add(name)
+            if name in self._tasks:
+                continue
+            ingestor = StreamIngestor(
+                source,
+                on_snapshots=self._on_stream_snapshots,
+                on_resync=lambda name=name: self._resync(name),
+                backoff_initial=backoff_initial,
+                backoff_max=backoff_max,
+            )
+            self._ingestors[name] = ingestor
+            self._tasks[name] = asyncio.create_task(ingestor.run())
+            logger.info("Funding stream %s started", name)
+        if started and "stream-flush" not in self._tasks:
+            self._tasks["stream-flush"] = asyncio.create_task(self._flush_loop())
+        return started
 
-    async def _loop(self) -> None:
+    def _on_stream_snapshots(self, snapshots: List[FundingSnapshot]) -> None:
+        accepted: List[FundingSnapshot] = []
+        for snapshot in snapshots:
+            # 推流源给的是交易所合约名，换成统一符号；Binance 全市场推送里不可配对的合约直接丢弃
+            adapter = self._adapters.get(snapshot.exchange)
+            if adapter is not None:
+                if not adapter.is_tradable(snapshot.symbol):
+                    continue
+                snapshot.symbol = adapter.normalize_symbol(snapshot.symbol)
+            self._latest.setdefault(snapshot.exchange, {})[snapshot.symbol] = snapshot
+            self._pending[(snapshot.exchange, snapshot.symbol)] = snapshot
+            self.index.touch(snapshot.exchange)
+            accepted.append(snapshot)
+        self.push.update(accepted)
+
+    async def _resync(self, name: str) -> List[str]:
+        """推流（重新）连上时用 REST 拉一次全量，补齐断线期间的缺口，并返回需要订阅的合约。"""
+        await self._refresh_pipeline(self._pipelines[name])
+        return [snapshot.instrument or snapshot.symbol for snapshot in self._latest[name].values()]
+
+    async def _flush_loop(self) -> None:
         while True:
+            await asyncio.sleep(self._stream_flush_interval)
+            if not self._pending:
+                continue
+            batch = list(self._pending.values())
+            self._pending = {}
             try:
-                await self._refresh()
+                await self._emit(batch)
             except Exception as exc:
-                logger.exception("refresh funding snapshot failed: %s", exc)
-            finally:
-                logger.debug("funding refresh cycle complete")
-            await asyncio.sleep(self._interval)
-
-    async def _refresh(self) -> None:
-        self._bitget_debug_logged = 0
-        logger.debug("start refresh: bitget concurrency=%s limit=%s", self._bitget_concurrency, self._bitget_symbol_limit)
-
-        binance = await self._fetch_binance()
-        bitget = await self._fetch_bitget()
-        if binance:
-            self._latest["binance"] = binance
-            await self._emit(binance)
-        if bitget:
-            self._latest["bitget"] = bitget
-            await self._emit(bitget)
-
-    async def _emit(self, snapshots: List[FundingSnapshot]) -> None:
-        if not snapshots:
-            return
-        if hasattr(self._publisher, "publish_many"):
-            await self._publisher.publish_many(snapshots)
-        else:
-            for snapshot in snapshots:
-                await self._publisher.publish(snapshot)
+                logger.exception("publish stream updates failed: %s", exc)
+
+    async def latest(self, exchange: str) -> List[FundingSnapshot]:
+        return list(self._latest.get(exchange, {}).values())
 
-    async def _fetch_binance(self) -> List[FundingSnapshot]:
-        assert self._client is not None
-        resp = await self._client.get(BINANCE_FUNDING_URL)
-        resp.raise_for_status()
-        payload = resp.json()
+    @property
+    def exchanges(self) -> List[str]:
+        return list(self._adapters)
+
+    def adapters_health(self) -> Dict[str, Dict[str, Any]]:
+        return {name: adapter.health() for name, adapter in self._adapters.items()}
+
+    def rate_limits_health(self) -> Dict[str, Dict[str, Any]]:
+        return self._limiter.health()
+
+    def contracts_health(self) -> Dict[str, Dict[str, Any]]:
+        return self._contracts.health()
+
+    def retries_health(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {**self._retries.health(name), "staleness": self._staleness(name)}
+            for name in self._pipelines
+        }
 
-        snapshots: List[FundingSnapshot] = []
-        for item in payload:
+    def _staleness(self, name: str) -> Dict[str, Any]:
+        """每个合约距上次成功抓取的秒数分布。"""
+        now_ms = time.time() * 1000
+        ages = sorted(
+            ((now_ms - snapshot.captured_at_ms) / 1000, symbol)
+            for symbol, snapshot in self._latest.get(name, {}).items()
+        )
+        if not ages:
+            return {}
+        return {
+            "p50_secs": round(ages[len(ages) // 2][0], 1),
+            "p90_secs": round(ages[min(len(ages) - 1, int(len(ages) * 0.9))][0], 1),
+            "max_secs": round(ages[-1][0], 1),
+            "stale_symbols": sum(1 for age, _ in ages if age > self._stale_after),
+            "stale_after_secs": self._stale_after,
+            "oldest": {symbol: round(age, 1) for age, symbol in ages[-3:]},
+        }
+
+    def prices_health(self) -> Dict[str, Any]:
+        return self._prices.health() if self._prices is not None else {}
+
+    async def bus_health(self) -> Dict[str, Any]:
+        """发布的 stream 的长度、内存占用、最旧消息年龄与保留策略。"""
+        health: Dict[str, Any] = {}
+        for name, publisher in (("funding", self._publisher), ("prices", self._price_publisher)):
+            if publisher is None or not hasattr(publisher, "stream_stats"):
+                continue
             try:
-                snapshots.append(FundingSnapshot.from_binance(item))
+                health[name] = await publisher.stream_stats()
             except Exception as exc:
-                logger.warning(
-                    "skip binance item %s because %s", item.get("symbol"), exc
+                health[name] = {"error": str(exc) or type(exc).__name__}
+        return health
+
+    def shards_health(self) -> Dict[str, Any]:
+        return self._shards.health() if self._shards is not None else {}
+
+    def universe_health(self) -> Dict[str, Any]:
+        # 所有适配器共享同一个 SymbolUniverse
+        universe = next((adapter.universe for adapter in self._adapters.values() if adapter.universe), None)
+        return universe.health() if universe is not None else {}
+
+    def streams_health(self) -> Dict[str, Dict[str, Any]]:
+        return {name: ingestor.health() for name, ingestor in self._ingestors.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {key: dict(value) for key, value in self._stats.items()}
+        if self._delta is not None:
+            result["delta"] = self._delta.stats()
+        return result
+
+    @property
+    def mode(self) -> str:
+        return self._mode
+
+    def priority_health(self) -> Dict[str, Any]:
+        if self._priority is None or self._mode != "poll":
+            return {}
+        return self._priority.health()
+
+    def schedule_health(self) -> Dict[str, Dict[str, Any]]:
+        if self._scheduler is None or self._mode != "poll":
+            return {}
+        return {name: self._scheduler.health(name) for name in self._pipelines}
+
+    def pipelines_health(self) -> Dict[str, Dict[str, Any]]:
+        return {name: state.health() for name, state in self._pipelines.items()}
+
+    def _record_cycle(self, cycle: CycleStats, snapshots: int) -> None:
+        wall_secs = cycle.wall_secs
+        cpu_secs = cycle.cpu_secs
+        entry = self._stats.setdefault(
+            f"{cycle.exchange}:{cycle.mode}",
+            {"cycles": 0, "requests_total": 0, "wall_secs_total": 0.0, "cpu_secs_total": 0.0},
+        )
+        entry["cycles"] += 1
+        entry["requests_total"] += cycle.requests
+        entry["wall_secs_total"] += wall_secs
+        entry["cpu_secs_total"] += cpu_secs
+        entry["last_requests"] = cycle.requests
+        entry["last_wall_secs"] = round(wall_secs, 3)
+        entry["last_snapshots"] = snapshots
+        entry["last_fallback_symbols"] = cycle.fallback_symbols
+        entry["avg_requests"] = round(entry["requests_total"] / entry["cycles"], 2)
+        entry["avg_wall_secs"] = round(entry["wall_secs_total"] / entry["cycles"], 3)
+        entry["last_cpu_secs"] = round(cpu_secs, 4)
+        entry["avg_cpu_secs"] = round(entry["cpu_secs_total"] / entry["cycles"], 4)
+        entry["last_latency"] = cycle.latency_percentiles()
+        logger.info(
+            "%s cycle (%s): %d snapshots, %d requests, %.2fs, cpu %.3fs",
+            cycle.exchange,
+            cycle.mode,
+            snapshots,
+            cycle.requests,
+            wall_secs,
+            cpu_secs,
+        )
+
+    async def _pipeline_loop(self, state: PipelineState) -> None:
+        while True:
+            started = time.monotonic()
+            await self._refresh_pipeline(state)
+            if state.degraded:
+                logger.error(
+                    "%s pipeline exceeded error budget (%d consecutive failures), backing off",
+                    state.name,
+                    state.consecutive_failures,
                 )
-        logger.info("Fetched %d binance funding entries", len(snapshots))
-        return snapshots
+            elapsed = time.monotonic() - started
+            # 分片接手新分区时会提前唤醒
+            wakeup = self._wakeups[state.name]
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=max(0.0, state.next_delay() - elapsed))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _priority_loop(self) -> None:
+        """定期从数据库读取持仓、按最新快照计算费率差，更新各交易所的优先合约。"""
+        assert self._priority is not None and self._scheduler is not None
+        while True:
+            if self._priority_positions:
+                try:
+                    self._priority.set_positions(await load_open_positions())
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    # 读不到持仓时沿用上一次的结果，只在错误变化时告警
+                    error = str(exc) or type(exc).__name__
+                    if error != self._priority.positions_error:
+                        logger.warning("load open positions failed, keep previous set: %s", error)
+                    self._priority.positions_error = error
+            threshold = get_runtime_config().thresholds.aa
+            for exchange, symbols in self._priority.select(self._latest, threshold).items():
+                if exchange in self._pipelines and self._scheduler.set_priority(exchange, symbols):
+                    self._wakeups[exchange].set()
+            await asyncio.sleep(self._priority_interval)
+
+    async def _scheduled_loop(self, state: PipelineState) -> None:
+        """到期合约少时定向抓取，多时（结算前后往往集中到期）或到了全量周期就全量抓取。"""
+        assert self._scheduler is not None
+        scheduler = self._scheduler
+        adapter = self._adapters[state.name]
+        while True:
+            ok = True
+            if scheduler.full_refresh_due(state.name):
+                ok = await self._refresh_pipeline(state)
+                if ok:
+                    scheduler.mark_full_refresh(state.name)
+            else:
+                due = scheduler.pop_due(state.name)
+                if len(due) > adapter.max_targeted_symbols:
+                    ok = await self._refresh_pipeline(state)
+                    if ok:
+                        scheduler.mark_full_refresh(state.name)
+                    else:
+                        # 整个交易所失败，按管道退避后再排队；单个合约的失败走重试队列
+                        scheduler.retry(state.name, due)
+                elif due:
+                    ok = await self._refresh_pipeline(state, symbols=due)
+                    scheduler.mark_targeted(state.name, len(due))
+            if state.degraded:
+                logger.error(
+                    "%s pipeline exceeded error budget (%d consecutive failures), backing off",
+                    state.name,
+                    state.consecutive_failures,
+                )
+            # 失败后按管道的间隔/退避重试，成功时睡到下一个合约到期
+            delay = scheduler.next_wakeup(state.name) if ok else state.next_delay()
+            wakeup = self._wakeups[state.name]
+            wakeup.clear()
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=max(MIN_SCHEDULE_SLEEP_SECS, delay))
+                await asyncio.sleep(MIN_SCHEDULE_SLEEP_SECS)
+            except asyncio.TimeoutError:
+                pass
 
-    async def _fetch_bitget(self) -> List[FundingSnapshot]:
-        assert self._client is not None
-        product_type_conf = getattr(self._settings, "bitget_product_type", "USDT-FUTURES")
-        product_type_upper = product_type_conf.upper()
+    async def _refresh_pipeline(self, state: PipelineState, symbols: Optional[List[str]] = None) -> bool:
+        started = time.monotonic()
+        try:
+            snapshots = await asyncio.wait_for(self._fetch(state.name, symbols), timeout=state.timeout)
+            # 分片部署时本 worker 可能暂时没有分区，空结果是正常的
+            if not snapshots and (self._shards is None or self._shards.owned()):
+                raise RuntimeError("empty funding result")
+            # 抓完立即发布，不等待其它交易所
+            self._apply_snapshots(state.name, snapshots, symbols)
+            await self._emit(snapshots, full=symbols is None)
+            state.mark_success(time.monotonic() - started)
+            return True
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            state.mark_failure(time.monotonic() - started, f"timeout after {state.timeout}s")
+            logger.warning("%s funding refresh timed out (%ss)", state.name, state.timeout)
+        except Exception as exc:
+            state.mark_failure(time.monotonic() - started, str(exc) or type(exc).__name__)
+            logger.exception("%s funding refresh failed: %s", state.name, exc)
+        finally:
+            logger.debug("%s funding refresh cycle complete", state.name)
+        if symbols is not None:
+            self._retry_failed(state.name, symbols)
+        return False
+
+    def _apply_snapshots(
+        self, name: str, snapshots: List[FundingSnapshot], symbols: Optional[List[str]] = None
+    ) -> None:
+        """更新最新值表；本轮应该拿到却没拿到的合约保留旧值，进入重试队列。"""
+        adapter = self._adapters[name]
+        if self._shards is not None:
+            # 定向抓取的计划里可能还有刚交出的分区
+            snapshots = [snapshot for snapshot in snapshots if self._shards.owns(snapshot.symbol)]
+        returned = {snapshot.symbol for snapshot in snapshots}
+        previous = self._latest.get(name, {})
+        if symbols is None:
+            # 全量：不可配对（被裁剪）或已不归本 worker 的合约直接移除
+            missing = [symbol for symbol in previous if symbol not in returned and adapter.is_tradable(symbol)]
+            table = {symbol: previous[symbol] for symbol in missing}
+            table.update((snapshot.symbol, snapshot) for snapshot in snapshots)
+            self._latest[name] = table
+            removed = [symbol for symbol in previous if symbol not in table]
+            self.push.remove(name, removed)
+            self._forget_latest(name, removed)
+        else:
+            missing = [symbol for symbol in symbols if symbol not in returned and adapter.is_tradable(symbol)]
+            self._merge_latest(name, snapshots)
+        self.index.touch(name)
+        self.push.update(snapshots)
+        if self._scheduler is not None:
+            self._scheduler.update(name, snapshots)
+        self._retries.succeeded(name, returned)
+        if missing:
+            self._retry_failed(name, missing)
 
-        contracts: List[dict] = []
-        contract_margin: Dict[str, str] = {}
+    def _retry_failed(self, name: str, symbols: List[str]) -> None:
+        abandoned = self._retries.failed(name, symbols)
+        if abandoned:
+            # 多次重试仍拿不到，多半已下架；不再发布旧值
+            table = self._latest.get(name, {})
+            for symbol in abandoned:
+                table.pop(symbol, None)
+            self.index.touch(name)
+            self.push.remove(name, abandoned)
+            self._forget_latest(name, abandoned)
+            logger.warning("%s gave up retrying %d symbols: %s", name, len(abandoned), abandoned[:10])
+        if name in self._retry_wakeups:
+            self._retry_wakeups[name].set()
 
-        for url in BITGET_CONTRACTS_URLS:
+    async def _retry_loop(self, state: PipelineState) -> None:
+        """重试队列里到期的合约单独补抓，成功即发布；结果不计入管道的健康状态。"""
+        name = state.name
+        wakeup = self._retry_wakeups[name]
+        while True:
+            delay = self._retries.next_due(name)
+            wakeup.clear()
             try:
-                resp = await self._client.get(url, params={"productType": product_type_upper})
-                resp.raise_for_status()
-                payload = resp.json()
-                data = payload.get("data") or []
-                if isinstance(data, dict):
-                    data = data.get("symbols") or []
-                if not isinstance(data, list):
-                    data = []
-                contracts = data
-                logger.info("Fetched %d bitget contracts via %s", len(contracts), url)
-
-                for contract in contracts:
-                    if isinstance(contract, dict):
-                        sym = contract.get("symbol")
-                        margin_coin = contract.get("marginCoin") or contract.get("quoteCoin")
-                        if sym and margin_coin:
-                            contract_margin[sym] = margin_coin
-                logger.info("Bitget margin sample: %s", list(contract_margin.items())[:5])
-
-                break
-
-            except httpx.HTTPStatusError as exc:
-                if exc.response.status_code in (400, 404):
-                    logger.warning(
-                        "Bitget contract endpoint %s unavailable (status %s)",
-                        url,
-                        exc.response.status_code,
-                    )
-                    continue
+                await asyncio.wait_for(wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            due = self._retries.pop_due(name)
+            if not due:
+                continue
+            try:
+                snapshots = await asyncio.wait_for(self._fetch(name, due, mode="retry"), timeout=state.timeout)
+            except asyncio.CancelledError:
                 raise
             except Exception as exc:
-                logger.warning("Fetch bitget contracts failed (%s): %s", url, exc)
+                logger.warning("%s retry of %d symbols failed: %s", name, len(due), str(exc) or type(exc).__name__)
+                self._retry_failed(name, due)
                 continue
+            self._apply_snapshots(name, snapshots, due)
+            if snapshots:
+                try:
+                    await self._emit(snapshots)
+                except Exception as exc:
+                    logger.exception("publish retried %s snapshots failed: %s", name, exc)
 
-        if not contracts:
-            return []
-
-        if self._bitget_symbol_limit:
-            contracts = contracts[: self._bitget_symbol_limit]
-
-        snapshots: List[FundingSnapshot] = []
-        semaphore = asyncio.Semaphore(max(1, int(self._bitget_concurrency)))
-
-        async def fetch_one(contract_symbol: str) -> Optional[FundingSnapshot]:
-            async with semaphore:
-                params_base = {
-                    "symbol": contract_symbol.split("_", 1)[0],
-                    "productType": product_type_upper,
-                    "marginCoin": contract_margin.get(contract_symbol, "USDT"),
-                }
-
-                for url, with_margin in BITGET_FUNDING_ENDPOINTS:
-                    params = dict(params_base)
-                    if not with_margin:
-                        params.pop("marginCoin", None)
-                    try:
-                        resp = await self._client.get(url, params=params)
-                        resp.raise_for_status()
-                    except Exception as exc:
-                        logger.debug("bitget funding request failed via %s: %s", url, exc)
-                        continue
-
-                    payload = resp.json()
-                    data = payload.get("data")
-                    if not data:
-                        logger.warning(
-                            "bitget funding response empty (%s via %s): %s",
-                            contract_symbol,
-                            url,
-                            payload,
-                        )
-                        if self._bitget_debug_logged < 5:
-                            logger.error(
-                                "bitget empty data payload (%s via %s): %s",
-                                contract_symbol,
-                                url,
-                                payload,
-                            )
-                            self._bitget_debug_logged += 1
-                        continue
-                    if isinstance(data, dict):
-                        # v1 接口返回 dict，资金费率位于 data["data"][0]
-                        if "data" in data and isinstance(data["data"], list):
-                            records = data["data"]
-                        elif "list" in data and isinstance(data["list"], list):
-                            records = data["list"]
-                        else:
-                            records = [data]
-                    else:
-                        records = data if isinstance(data, list) else []
-
-                    if not records:
-                        logger.warning(
-                            "bitget funding records empty (%s via %s): %s",
-                            contract_symbol,
-                            url,
-                            payload,
-                        )
-                        if self._bitget_debug_logged < 5:
-                            logger.error(
-                                "bitget empty records payload (%s via %s): %s",
-                                contract_symbol,
-                                url,
-                                payload,
-                            )
-                            self._bitget_debug_logged += 1
-                        continue
-
-                    snapshot_raw = dict(records[0])
-                    if self._bitget_debug_logged < 5:
-                        logger.warning(
-                            "bitget raw snapshot sample (%s): %s",
-                            contract_symbol,
-                            snapshot_raw,
-                        )
-                        self._bitget_debug_logged += 1
-                    else:
-                        logger.debug(
-                            "bitget raw snapshot (%s): %s",
-                            contract_symbol,
-                            snapshot_raw,
-                        )
-                    snapshot_raw.setdefault("symbol", contract_symbol)
-                    try:
-                        return self._make_bitget_snapshot(snapshot_raw)
-                    except Exception as exc:
-                        logger.warning("normalize bitget funding failed (%s): %s", contract_symbol, exc)
-                        return None
-
-                return None
-
-        tasks = []
-        for contract in contracts:
-            symbol = contract.get("symbol") if isinstance(contract, dict) else contract
-            if not symbol:
-                continue
-            tasks.append(asyncio.create_task(fetch_one(symbol)))
+    def _merge_latest(self, exchange: str, snapshots: List[FundingSnapshot]) -> None:
+        table = self._latest.setdefault(exchange, {})
+        for snapshot in snapshots:
+            previous = table.get(snapshot.symbol)
+            # 定向抓取的资金费率接口不带标记/指数价时沿用上次的值
+            if previous is not None:
+                if snapshot.mark_price is None:
+                    snapshot.mark_price = previous.mark_price
+                if snapshot.index_price is None:
+                    snapshot.index_price = previous.index_price
+            table[snapshot.symbol] = snapshot
 
-        if not tasks:
-            return []
+    def _forget_latest(self, name: str, symbols: List[str]) -> None:
+        if symbols and self._delta is not None:
+            self._delta.forget(name, symbols)
+        if symbols and hasattr(self._publisher, "remove_latest"):
+            self._removed.setdefault(name, set()).update(symbols)
 
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        for symbol, result in zip(contracts, results):
-            symbol_name = symbol.get("symbol") if isinstance(symbol, dict) else symbol
-            if isinstance(result, Exception):
-                logger.warning("bitget fetch task failed (%s): %s", symbol_name, result)
+    async def _flush_removed(self) -> None:
+        removed, self._removed = self._removed, {}
+        for name, symbols in removed.items():
+            if self._shards is not None:
+                # 交出的分区由新的持有者继续维护索引
+                symbols = {symbol for symbol in symbols if self._shards.owns(symbol)}
+            if not symbols:
                 continue
-            if result:
-                snapshots.append(result)
+            try:
+                await self._publisher.remove_latest(name, sorted(symbols))
+            except Exception as exc:
+                logger.warning("remove %d %s symbols from latest index failed: %s", len(symbols), name, exc)
+
+    async def _emit(self, snapshots: List[FundingSnapshot], *, full: bool = False) -> None:
+        """发布快照；full 表示这是一次不限合约的全量抓取，计入 DeltaFilter 的强制全量轮数。"""
+        if self._removed:
+            await self._flush_removed()
+        suppressed: List[FundingSnapshot] = []
+        if self._delta is not None and snapshots:
+            by_exchange: Dict[str, List[FundingSnapshot]] = {}
+            for snapshot in snapshots:
+                by_exchange.setdefault(snapshot.exchange, []).append(snapshot)
+            selected = [
+                chosen
+                for exchange, group in by_exchange.items()
+                for chosen in self._delta.select(exchange, group, full=full)
+            ]
+            chosen_ids = {id(snapshot) for snapshot in selected}
+            suppressed = [snapshot for snapshot in snapshots if id(snapshot) not in chosen_ids]
+            snapshots = selected
+        if self._shards is not None:
+            snapshots = [snapshot for snapshot in snapshots if self._shards.owns(snapshot.symbol)]
+            suppressed = [snapshot for snapshot in suppressed if self._shards.owns(snapshot.symbol)]
+        if suppressed and hasattr(self._publisher, "refresh_latest"):
+            # 没变化的快照不进 stream，但索引里的 captured_at 要刷新
+            try:
+                await self._publisher.refresh_latest(suppressed)
+            except Exception as exc:
+                logger.warning("refresh %d unchanged snapshots in latest index failed: %s", len(suppressed), exc)
+        if not snapshots:
+            return
+        self._emitting += 1
+        self._emit_idle.clear()
+        failed: List[FundingSnapshot] = []
+        first_error: Optional[Exception] = None
+        try:
+            if hasattr(self._publisher, "publish_many"):
+                result = await self._publisher.publish_many(snapshots)
+                failed = [snapshots[position] for position, _ in result.failures]
+                first_error = result.failures[0][1] if result.failures else None
             else:
-                logger.warning("bitget funding empty after parse for %s", symbol_name)
+                for snapshot in snapshots:
+                    await self._publisher.publish(snapshot)
+        except Exception:
+            self._unpublished(snapshots)
+            raise
+        finally:
+            self._emitting -= 1
+            if not self._emitting:
+                self._emit_idle.set()
+        if failed:
+            self._unpublished(failed)
+            if len(failed) == len(snapshots):
+                # 整批都没写进去：让调用方按失败处理（管道退避、定向合约进重试队列）
+                raise RuntimeError(f"publish failed for all {len(failed)} snapshots: {first_error}")
+            logger.warning("%d/%d funding snapshots not published: %s", len(failed), len(snapshots), first_error)
 
-        logger.info("Fetched %d bitget funding entries", len(snapshots))
-        return snapshots
+    def _unpublished(self, snapshots: List[FundingSnapshot]) -> None:
+        """没写进 stream 的快照从 DeltaFilter 里撤掉，下次抓到时不论是否变化都重新发布。"""
+        if self._delta is None:
+            return
+        by_exchange: Dict[str, List[str]] = {}
+        for snapshot in snapshots:
+            by_exchange.setdefault(snapshot.exchange, []).append(snapshot.symbol)
+        for exchange, symbols in by_exchange.items():
+            self._delta.forget(exchange, symbols)
 
-    @staticmethod
-    def _normalize_bitget_symbol(symbol: str) -> str:
-        if not symbol:
-            return symbol
-        if symbol.endswith("_UMCBL") or symbol.endswith("_DMCBL"):
-            return symbol.split("_", 1)[0]
-        return symbol
-
-    @staticmethod
-    def _make_bitget_snapshot(item: dict) -> FundingSnapshot:
-        # Handle both v1 and v2 field names from Bitget responses.
-        def _first_non_null(*keys, default=None):
-            for key in keys:
-                if key in item:
-                    value = item.get(key)
-                    if value is not None and value != "":
-                        return value
-            return default
-
-        def _coerce_float(value, default=0.0) -> float:
-            try:
-                return float(value)
-            except (TypeError, ValueError):
-                return float(default)
+    async def _publish_prices(self, ticks: List[PriceTick]) -> None:
+        if self._shards is not None:
+            ticks = [tick for tick in ticks if self._shards.owns(tick.symbol)]
+        if ticks and self._price_publisher is not None:
+            await self._price_publisher.publish_many(ticks)
 
-        def _coerce_int(value, default=0) -> int:
+    async def _on_shards_changed(self, gained: Set[int], lost: Set[int]) -> None:
+        assert self._shards is not None
+        if lost:
+            for name, table in self._latest.items():
+                dropped = [symbol for symbol in table if self._shards.partition(symbol) in lost]
+                if not dropped:
+                    continue
+                for symbol in dropped:
+                    del table[symbol]
+                    self._pending.pop((name, symbol), None)
+                if self._delta is not None:
+                    # 分区以后再分回来时要重新发布，即使值没变
+                    self._delta.forget(name, dropped)
+                self.index.touch(name)
+                self.push.remove(name, dropped)
+                self._retries.forget(name, dropped)
+                if self._scheduler is not None:
+                    self._scheduler.forget(name, dropped)
+            # 新的发布已经过滤掉这些分区；等已经发出的写完，再让 coordinator 删除租约
             try:
-                return int(float(value))
-            except (TypeError, ValueError):
-                return int(default)
-
-        raw_rate_value = _first_non_null("fundingRate", "fundRate", "realTimeFundRate", default=0.0)
-        raw_rate = _coerce_float(raw_rate_value, 0.0)
-
-        interval_value = _first_non_null(
-            "fundingRateInterval",
-            "fundingInterval",
-            "fundInterval",
-            "fundingTimeInterval",
-            default=8,
-        )
-        settle_hours = float(FundingFeed._parse_interval(interval_value))
-
-        next_time_value = _first_non_null(
-            "nextUpdate",
-            "nextFundTime",
-            "nextFundingTime",
-            "nextTimestamp",
-            default=0,
-        )
-        next_time_ms = _coerce_int(next_time_value, 0)
-
-        symbol = _first_non_null("symbol", "symbolName", "instId", default="")
-        normalized_symbol = FundingFeed._normalize_bitget_symbol(symbol)
-        captured_at_ms = int(datetime.now(tz=timezone.utc).timestamp() * 1000)
-
-        return FundingSnapshot(
-            exchange="bitget",
-            symbol=normalized_symbol,
-            funding_rate_raw=raw_rate,
-            settle_interval_hours=settle_hours,
-            next_funding_time_ms=next_time_ms,
-            instrument=symbol,
-            mark_price=None,
-            index_price=None,
-            captured_at_ms=captured_at_ms,
-        )
+                await asyncio.wait_for(self._emit_idle.wait(), timeout=self._shards.margin)
+            except asyncio.TimeoutError:
+                logger.warning("publishes still in flight while handing off %d partitions", len(lost))
+        if gained:
+            # 新接手的分区立刻全量抓一次，不等下一个周期
+            for name in self._pipelines:
+                if self._scheduler is not None:
+                    self._scheduler.request_full_refresh(name)
+                self._wakeups[name].set()
 
-    @staticmethod
-    def _parse_interval(value: Optional[str]) -> int:
-        if not value:
-            return 8
-        digits = "".join(ch for ch in str(value) if ch.isdigit())
-        return int(digits) if digits else 8
+    async def _fetch(
+        self, name: str, symbols: Optional[List[str]] = None, *, mode: str = "targeted"
+    ) -> List[FundingSnapshot]:
+        adapter = self._adapters[name]
+        if symbols is None:
+            cycle = CycleStats(name, adapter.fetch_strategy)
+            snapshots = await adapter.fetch(cycle)
+        else:
+            cycle = CycleStats(name, mode)
+            snapshots = await adapter.fetch_symbols(cycle, symbols)
+        self._record_cycle(cycle, len(snapshots))
+        return snapshots
 
 
 app = FastAPI(title="Funding Feed Service", version="0.1.0")
@@ -372,10 +883,12 @@ _state: Dict[str, Optional[FundingFeed]] = {"feed": None}
 async def lifespan(app_: FastAPI):
     settings = get_settings()
     publisher = FundingPublisher(settings=settings)
-    feed = FundingFeed(settings=settings, publisher=publisher)
+    price_publisher = PricePublisher(settings=settings)
+    feed = FundingFeed(settings=settings, publisher=publisher, price_publisher=price_publisher)
 
     if hasattr(publisher, "connect"):
         await publisher.connect()
+    await price_publisher.connect()
     _state["feed"] = feed
     await feed.start()
 
@@ -387,6 +900,7 @@ async def lifespan(app_: FastAPI):
         _state["feed"] = None
         if hasattr(publisher, "close"):
             await publisher.close()
+        await price_publisher.close()
 
 
 app.router.lifespan_context = lifespan
@@ -397,18 +911,188 @@ async def healthz():
     feed = _state["feed"]
     if not feed:
         raise HTTPException(status_code=503, detail="feed not ready")
-    binance = len(await feed.latest("binance"))
-    bitget = len(await feed.latest("bitget"))
-    return {"status": "ok", "binance": binance, "bitget": bitget}
+    counts = {exchange: len(await feed.latest(exchange)) for exchange in feed.exchanges}
+    return {
+        "status": "ok",
+        **counts,
+        "mode": feed.mode,
+        "pipelines": feed.pipelines_health(),
+        "schedule": feed.schedule_health(),
+        "priority": feed.priority_health(),
+        "adapters": feed.adapters_health(),
+        "rate_limits": feed.rate_limits_health(),
+        "streams": feed.streams_health(),
+        "contracts": feed.contracts_health(),
+        "universe": feed.universe_health(),
+        "retries": feed.retries_health(),
+        "query_cache": feed.index.health(),
+        "push": feed.push.health(),
+        "shards": feed.shards_health(),
+        "prices": feed.prices_health(),
+        "bus": await feed.bus_health(),
+    }
 
 
-@app.get("/funding/{exchange}")
-async def read_funding(exchange: str):
+@app.get("/stats")
+async def read_stats():
     feed = _state["feed"]
     if not feed:
         raise HTTPException(status_code=503, detail="feed not ready")
+    return feed.stats()
+
+
+def _ready_feed() -> FundingFeed:
+    feed = _state["feed"]
+    if not feed:
+        raise HTTPException(status_code=503, detail="feed not ready")
+    return feed
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def _exchanges_param(feed: FundingFeed, value: Optional[str]) -> List[str]:
+    names = [name.lower() for name in _split(value)] or feed.exchanges
+    unknown = [name for name in names if name not in feed.exchanges]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"unsupported exchange: {','.join(unknown)}")
+    return names
+
+
+def _symbols_param(value: Optional[str]) -> Optional[List[str]]:
+    return [canonical_symbol(symbol.upper()) for symbol in _split(value)] or None
+
+
+def _cached_json(request: Request, etag: str, build) -> Response:
+    """两次刷新之间 ETag 不变，带 If-None-Match 的轮询直接 304，不再序列化。"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in _split(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=build(), media_type="application/json", headers=headers)
+
+
+@app.get("/funding/{exchange}")
+async def read_funding(exchange: str, request: Request):
+    feed = _ready_feed()
     exchange = exchange.lower()
-    if exchange not in {"binance", "bitget"}:
+    if exchange not in feed.exchanges:
         raise HTTPException(status_code=404, detail="unsupported exchange")
-    snapshots = await feed.latest(exchange)
-    return [snapshot.model_dump() for snapshot in snapshots]
+    return _cached_json(request, feed.index.etag("exchange", [exchange]), lambda: feed.index.exchange_body(exchange))
+
+
+@app.get("/funding")
+async def query_funding(
+    request: Request,
+    symbols: Optional[str] = Query(None, description="逗号分隔，如 BTCUSDT,1000PEPEUSDT"),
+    exchanges: Optional[str] = Query(None, description="逗号分隔，默认全部交易所"),
+):
+    feed = _ready_feed()
+    names = _exchanges_param(feed, exchanges)
+    wanted = _symbols_param(symbols)
+    params = tuple(wanted) if wanted else ()
+    return _cached_json(
+        request, feed.index.etag("funding", names, params), lambda: feed.index.funding_body(names, wanted)
+    )
+
+
+@app.get("/spreads")
+async def read_spreads(
+    request: Request,
+    exchanges: Optional[str] = Query(None, description="逗号分隔，默认全部交易所"),
+    min_diff: float = Query(0.0, ge=0.0, description="最小 rate8h 差"),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    feed = _ready_feed()
+    names = _exchanges_param(feed, exchanges)
+    return _cached_json(
+        request,
+        feed.index.etag("spreads", names, (min_diff, limit)),
+        lambda: feed.index.spreads_body(names, min_diff=min_diff, limit=limit),
+    )
+
+
+@app.websocket("/ws/funding")
+async def funding_ws(websocket: WebSocket, symbols: Optional[str] = None, exchanges: Optional[str] = None):
+    """先推一帧全量快照，之后推增量；客户端可发 {"op": "subscribe", "exchanges": [...], "symbols": [...]} 更换订阅。"""
+    feed = _state["feed"]
+    if not feed:
+        await websocket.close(code=1013, reason="feed not ready")
+        return
+    try:
+        names = _exchanges_param(feed, exchanges)
+    except HTTPException as exc:
+        await websocket.close(code=1008, reason=exc.detail)
+        return
+    if feed.push.full:
+        await websocket.close(code=1013, reason="too many subscribers")
+        return
+    await websocket.accept()
+    subscriber = feed.push.subscribe(names, _symbols_param(symbols))
+    sender = asyncio.create_task(_ws_send(websocket, feed, subscriber))
+    receiver = asyncio.create_task(_ws_receive(websocket, feed, subscriber))
+    try:
+        await asyncio.wait((sender, receiver), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        # 不等待被取消的任务结束：服务端关闭时外层也在被取消，再 await 会把取消吞成普通异常
+        for task in (sender, receiver):
+            task.cancel()
+        feed.push.unsubscribe(subscriber)
+
+
+async def _ws_send(websocket: WebSocket, feed: FundingFeed, subscriber: Subscriber) -> None:
+    while True:
+        frame = await subscriber.next_frame(feed.push.heartbeat_secs)
+        if frame is None:
+            await websocket.close(code=1013, reason="slow consumer")
+            return
+        await websocket.send_text(frame.text)
+
+
+async def _ws_receive(websocket: WebSocket, feed: FundingFeed, subscriber: Subscriber) -> None:
+    try:
+        while True:
+            try:
+                message = orjson.loads(await websocket.receive_text())
+            except orjson.JSONDecodeError:
+                continue
+            if not isinstance(message, dict) or message.get("op") != "subscribe":
+                continue
+            try:
+                names = _exchanges_param(feed, ",".join(map(str, message.get("exchanges") or [])))
+            except HTTPException as exc:
+                logger.info("rejected push subscription: %s", exc.detail)
+                continue
+            feed.push.resubscribe(subscriber, names, _symbols_param(",".join(map(str, message.get("symbols") or []))))
+    except WebSocketDisconnect:
+        return
+
+
+@app.get("/sse/funding")
+async def funding_sse(
+    symbols: Optional[str] = Query(None, description="逗号分隔，如 BTCUSDT,1000PEPEUSDT"),
+    exchanges: Optional[str] = Query(None, description="逗号分隔，默认全部交易所"),
+):
+    """与 /ws/funding 相同的帧，以 Server-Sent Events 推送；连接断开时注销订阅。"""
+    feed = _ready_feed()
+    names = _exchanges_param(feed, exchanges)
+    if feed.push.full:
+        raise HTTPException(status_code=503, detail="too many subscribers")
+    subscriber = feed.push.subscribe(names, _symbols_param(symbols))
+
+    async def events():
+        try:
+            while True:
+                frame = await subscriber.next_frame(feed.push.heartbeat_secs)
+                if frame is None:
+                    yield b"event: drop\ndata: slow consumer\n\n"
+                    return
+                yield frame.sse
+        finally:
+            feed.push.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,130 @@
+"""按 endpoint 的熔断器与备用 endpoint 选择。
+
+熔断器统计最近 N 次请求的失败率，超过阈值后打开，冷却期内直接跳过该 endpoint；
+冷却结束进入半开状态，只放行一次探测请求，成功则关闭，失败则重新打开。
+EndpointSelector 按请求类型记住上次成功的 endpoint，故障切换只需一次探测，而不是每个合约都先失败一次。
+"""
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Generic, Hashable, List, Optional, Sequence, TypeVar
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(RuntimeError):
+    """endpoint 处于熔断状态，本次没有发出请求。"""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        *,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_ratio: float = 0.5,
+        open_secs: float = 30.0,
+    ) -> None:
+        self.name = name
+        self._outcomes: Deque[bool] = deque(maxlen=max(1, int(window)))
+        self._min_calls = max(1, int(min_calls))
+        self._failure_ratio = float(failure_ratio)
+        self._open_secs = float(open_secs)
+        self._opened_at: Optional[float] = None
+        # 半开探测开始的时间；探测被取消没有回报结果时，过一个冷却期允许重新探测
+        self._probe_at: Optional[float] = None
+        self.opened_count = 0
+        self.skipped = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return CLOSED
+        if time.monotonic() - self._opened_at >= self._open_secs:
+            return HALF_OPEN
+        return OPEN
+
+    def is_open(self) -> bool:
+        """不改变状态的检查，用于排队前提前跳过。"""
+        state = self.state
+        if state == OPEN:
+            return True
+        return state == HALF_OPEN and not self._probe_available()
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._probe_available():
+            self._probe_at = time.monotonic()
+            return True
+        self.skipped += 1
+        return False
+
+    def record(self, ok: bool) -> None:
+        if self._opened_at is not None:
+            # 半开探测的结果（或熔断前已发出的请求陆续返回）
+            if ok and self._probe_at is not None:
+                self._close()
+            elif not ok and self.state == HALF_OPEN:
+                self._open()
+            return
+        self._outcomes.append(ok)
+        if len(self._outcomes) >= self._min_calls:
+            failures = self._outcomes.count(False)
+            if failures / len(self._outcomes) >= self._failure_ratio:
+                self._open()
+
+    def _probe_available(self) -> bool:
+        return self._probe_at is None or time.monotonic() - self._probe_at >= self._open_secs
+
+    def _open(self) -> None:
+        self._opened_at = time.monotonic()
+        self._probe_at = None
+        self.opened_count += 1
+
+    def _close(self) -> None:
+        self._opened_at = None
+        self._probe_at = None
+        self._outcomes.clear()
+
+    def health(self) -> Dict[str, Any]:
+        calls = len(self._outcomes)
+        return {
+            "state": self.state,
+            "failure_ratio": round(self._outcomes.count(False) / calls, 3) if calls else 0.0,
+            "window_calls": calls,
+            "opened_count": self.opened_count,
+            "skipped": self.skipped,
+        }
+
+
+class EndpointSelector(Generic[T]):
+    """同一类请求的多个备用 endpoint，优先尝试上次成功的那个。"""
+
+    def __init__(self, kind: str, endpoints: Sequence[T], *, key: Callable[[T], Hashable] = lambda e: e) -> None:
+        self.kind = kind
+        self._endpoints = list(endpoints)
+        self._key = key
+        self._preferred: Optional[Hashable] = None
+        self.switches = 0
+
+    def ordered(self) -> List[T]:
+        if self._preferred is None:
+            return list(self._endpoints)
+        preferred = [e for e in self._endpoints if self._key(e) == self._preferred]
+        return preferred + [e for e in self._endpoints if self._key(e) != self._preferred]
+
+    def succeeded(self, endpoint: T) -> None:
+        key = self._key(endpoint)
+        if key != self._preferred:
+            if self._preferred is not None:
+                self.switches += 1
+            self._preferred = key
+
+    def health(self) -> Dict[str, Any]:
+        return {"preferred": self._preferred, "switches": self.switches}
@@ -0,0 +1,335 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from transport import decode_json
+
+logger = logging.getLogger("market_feed.contracts")
+
+BINANCE_EXCHANGE_INFO_URL = "https://fapi.binance.com/fapi/v1/exchangeInfo"
+BINANCE_FUNDING_INFO_URL = "https://fapi.binance.com/fapi/v1/fundingInfo"
+BITGET_CONTRACTS_URLS = [
+    "https://api.bitget.com/api/v2/mix/market/contracts",
+    "https://api.bitget.com/api/mix/v1/market/contracts",
+]
+
+REFRESH_RETRY_SECS = 300
+
+# (url, params, headers) -> response；由 FundingFeed 注入，以便复用它的计数与限流
+Fetcher = Callable[..., Awaitable[httpx.Response]]
+
+
+def parse_interval_hours(value: Any, default: int = 8) -> int:
+    if not value:
+        return default
+    digits = "".join(ch for ch in str(value) if ch.isdigit())
+    return int(digits) if digits else default
+
+
+def _to_float(value: Any) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ContractMeta:
+    """单个合约的静态元数据，解析一次后常驻内存。"""
+
+    __slots__ = (
+        "exchange",
+        "symbol",
+        "margin_coin",
+        "funding_interval_hours",
+        "tick_size",
+        "maker_fee",
+        "taker_fee",
+    )
+
+    def __init__(
+        self,
+        exchange: str,
+        symbol: str,
+        *,
+        margin_coin: Optional[str] = None,
+        funding_interval_hours: int = 8,
+        tick_size: Optional[float] = None,
+        maker_fee: Optional[float] = None,
+        taker_fee: Optional[float] = None,
+    ) -> None:
+        self.exchange = exchange
+        self.symbol = symbol
+        self.margin_coin = margin_coin
+        self.funding_interval_hours = funding_interval_hours
+        self.tick_size = tick_size
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+
+
+def _parse_bitget(raw: Dict[str, Any]) -> Dict[str, ContractMeta]:
+    contracts = raw.get("contracts") or []
+    metas: Dict[str, ContractMeta] = {}
+    for item in contracts:
+        if not isinstance(item, dict) or not item.get("symbol"):
+            continue
+        symbol = item["symbol"]
+        tick_size = None
+        price_place = item.get("pricePlace")
+        if price_place not in (None, ""):
+            try:
+                tick_size = float(item.get("priceEndStep") or 1) * (10 ** -int(price_place))
+            except (TypeError, ValueError):
+                tick_size = None
+        metas[symbol] = ContractMeta(
+            "bitget",
+            symbol,
+            margin_coin=item.get("marginCoin") or item.get("quoteCoin"),
+            funding_interval_hours=parse_interval_hours(item.get("fundInterval")),
+            tick_size=tick_size,
+            maker_fee=_to_float(item.get("makerFeeRate")),
+            taker_fee=_to_float(item.get("takerFeeRate")),
+        )
+    return metas
+
+
+def _parse_binance(raw: Dict[str, Any]) -> Dict[str, ContractMeta]:
+    intervals = {
+        item.get("symbol"): parse_interval_hours(item.get("fundingIntervalHours"))
+        for item in raw.get("funding_info") or []
+        if isinstance(item, dict)
+    }
+    metas: Dict[str, ContractMeta] = {}
+    for item in raw.get("contracts") or []:
+        if not isinstance(item, dict) or not item.get("symbol"):
+            continue
+        if item.get("contractType") not in (None, "PERPETUAL"):
+            continue
+        # 结算中（SETTLING）、待上线（PENDING_TRADING）、已下架的合约没有可用的资金费率，不进入轮询
+        if item.get("status") != "TRADING":
+            continue
+        symbol = item["symbol"]
+        tick_size = None
+        for flt in item.get("filters") or []:
+            if flt.get("filterType") == "PRICE_FILTER":
+                tick_size = _to_float(flt.get("tickSize"))
+        metas[symbol] = ContractMeta(
+            "binance",
+            symbol,
+            margin_coin=item.get("marginAsset") or item.get("quoteAsset"),
+            # fundingInfo 只列出调整过周期的合约，其余默认 8 小时
+            funding_interval_hours=intervals.get(symbol, 8),
+            tick_size=tick_size,
+        )
+    return metas
+
+
+_PARSERS = {"bitget": _parse_bitget, "binance": _parse_binance}
+
+
+class ContractCache:
+    """两家交易所的合约元数据缓存：启动时从磁盘加载，按较长 TTL 用条件请求刷新并落盘。"""
+
+    def __init__(
+        self,
+        *,
+        path: str,
+        seeds: Optional[Dict[str, str]] = None,
+        ttl_secs: float = 6 * 3600,
+        bitget_product_type: str = "USDT-FUTURES",
+    ) -> None:
+        self._path = path
+        self._seeds = seeds or {}
+        self._ttl = ttl_secs
+        self._product_type = bitget_product_type.upper()
+        # exchange -> {"fetched_at", "etag", "last_modified", "contracts", ...} 原始数据，用于落盘
+        self._raw: Dict[str, Dict[str, Any]] = {}
+        self._metas: Dict[str, Dict[str, ContractMeta]] = {}
+        # 每次重新解析加一，依赖合约列表的派生数据据此判断是否需要重算
+        self._versions: Dict[str, int] = {}
+
+    def load(self) -> None:
+        if os.path.exists(self._path):
+            try:
+                with open(self._path, "r", encoding="utf-8") as fh:
+                    self._raw = json.load(fh)
+            except Exception as exc:
+                logger.warning("load contract cache %s failed: %s", self._path, exc)
+                self._raw = {}
+        for exchange, seed_path in self._seeds.items():
+            if self._raw.get(exchange, {}).get("contracts") or not os.path.exists(seed_path):
+                continue
+            try:
+                with open(seed_path, "r", encoding="utf-8") as fh:
+                    payload = json.load(fh)
+            except Exception as exc:
+                logger.warning("load contract seed %s failed: %s", seed_path, exc)
+                continue
+            data = payload.get("data") if isinstance(payload, dict) else payload
+            # 种子文件视为已过期，首个周期会在线刷新一次并落盘
+            self._raw[exchange] = {"fetched_at": 0, "contracts": data or []}
+        for exchange in self._raw:
+            self._reparse(exchange)
+        logger.info(
+            "Contract cache loaded: %s",
+            {exchange: len(metas) for exchange, metas in self._metas.items()},
+        )
+
+    def get(self, exchange: str, symbol: str) -> Optional[ContractMeta]:
+        return self._metas.get(exchange, {}).get(symbol)
+
+    def symbols(self, exchange: str) -> List[str]:
+        return list(self._metas.get(exchange, {}).keys())
+
+    def version(self, exchange: str) -> int:
+        return self._versions.get(exchange, 0)
+
+    def margin_coins(self, exchange: str) -> Dict[str, str]:
+        return {
+            symbol: meta.margin_coin
+            for symbol, meta in self._metas.get(exchange, {}).items()
+            if meta.margin_coin
+        }
+
+    def is_stale(self, exchange: str) -> bool:
+        raw = self._raw.get(exchange, {})
+        now = time.time()
+        # 刷新失败后间隔一段时间再试，避免每个周期都多打一次大请求
+        if now - (raw.get("failed_at") or 0) < min(self._ttl, REFRESH_RETRY_SECS):
+            return False
+        return now - (raw.get("fetched_at") or 0) >= self._ttl
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        result: Dict[str, Dict[str, Any]] = {}
+        for exchange, raw in self._raw.items():
+            fetched_at = raw.get("fetched_at") or 0
+            result[exchange] = {
+                "contracts": len(self._metas.get(exchange, {})),
+                "age_secs": round(time.time() - fetched_at, 1) if fetched_at else None,
+                "source": raw.get("source"),
+            }
+        return result
+
+    async def ensure_fresh(self, exchange: str, fetch: Fetcher) -> None:
+        """TTL 到期才刷新；刷新失败时继续使用旧数据。"""
+        if not self.is_stale(exchange):
+            return
+        try:
+            if exchange == "bitget":
+                changed = await self._refresh_bitget(fetch)
+            elif exchange == "binance":
+                changed = await self._refresh_binance(fetch)
+            else:
+                return
+        except Exception as exc:
+            logger.warning("refresh %s contracts failed, keep cached copy: %s", exchange, exc)
+            self._raw.setdefault(exchange, {})["failed_at"] = time.time()
+            return
+        if changed:
+            self._reparse(exchange)
+        self._save()
+
+    async def _refresh_bitget(self, fetch: Fetcher) -> bool:
+        raw = self._raw.setdefault("bitget", {})
+        last_error: Optional[Exception] = None
+        # 上次成功的地址排在最前；熔断中的地址由 fetch 直接抛错跳过
+        urls = sorted(BITGET_CONTRACTS_URLS, key=lambda url: url != raw.get("source"))
+        for url in urls:
+            headers = self._conditional_headers(raw) if raw.get("source") == url else {}
+            try:
+                resp = await fetch(url, params={"productType": self._product_type}, headers=headers)
+            except httpx.HTTPStatusError as exc:
+                last_error = exc
+                if exc.response.status_code in (400, 404):
+                    logger.warning(
+                        "Bitget contract endpoint %s unavailable (status %s)",
+                        url,
+                        exc.response.status_code,
+                    )
+                    continue
+                # 5xx 等同样换下一个地址，都失败时再抛出
+                logger.warning("Fetch bitget contracts failed (%s): %s", url, exc)
+                continue
+            except Exception as exc:
+                last_error = exc
+                logger.warning("Fetch bitget contracts failed (%s): %s", url, exc)
+                continue
+
+            raw["fetched_at"] = time.time()
+            if resp.status_code == 304:
+                logger.info("Bitget contracts not modified (%s)", url)
+                return False
+            payload = decode_json(resp)
+            data = payload.get("data") or []
+            if isinstance(data, dict):
+                data = data.get("symbols") or []
+            if not isinstance(data, list) or not data:
+                continue
+            raw.update(self._validators(resp))
+            raw["contracts"] = data
+            raw["source"] = url
+            logger.info("Refreshed %d bitget contracts via %s", len(data), url)
+            return True
+        if last_error is not None:
+            raise last_error
+        return False
+
+    async def _refresh_binance(self, fetch: Fetcher) -> bool:
+        raw = self._raw.setdefault("binance", {})
+        resp = await fetch(BINANCE_EXCHANGE_INFO_URL, headers=self._conditional_headers(raw))
+        raw["fetched_at"] = time.time()
+        changed = resp.status_code != 304
+        if changed:
+            payload = decode_json(resp)
+            raw.update(self._validators(resp))
+            raw["contracts"] = payload.get("symbols") or []
+            raw["source"] = BINANCE_EXCHANGE_INFO_URL
+            logger.info("Refreshed %d binance contracts", len(raw["contracts"]))
+        else:
+            logger.info("Binance exchangeInfo not modified")
+        # 结算周期的调整不体现在 exchangeInfo 里，合约列表没变也要重新拉 fundingInfo
+        try:
+            info = decode_json(await fetch(BINANCE_FUNDING_INFO_URL)) or []
+            if info != raw.get("funding_info"):
+                raw["funding_info"] = info
+                changed = True
+        except Exception as exc:
+            logger.warning("fetch binance fundingInfo failed: %s", exc)
+        return changed
+
+    @staticmethod
+    def _conditional_headers(raw: Dict[str, Any]) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if raw.get("etag"):
+            headers["If-None-Match"] = raw["etag"]
+        if raw.get("last_modified"):
+            headers["If-Modified-Since"] = raw["last_modified"]
+        return headers
+
+    @staticmethod
+    def _validators(resp: httpx.Response) -> Dict[str, Optional[str]]:
+        return {
+            "etag": resp.headers.get("etag"),
+            "last_modified": resp.headers.get("last-modified"),
+        }
+
+    def _reparse(self, exchange: str) -> None:
+        parser = _PARSERS.get(exchange)
+        if parser is None:
+            return
+        self._metas[exchange] = parser(self._raw.get(exchange) or {})
+        self._versions[exchange] = self._versions.get(exchange, 0) + 1
+
+    def _save(self) -> None:
+        tmp_path = f"{self._path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump(self._raw, fh)
+            os.replace(tmp_path, self._path)
+        except Exception as exc:
+            logger.warning("persist contract cache %s failed: %s", self._path, exc)
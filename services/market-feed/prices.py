@@ -0,0 +1,132 @@
+"""持仓合约的高频价格采样。
+
+资金费率按结算节奏抓取，价格却需要秒级新鲜度：风控按标记价判断止盈止损，统计按它算持仓收益。
+PriceSampler 只跟踪持仓合约（加上 price_tick_extra_symbols），每个交易所独立循环，
+每 interval 秒一次批量价格请求，价格有变化的合约写入独立的 price stream，与资金费率互不影响。
+价格长时间不变时也按 heartbeat_secs 重发一次，消费端据此判断价格是否新鲜。
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from libs.models.price import PriceTick
+from transport import CycleStats
+from universe import canonical_symbol
+
+logger = logging.getLogger("market_feed.prices")
+
+
+class PriceSampler:
+    def __init__(
+        self,
+        adapters: Dict[str, Any],
+        publish: Callable[[List[PriceTick]], Awaitable[Any]],
+        *,
+        interval_secs: float = 1.0,
+        positions_refresh_secs: float = 10.0,
+        extra_symbols: Iterable[str] = (),
+        load_positions: Optional[Callable[[], Awaitable[Set[Tuple[str, str]]]]] = None,
+        heartbeat_secs: float = 5.0,
+    ) -> None:
+        self._adapters = adapters
+        self._publish = publish
+        self.interval_secs = max(0.2, float(interval_secs))
+        self.positions_refresh_secs = max(1.0, float(positions_refresh_secs))
+        self.heartbeat_secs = max(self.interval_secs, float(heartbeat_secs))
+        self._extra = {canonical_symbol(symbol) for symbol in extra_symbols}
+        self._load_positions = load_positions
+        # exchange -> 持仓合约（统一符号）
+        self._positions: Dict[str, Set[str]] = {}
+        self.positions_error: Optional[str] = None
+        # (exchange, symbol) -> (mark, index, 上次发布的 monotonic 时间)
+        self._last: Dict[Tuple[str, str], Tuple[Optional[float], Optional[float], float]] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {
+            name: {"cycles": 0, "failures": 0, "ticks": 0, "published": 0} for name in adapters
+        }
+
+    def set_positions(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        positions: Dict[str, Set[str]] = {}
+        for exchange, symbol in pairs:
+            positions.setdefault(exchange.lower(), set()).add(canonical_symbol(symbol))
+        self._positions = positions
+
+    def symbols(self, exchange: str) -> List[str]:
+        return sorted(self._positions.get(exchange, set()) | self._extra)
+
+    async def run(self) -> None:
+        tasks = [asyncio.create_task(self._exchange_loop(name)) for name in self._adapters]
+        if self._load_positions is not None:
+            tasks.append(asyncio.create_task(self._positions_loop()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _positions_loop(self) -> None:
+        assert self._load_positions is not None
+        while True:
+            try:
+                self.set_positions(await self._load_positions())
+                self.positions_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # 读不到持仓时沿用上一次的结果
+                error = str(exc) or type(exc).__name__
+                if error != self.positions_error:
+                    logger.warning("load open positions for price ticks failed, keep previous set: %s", error)
+                self.positions_error = error
+            await asyncio.sleep(self.positions_refresh_secs)
+
+    async def _exchange_loop(self, name: str) -> None:
+        while True:
+            started = time.monotonic()
+            symbols = self.symbols(name)
+            if symbols:
+                try:
+                    await asyncio.wait_for(self.sample(name, symbols), timeout=max(2.0, self.interval_secs * 3))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    self._stats[name]["failures"] += 1
+                    logger.warning("%s price sample failed: %s", name, str(exc) or type(exc).__name__)
+            await asyncio.sleep(max(0.0, self.interval_secs - (time.monotonic() - started)))
+
+    async def sample(self, name: str, symbols: List[str]) -> int:
+        """抓一轮价格并发布有变化（或到了心跳时间）的合约，返回发布条数。"""
+        adapter = self._adapters[name]
+        cycle = CycleStats(name, "prices")
+        ticks = await adapter.fetch_prices(cycle, symbols)
+        stats = self._stats[name]
+        stats["cycles"] += 1
+        stats["ticks"] += len(ticks)
+        stats["last_requests"] = cycle.requests
+        stats["last_latency_ms"] = round(cycle.wall_secs * 1000, 1)
+        now = time.monotonic()
+        changed: List[PriceTick] = []
+        for tick in ticks:
+            key = (tick.exchange, tick.symbol)
+            previous = self._last.get(key)
+            if (
+                previous is not None
+                and previous[0] == tick.mark_price
+                and previous[1] == tick.index_price
+                and now - previous[2] < self.heartbeat_secs
+            ):
+                continue
+            self._last[key] = (tick.mark_price, tick.index_price, now)
+            changed.append(tick)
+        if changed:
+            await self._publish(changed)
+            stats["published"] += len(changed)
+        return len(changed)
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "interval_secs": self.interval_secs,
+            "symbols": {name: len(self.symbols(name)) for name in self._adapters},
+            "positions_error": self.positions_error,
+            "exchanges": {name: dict(stats) for name, stats in self._stats.items()},
+        }
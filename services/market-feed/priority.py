@@ -0,0 +1,96 @@
+"""需要高频刷新的合约：有持仓的，以及费率差接近开仓阈值的。
+
+持仓来自数据库里 OPEN 状态的 PositionGroup（两条腿所在交易所都算），
+费率差用上一轮各交易所的最新快照计算，与 strategy-engine 一样取与其它交易所差值绝对值的最大者。
+"""
+import logging
+from typing import Dict, Iterable, List, Mapping, Set, Tuple
+
+from libs.models.funding import FundingSnapshot
+from libs.models.symbols import canonical_symbol
+
+logger = logging.getLogger("market_feed.priority")
+
+POSITION = "position"
+NEAR_THRESHOLD = "near_threshold"
+
+
+async def load_open_positions() -> Set[Tuple[str, str]]:
+    """返回 {(exchange, symbol)}；数据库不可用时抛出异常，由调用方保留上一次的结果。"""
+    # 延迟导入：只用行情功能时不需要数据库驱动
+    from sqlalchemy import select
+
+    from libs.db.models import PositionGroup
+    from libs.db.session import AsyncSessionLocal
+
+    stmt = select(PositionGroup.symbol, PositionGroup.long_exchange, PositionGroup.short_exchange).where(
+        PositionGroup.status == "OPEN"
+    )
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(stmt)).all()
+    pairs: Set[Tuple[str, str]] = set()
+    for symbol, long_exchange, short_exchange in rows:
+        for exchange in (long_exchange, short_exchange):
+            if exchange and symbol:
+                pairs.add((exchange.lower(), canonical_symbol(symbol)))
+    return pairs
+
+
+def max_spreads(latest: Mapping[str, Mapping[str, FundingSnapshot]]) -> Dict[str, float]:
+    """每个合约在所有交易所两两之间的最大 |rate8h 差|；只在一家交易所上市的合约不出现。"""
+    rates: Dict[str, List[float]] = {}
+    for snapshots in latest.values():
+        for symbol, snapshot in snapshots.items():
+            rates.setdefault(symbol, []).append(snapshot.rate8h)
+    return {symbol: max(values) - min(values) for symbol, values in rates.items() if len(values) > 1}
+
+
+class PriorityTracker:
+    """汇总持仓与接近阈值的合约，按 hot 档名额截断后交给调度器。"""
+
+    def __init__(self, *, margin: float, max_symbols: int) -> None:
+        # 费率差 >= 开仓阈值 - margin 即视为接近阈值
+        self.margin = float(margin)
+        self.max_symbols = max(0, int(max_symbols))
+        self.positions: Set[Tuple[str, str]] = set()
+        self.positions_error: str = ""
+        self.dropped = 0
+        self._spreads: Dict[str, float] = {}
+
+    def set_positions(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        self.positions = set(pairs)
+        self.positions_error = ""
+
+    def select(
+        self, latest: Mapping[str, Mapping[str, FundingSnapshot]], threshold: float
+    ) -> Dict[str, Dict[str, str]]:
+        """返回 exchange -> {symbol: 原因}。持仓总是入选，接近阈值的按费率差从大到小占用剩余名额。"""
+        self._spreads = max_spreads(latest)
+        selected: Dict[str, Dict[str, str]] = {exchange: {} for exchange in latest}
+        symbols: Set[str] = set()
+        for exchange, symbol in self.positions:
+            selected.setdefault(exchange, {})[symbol] = POSITION
+            symbols.add(symbol)
+        floor = threshold - self.margin
+        near = sorted(
+            (symbol for symbol, spread in self._spreads.items() if spread >= floor and symbol not in symbols),
+            key=lambda symbol: self._spreads[symbol],
+            reverse=True,
+        )
+        room = max(0, self.max_symbols - len(symbols))
+        self.dropped = max(0, len(near) - room)
+        for symbol in near[:room]:
+            for exchange, snapshots in latest.items():
+                if symbol in snapshots:
+                    selected[exchange][symbol] = NEAR_THRESHOLD
+        return selected
+
+    def health(self) -> Dict[str, object]:
+        return {
+            "positions": len(self.positions),
+            "positions_error": self.positions_error or None,
+            "max_symbols": self.max_symbols,
+            "margin": self.margin,
+            "near_threshold_dropped": self.dropped,
+            "top_spreads": dict(sorted(self._spreads.items(), key=lambda kv: kv[1], reverse=True)[:5]),
+        }
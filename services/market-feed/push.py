@@ -0,0 +1,248 @@
+"""最新值表的推送订阅（WebSocket / SSE）。
+
+客户端按交易所和合约订阅：连上先收一帧全量快照，之后只收有变化的合约（增量帧）。
+FundingFeed 更新最新值表时调用 update / remove 记下变化，run 循环每 interval 秒合并发送一次：
+每个变化的快照只序列化一次，订阅条件相同的客户端共享同一帧字节。
+每个客户端一个有界队列，积压满了说明消费太慢，直接断开，不拖慢其它客户端也不无限占内存。
+"""
+import asyncio
+import logging
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+import orjson
+
+from libs.models.funding import FundingSnapshot
+from query import SnapshotIndex
+
+logger = logging.getLogger("market_feed.push")
+
+# (交易所, 合约集合)；合约为 None 表示这些交易所的全部合约
+SubscriptionKey = Tuple[Tuple[str, ...], Optional[FrozenSet[str]]]
+
+
+class Frame:
+    """一帧 JSON；WebSocket 文本和 SSE 编码各只生成一次，由同组客户端共享。"""
+
+    __slots__ = ("data", "_text", "_sse")
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self._text: Optional[str] = None
+        self._sse: Optional[bytes] = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.data.decode()
+        return self._text
+
+    @property
+    def sse(self) -> bytes:
+        if self._sse is None:
+            self._sse = b"data: " + self.data + b"\n\n"
+        return self._sse
+
+
+HEARTBEAT = Frame(b'{"type":"heartbeat"}')
+
+
+class Subscriber:
+    def __init__(self, key: SubscriptionKey, max_frames: int) -> None:
+        self.key = key
+        # None 是断开信号
+        self.queue: "asyncio.Queue[Optional[Frame]]" = asyncio.Queue(maxsize=max_frames)
+        self.dropped = False
+
+    def offer(self, frame: Frame) -> bool:
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def next_frame(self, heartbeat_secs: float) -> Optional[Frame]:
+        """下一帧；空闲超过 heartbeat_secs 返回心跳帧，被判定为慢消费者后返回 None。"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=heartbeat_secs)
+        except asyncio.TimeoutError:
+            return HEARTBEAT
+
+
+class PushHub:
+    def __init__(
+        self,
+        index: SnapshotIndex,
+        *,
+        interval_secs: float = 0.5,
+        max_frames: int = 64,
+        max_clients: int = 1000,
+        heartbeat_secs: float = 15.0,
+    ) -> None:
+        self._index = index
+        self.interval_secs = max(0.05, float(interval_secs))
+        self.max_frames = max(2, int(max_frames))
+        self.max_clients = max(1, int(max_clients))
+        self.heartbeat_secs = max(1.0, float(heartbeat_secs))
+        # (exchange, symbol) -> 待发送的快照；None 表示合约已从最新值表移除
+        self._pending: Dict[Tuple[str, str], Optional[FundingSnapshot]] = {}
+        # 上次记入的值，只有真正变化的合约才进增量
+        self._signatures: Dict[Tuple[str, str], Tuple] = {}
+        self._groups: Dict[SubscriptionKey, Set[Subscriber]] = {}
+        self._clients = 0
+        self.seq = 0
+        self._counters: Dict[str, int] = {
+            "subscribed": 0,
+            "dropped": 0,
+            "frames_built": 0,
+            "frames_sent": 0,
+            "unchanged": 0,
+        }
+
+    @property
+    def full(self) -> bool:
+        return self._clients >= self.max_clients
+
+    def subscribe(self, exchanges: Sequence[str], symbols: Optional[Sequence[str]]) -> Subscriber:
+        """登记订阅并放入全量快照帧；两步之间没有 await，快照之后的变化都会出现在后续增量里。"""
+        key = self._key(exchanges, symbols)
+        subscriber = Subscriber(key, self.max_frames)
+        self._groups.setdefault(key, set()).add(subscriber)
+        self._clients += 1
+        self._counters["subscribed"] += 1
+        subscriber.offer(self._snapshot_frame(key))
+        return subscriber
+
+    def resubscribe(self, subscriber: Subscriber, exchanges: Sequence[str], symbols: Optional[Sequence[str]]) -> None:
+        """更换订阅条件，重新发一帧全量快照。"""
+        if subscriber.dropped:
+            return
+        self._leave(subscriber)
+        subscriber.key = self._key(exchanges, symbols)
+        self._groups.setdefault(subscriber.key, set()).add(subscriber)
+        if not subscriber.offer(self._snapshot_frame(subscriber.key)):
+            self._drop(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        if subscriber.dropped:
+            return
+        subscriber.dropped = True
+        self._leave(subscriber)
+        self._clients -= 1
+
+    def update(self, snapshots: Sequence[FundingSnapshot]) -> None:
+        for snapshot in snapshots:
+            key = (snapshot.exchange, snapshot.symbol)
+            signature = (
+                snapshot.funding_rate_raw,
+                snapshot.settle_interval_hours,
+                snapshot.next_funding_time_ms,
+                snapshot.mark_price,
+                snapshot.index_price,
+            )
+            if self._signatures.get(key) == signature:
+                self._counters["unchanged"] += 1
+                continue
+            self._signatures[key] = signature
+            self._pending[key] = snapshot
+
+    def remove(self, exchange: str, symbols: Sequence[str]) -> None:
+        for symbol in symbols:
+            key = (exchange, symbol)
+            if self._signatures.pop(key, None) is not None or key in self._pending:
+                self._pending[key] = None
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_secs)
+            try:
+                self.flush()
+            except Exception as exc:
+                logger.exception("push flush failed: %s", exc)
+
+    def flush(self) -> int:
+        """把积累的变化按订阅组各编码一帧发出；返回生成的帧数。"""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        if not self._groups:
+            return 0
+        by_exchange: Dict[str, Dict[str, Optional[FundingSnapshot]]] = {}
+        for (exchange, symbol), snapshot in pending.items():
+            by_exchange.setdefault(exchange, {})[symbol] = snapshot
+        self.seq += 1
+        fragments: Dict[Tuple[str, str], bytes] = {}
+        built = 0
+        for key, subscribers in list(self._groups.items()):
+            exchanges, symbols = key
+            data: List[bytes] = []
+            removed: List[Dict[str, str]] = []
+            for exchange in exchanges:
+                changes = by_exchange.get(exchange)
+                if not changes:
+                    continue
+                # 订阅的合约少时按订阅查，多时按变化遍历
+                if symbols is not None and len(symbols) < len(changes):
+                    items = [(symbol, changes[symbol]) for symbol in symbols if symbol in changes]
+                else:
+                    items = [(symbol, snapshot) for symbol, snapshot in changes.items() if symbols is None or symbol in symbols]
+                for symbol, snapshot in items:
+                    if snapshot is None:
+                        removed.append({"exchange": exchange, "symbol": symbol})
+                        continue
+                    fragment = fragments.get((exchange, symbol))
+                    if fragment is None:
+                        fragment = fragments[(exchange, symbol)] = orjson.dumps(snapshot.model_dump())
+                    data.append(fragment)
+            if not data and not removed:
+                continue
+            frame = Frame(
+                b'{"type":"delta","seq":%d,"data":[' % self.seq
+                + b",".join(data)
+                + b'],"removed":'
+                + orjson.dumps(removed)
+                + b"}"
+            )
+            built += 1
+            for subscriber in list(subscribers):
+                if subscriber.offer(frame):
+                    self._counters["frames_sent"] += 1
+                else:
+                    self._drop(subscriber)
+        self._counters["frames_built"] += built
+        return built
+
+    def health(self) -> Dict[str, Any]:
+        depths = [subscriber.queue.qsize() for group in self._groups.values() for subscriber in group]
+        return {
+            "clients": self._clients,
+            "groups": len(self._groups),
+            "seq": self.seq,
+            "pending": len(self._pending),
+            "max_queue_depth": max(depths, default=0),
+            **self._counters,
+        }
+
+    def _key(self, exchanges: Sequence[str], symbols: Optional[Sequence[str]]) -> SubscriptionKey:
+        return tuple(sorted(set(exchanges))), frozenset(symbols) if symbols else None
+
+    def _snapshot_frame(self, key: SubscriptionKey) -> Frame:
+        exchanges, symbols = key
+        body = self._index.funding_body(exchanges, sorted(symbols) if symbols is not None else None)
+        return Frame(b'{"type":"snapshot","seq":%d,"data":' % self.seq + body + b"}")
+
+    def _leave(self, subscriber: Subscriber) -> None:
+        group = self._groups.get(subscriber.key)
+        if group is None:
+            return
+        group.discard(subscriber)
+        if not group:
+            del self._groups[subscriber.key]
+
+    def _drop(self, subscriber: Subscriber) -> None:
+        """慢消费者：清空积压，放入断开信号，由连接自己的发送循环关闭连接。"""
+        self.unsubscribe(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+        self._counters["dropped"] += 1
+        logger.warning("dropped slow push subscriber %s (%d clients left)", subscriber.key, self._clients)
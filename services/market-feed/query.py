@@ -0,0 +1,121 @@
+"""查询接口用的快照索引与预序列化缓存。
+
+每个交易所的最新值表变化时只把代数（generation）加一；下一次查询时才按交易所重新序列化一次，
+之后同一代数内的请求直接拼接缓存好的字节。ETag 由涉及的交易所代数与查询参数决定，
+轮询方带 If-None-Match 在两次刷新之间拿到 304。
+"""
+import hashlib
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import orjson
+
+from libs.models.funding import FundingSnapshot
+
+
+class SnapshotIndex:
+    def __init__(self, latest: Mapping[str, Mapping[str, FundingSnapshot]]) -> None:
+        # FundingFeed._latest 的只读视图：exchange -> symbol -> 快照
+        self._latest = latest
+        self._generation = 0
+        self._changed: Dict[str, int] = {}
+        # exchange -> (代数, {symbol: 序列化后的单个快照}, 整表字节)
+        self._serialized: Dict[str, Tuple[int, Dict[str, bytes], bytes]] = {}
+        # (视图名, 参数) -> (代数, 字节)；只保留最近的若干个查询
+        self._views: Dict[Tuple[str, Tuple], Tuple[int, bytes]] = {}
+        self.max_views = 256
+        self.hits = 0
+        self.misses = 0
+
+    def touch(self, exchange: str) -> None:
+        """最新值表有变化时调用。"""
+        self._generation += 1
+        self._changed[exchange] = self._generation
+
+    def generation(self, exchanges: Iterable[str]) -> int:
+        return max((self._changed.get(exchange, 0) for exchange in exchanges), default=0)
+
+    def etag(self, view: str, exchanges: Sequence[str], params: Tuple = ()) -> str:
+        digest = hashlib.blake2b(repr((view, tuple(exchanges), params)).encode(), digest_size=6).hexdigest()
+        return f'W/"{self.generation(exchanges)}-{digest}"'
+
+    def _fragments(self, exchange: str) -> Tuple[Dict[str, bytes], bytes]:
+        generation = self._changed.get(exchange, 0)
+        cached = self._serialized.get(exchange)
+        if cached is not None and cached[0] == generation:
+            return cached[1], cached[2]
+        fragments = {
+            symbol: orjson.dumps(snapshot.model_dump())
+            for symbol, snapshot in self._latest.get(exchange, {}).items()
+        }
+        body = b"[" + b",".join(fragments.values()) + b"]"
+        self._serialized[exchange] = (generation, fragments, body)
+        return fragments, body
+
+    def exchange_body(self, exchange: str) -> bytes:
+        return self._fragments(exchange)[1]
+
+    def funding_body(self, exchanges: Sequence[str], symbols: Optional[Sequence[str]]) -> bytes:
+        """按交易所顺序拼接指定合约的快照；symbols 为空时返回这些交易所的全部快照。"""
+        parts: List[bytes] = []
+        for exchange in exchanges:
+            fragments, body = self._fragments(exchange)
+            if symbols is None:
+                if len(body) > 2:
+                    parts.append(body[1:-1])
+                continue
+            parts.extend(fragments[symbol] for symbol in symbols if symbol in fragments)
+        return b"[" + b",".join(parts) + b"]"
+
+    def spreads_body(self, exchanges: Sequence[str], *, min_diff: float = 0.0, limit: Optional[int] = None) -> bytes:
+        key = ("spreads", (tuple(exchanges), min_diff, limit))
+        generation = self.generation(exchanges)
+        cached = self._views.get(key)
+        if cached is not None and cached[0] == generation:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        body = orjson.dumps(build_spreads({name: self._latest.get(name, {}) for name in exchanges}, min_diff, limit))
+        if len(self._views) >= self.max_views:
+            self._views.pop(next(iter(self._views)))
+        self._views[key] = (generation, body)
+        return body
+
+    def health(self) -> Dict[str, object]:
+        return {
+            "generation": self._generation,
+            "serialized": {exchange: len(cached[1]) for exchange, cached in self._serialized.items()},
+            "view_cache": {"entries": len(self._views), "hits": self.hits, "misses": self.misses},
+        }
+
+
+def build_spreads(
+    latest: Mapping[str, Mapping[str, FundingSnapshot]], min_diff: float = 0.0, limit: Optional[int] = None
+) -> List[Dict[str, object]]:
+    """每个合约取 rate8h 最高与最低的两家：做空高费率、做多低费率，与策略引擎的配对方式一致。"""
+    by_symbol: Dict[str, List[FundingSnapshot]] = {}
+    for snapshots in latest.values():
+        for symbol, snapshot in snapshots.items():
+            by_symbol.setdefault(symbol, []).append(snapshot)
+    rows: List[Dict[str, object]] = []
+    for symbol, snapshots in by_symbol.items():
+        if len(snapshots) < 2:
+            continue
+        rates = {snapshot.exchange: snapshot.rate8h for snapshot in snapshots}
+        low = min(snapshots, key=lambda snapshot: rates[snapshot.exchange])
+        high = max(snapshots, key=lambda snapshot: rates[snapshot.exchange])
+        diff = rates[high.exchange] - rates[low.exchange]
+        if diff < min_diff:
+            continue
+        rows.append(
+            {
+                "symbol": symbol,
+                "diff_rate8h": diff,
+                "long_exchange": low.exchange,
+                "short_exchange": high.exchange,
+                "rate8h": rates,
+                "next_funding_time_ms": {snapshot.exchange: snapshot.next_funding_time_ms for snapshot in snapshots},
+                "captured_at_ms": min(snapshot.captured_at_ms for snapshot in snapshots),
+            }
+        )
+    rows.sort(key=lambda row: row["diff_rate8h"], reverse=True)
+    return rows[:limit] if limit else rows
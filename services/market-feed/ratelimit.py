@@ -0,0 +1,295 @@
+"""行情抓取的共享限速器。
+
+按 host 一个令牌桶（单位为请求权重）+ 按 endpoint 的独立令牌桶 + 自适应并发（AIMD）。
+响应头里的已用权重/剩余额度、429/418 以及 Retry-After 都会反馈到速率与并发上：
+触发限流时速率和并发减半并暂停该 host，之后随着连续成功逐步恢复到配置值。
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger("market_feed.ratelimit")
+
+# 没有 Retry-After 时的默认暂停时间；Binance 的 418 表示 IP 已被临时封禁，需要停更久
+DEFAULT_RETRY_AFTER = {429: 2.0, 418: 60.0}
+# 已用权重超过上限的这个比例就主动降速
+HEADER_BACKOFF_RATIO = 0.8
+MIN_RATE_RATIO = 0.1
+RECOVERY_FACTOR = 1.1
+
+
+class EndpointLimit:
+    """单个 endpoint 的限额：每次请求消耗的 host 权重，以及可选的独立速率。"""
+
+    __slots__ = ("weight", "rate", "burst")
+
+    def __init__(self, *, weight: float = 1.0, rate: Optional[float] = None, burst: Optional[float] = None) -> None:
+        self.weight = weight
+        self.rate = rate
+        self.burst = burst
+
+
+class HostLimits:
+    """交易所在适配器里声明的 host 级限额。"""
+
+    def __init__(
+        self,
+        *,
+        rate: float,
+        burst: Optional[float] = None,
+        endpoints: Optional[Dict[str, EndpointLimit]] = None,
+        weight_limit: Optional[float] = None,
+        used_weight_header: Optional[str] = None,
+        remaining_header: Optional[str] = None,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.endpoints = endpoints or {}
+        # 例如 Binance 的 X-MBX-USED-WEIGHT-1M 与 2400/分钟上限
+        self.weight_limit = weight_limit
+        self.used_weight_header = used_weight_header
+        # 直接给出剩余额度的响应头（有的交易所只在部分接口返回，缺失时忽略）
+        self.remaining_header = remaining_header
+
+    def scaled(self, factor: float) -> "HostLimits":
+        """按比例缩放速率（权重上限不变，响应头仍按交易所的真实上限判断）。"""
+        factor = max(0.01, float(factor))
+        return HostLimits(
+            rate=self.rate * factor,
+            burst=self.burst,
+            endpoints={
+                path: EndpointLimit(
+                    weight=limit.weight,
+                    rate=limit.rate * factor if limit.rate else None,
+                    burst=limit.burst,
+                )
+                for path, limit in self.endpoints.items()
+            },
+            weight_limit=self.weight_limit,
+            used_weight_header=self.used_weight_header,
+            remaining_header=self.remaining_header,
+        )
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = max(1e-6, float(rate))
+        self.capacity = max(1.0, float(capacity if capacity is not None else rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def set_rate(self, rate: float) -> None:
+        self._refill()
+        self.rate = max(1e-6, float(rate))
+
+    async def acquire(self, cost: float = 1.0) -> float:
+        """取走 cost 个令牌，返回等待的秒数。持锁等待，保证先到先得。"""
+        if cost <= 0:
+            return 0.0
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            # 单次请求权重超过桶容量时允许透支，否则永远等不到
+            need = min(cost, self.capacity)
+            if self._tokens < need:
+                wait = (need - self._tokens) / self.rate
+                await asyncio.sleep(wait)
+                waited = wait
+                self._refill()
+            self._tokens -= cost
+        return waited
+
+
+class HostLimiter:
+    """单个 host 的令牌桶、endpoint 桶与自适应并发。"""
+
+    def __init__(self, host: str, limits: HostLimits, *, max_concurrency: int) -> None:
+        self.host = host
+        self.limits = limits
+        self.base_rate = float(limits.rate)
+        self.bucket = TokenBucket(limits.rate, limits.burst)
+        self.endpoints: Dict[str, TokenBucket] = {
+            path: TokenBucket(limit.rate, limit.burst)
+            for path, limit in limits.endpoints.items()
+            if limit.rate
+        }
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.concurrency = self.max_concurrency
+        self._inflight = 0
+        self._cond = asyncio.Condition()
+        self._paused_until = 0.0
+        self._successes = 0
+        self.requests = 0
+        self.throttle_events = 0
+        self.header_backoffs = 0
+        self.waited_secs = 0.0
+        self.used_weight: Optional[float] = None
+        self.remaining: Optional[float] = None
+        self.last_throttle: Optional[Dict[str, Any]] = None
+        self._endpoint_requests: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def slot(self, path: str, weight: Optional[float] = None) -> AsyncIterator[None]:
+        """weight 为空时按 endpoint 声明的权重；同一 endpoint 带不同参数权重不同时由调用方传入。"""
+        if weight is None:
+            limit = self.limits.endpoints.get(path)
+            weight = limit.weight if limit is not None else 1.0
+        # 等待期间可能又收到 429，循环直到暂停结束
+        while (pause := self._paused_until - time.monotonic()) > 0:
+            self.waited_secs += pause
+            await asyncio.sleep(pause)
+        endpoint_bucket = self.endpoints.get(path)
+        if endpoint_bucket is not None:
+            self.waited_secs += await endpoint_bucket.acquire(1.0)
+        self.waited_secs += await self.bucket.acquire(weight)
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._inflight < self.concurrency)
+            self._inflight += 1
+        self.requests += 1
+        self._endpoint_requests[path] = self._endpoint_requests.get(path, 0) + 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._inflight -= 1
+                self._cond.notify_all()
+
+    async def observe(self, path: str, resp: httpx.Response) -> None:
+        if resp.status_code in (429, 418):
+            self._throttle(path, resp)
+            return
+        self._learn_headers(resp)
+        if resp.status_code < 400:
+            self._successes += 1
+            # 加性增：每连续成功 concurrency 次并发 +1，速率按比例回升到配置值
+            if self._successes >= self.concurrency:
+                self._successes = 0
+                if self.concurrency < self.max_concurrency:
+                    self.concurrency += 1
+                    async with self._cond:
+                        self._cond.notify_all()
+                if self.bucket.rate < self.base_rate:
+                    self.bucket.set_rate(min(self.base_rate, self.bucket.rate * RECOVERY_FACTOR))
+
+    def _throttle(self, path: str, resp: httpx.Response) -> None:
+        retry_after = _retry_after(resp) or DEFAULT_RETRY_AFTER.get(resp.status_code, 2.0)
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        # 乘性减：并发与速率减半
+        self.concurrency = max(1, self.concurrency // 2)
+        self.bucket.set_rate(max(self.base_rate * MIN_RATE_RATIO, self.bucket.rate / 2))
+        self._successes = 0
+        self.throttle_events += 1
+        self.last_throttle = {
+            "status": resp.status_code,
+            "path": path,
+            "retry_after_secs": retry_after,
+            "at": time.time(),
+        }
+        logger.warning(
+            "%s throttled with %s on %s, pause %.1fs, rate=%.2f concurrency=%d",
+            self.host,
+            resp.status_code,
+            path,
+            retry_after,
+            self.bucket.rate,
+            self.concurrency,
+        )
+
+    def _learn_headers(self, resp: httpx.Response) -> None:
+        limits = self.limits
+        pressure = None
+        if limits.used_weight_header and limits.weight_limit:
+            used = _header_float(resp, limits.used_weight_header)
+            if used is not None:
+                self.used_weight = used
+                pressure = used / limits.weight_limit
+        if limits.remaining_header:
+            remaining = _header_float(resp, limits.remaining_header)
+            if remaining is not None:
+                self.remaining = remaining
+                if remaining <= 1:
+                    pressure = max(pressure or 0.0, 1.0)
+        if pressure is not None and pressure >= HEADER_BACKOFF_RATIO:
+            # 接近上限时提前降速，而不是等 429
+            slowed = max(self.base_rate * MIN_RATE_RATIO, self.bucket.rate * 0.7)
+            if slowed < self.bucket.rate:
+                self.bucket.set_rate(slowed)
+                self.header_backoffs += 1
+                self._successes = 0
+
+    def health(self) -> Dict[str, Any]:
+        paused = self._paused_until - time.monotonic()
+        return {
+            "rate": round(self.bucket.rate, 3),
+            "base_rate": self.base_rate,
+            "concurrency": self.concurrency,
+            "max_concurrency": self.max_concurrency,
+            "inflight": self._inflight,
+            "paused_secs": round(paused, 1) if paused > 0 else 0.0,
+            "requests_total": self.requests,
+            "throttle_events": self.throttle_events,
+            "header_backoffs": self.header_backoffs,
+            "waited_secs_total": round(self.waited_secs, 3),
+            "used_weight": self.used_weight,
+            "remaining": self.remaining,
+            "last_throttle": self.last_throttle,
+            "endpoints": {
+                path: {
+                    "requests": count,
+                    "rate": round(self.endpoints[path].rate, 3) if path in self.endpoints else None,
+                }
+                for path, count in self._endpoint_requests.items()
+            },
+        }
+
+
+class RateLimiter:
+    """整个 feed 共用一个实例，按 host 分派到 HostLimiter。"""
+
+    def __init__(self) -> None:
+        self._hosts: Dict[str, HostLimiter] = {}
+
+    def configure(self, host: str, limits: HostLimits, *, max_concurrency: int) -> HostLimiter:
+        if host not in self._hosts:
+            self._hosts[host] = HostLimiter(host, limits, max_concurrency=max_concurrency)
+        return self._hosts[host]
+
+    def for_url(self, url: str) -> HostLimiter:
+        host = urlsplit(url).hostname or ""
+        limiter = self._hosts.get(host)
+        if limiter is None:
+            # 未声明的 host 给一个保守的默认值
+            limiter = self.configure(host, HostLimits(rate=5.0), max_concurrency=2)
+        return limiter
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        return {host: limiter.health() for host, limiter in self._hosts.items()}
+
+
+def _header_float(resp: httpx.Response, name: str) -> Optional[float]:
+    value = resp.headers.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _retry_after(resp: httpx.Response) -> Optional[float]:
+    # 只处理秒数形式；HTTP 日期形式交易所基本不用
+    value = _header_float(resp, "Retry-After")
+    if value is None or value < 0:
+        return None
+    return value
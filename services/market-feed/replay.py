@@ -0,0 +1,220 @@
+"""交易所 HTTP 响应的录制与回放。
+
+RecordingTransport 包在真实传输层外面，把原始响应（状态码、响应头、未解压的 body、耗时）记到 Recorder，
+保存为 gzip 压缩的 JSON Lines；ReplayTransport 按 (method, host, path, query) 找到录制的响应回放，
+可以按录制时的耗时、加速或不等待，并按比例注入延迟、429、5xx 和空 data 响应，用于离线压测和回归。
+"""
+import asyncio
+import base64
+import gzip
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import httpx
+import orjson
+
+logger = logging.getLogger("market_feed.replay")
+
+RequestKey = Tuple[str, str, str, Tuple[Tuple[str, str], ...]]
+
+
+def request_key(request: httpx.Request) -> RequestKey:
+    query = tuple(sorted(parse_qsl(request.url.query.decode("ascii"), keep_blank_values=True)))
+    return request.method, request.url.host, request.url.path, query
+
+
+class Recorder:
+    """内存里攒录制结果，save 时一次写盘；超过 max_records 后不再记录。"""
+
+    def __init__(self, path: str, *, max_records: int = 5000) -> None:
+        self.path = path
+        self.max_records = max(1, int(max_records))
+        self.records: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self._started = time.monotonic()
+
+    def add(self, request: httpx.Request, response: httpx.Response, body: bytes, elapsed: float) -> None:
+        if len(self.records) >= self.max_records:
+            self.dropped += 1
+            return
+        method, host, path, query = request_key(request)
+        self.records.append(
+            {
+                "offset": round(time.monotonic() - self._started - elapsed, 6),
+                "elapsed": round(elapsed, 6),
+                "method": method,
+                "host": host,
+                "path": path,
+                "query": [list(item) for item in query],
+                "status": response.status_code,
+                "http_version": response.extensions.get("http_version", b"HTTP/1.1").decode("ascii"),
+                "headers": [[name, value] for name, value in response.headers.multi_items()],
+                "body": base64.b64encode(body).decode("ascii"),
+            }
+        )
+
+    def save(self) -> None:
+        if not self.records:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as fh:
+            for record in self.records:
+                fh.write(json.dumps(record, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self.path)
+        logger.info("Saved %d recorded responses to %s (dropped %d)", len(self.records), self.path, self.dropped)
+
+
+def load_recording(path: str) -> List[Dict[str, Any]]:
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport, recorder: Recorder) -> None:
+        self._inner = inner
+        self._recorder = recorder
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self._inner.handle_async_request(request)
+        try:
+            # 记原始字节，Content-Encoding 与 Content-Length 保持一致，回放时由客户端照常解压
+            body = b"".join([chunk async for chunk in response.stream])
+        finally:
+            await response.aclose()
+        self._recorder.add(request, response, body, time.perf_counter() - started)
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=httpx.ByteStream(body),
+            extensions=response.extensions,
+            request=request,
+        )
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+class Faults:
+    """按比例注入的故障；seed 固定时每次回放的故障序列相同。"""
+
+    def __init__(
+        self,
+        *,
+        latency_secs: float = 0.0,
+        throttle_ratio: float = 0.0,
+        retry_after_secs: float = 1.0,
+        error_ratio: float = 0.0,
+        empty_ratio: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.latency_secs = max(0.0, float(latency_secs))
+        self.throttle_ratio = float(throttle_ratio)
+        self.retry_after_secs = float(retry_after_secs)
+        self.error_ratio = float(error_ratio)
+        self.empty_ratio = float(empty_ratio)
+        self._random = random.Random(seed)
+        self.injected: Dict[str, int] = {"throttle": 0, "error": 0, "empty": 0}
+
+    @classmethod
+    def parse(cls, spec: str, *, seed: int = 0) -> "Faults":
+        """解析 "latency=0.05,429=0.02,5xx=0.01,empty=0.01,retry_after=1" 形式的配置。"""
+        names = {
+            "latency": "latency_secs",
+            "429": "throttle_ratio",
+            "retry_after": "retry_after_secs",
+            "5xx": "error_ratio",
+            "empty": "empty_ratio",
+        }
+        kwargs: Dict[str, float] = {}
+        for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+            key, _, value = item.partition("=")
+            if key not in names:
+                raise ValueError(f"unknown fault {key!r}, expected one of {sorted(names)}")
+            kwargs[names[key]] = float(value)
+        return cls(seed=seed, **kwargs)
+
+    def pick(self) -> Optional[str]:
+        roll = self._random.random()
+        for kind, ratio in (("throttle", self.throttle_ratio), ("error", self.error_ratio), ("empty", self.empty_ratio)):
+            if roll < ratio:
+                self.injected[kind] += 1
+                return kind
+            roll -= ratio
+        return None
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """回放录制的响应。同一请求录到多次时按顺序轮流返回；没录到的请求返回 404。"""
+
+    def __init__(self, records: List[Dict[str, Any]], *, speed: float = 0.0, faults: Optional[Faults] = None) -> None:
+        # speed=1 按录制耗时等待，10 表示快 10 倍，0 表示不等待
+        self.speed = max(0.0, float(speed))
+        self.faults = faults or Faults()
+        self._records: Dict[RequestKey, List[Dict[str, Any]]] = {}
+        for record in records:
+            key = (record["method"], record["host"], record["path"], tuple(tuple(item) for item in record["query"]))
+            self._records.setdefault(key, []).append(record)
+        self._cursor: Dict[RequestKey, int] = {}
+        self.served = 0
+        self.missed = 0
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs: Any) -> "ReplayTransport":
+        return cls(load_recording(path), **kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = request_key(request)
+        candidates = self._records.get(key)
+        if not candidates:
+            self.missed += 1
+            return httpx.Response(404, json={"msg": "not recorded"}, request=request)
+        index = self._cursor.get(key, 0)
+        self._cursor[key] = index + 1
+        record = candidates[index % len(candidates)]
+
+        delay = self.faults.latency_secs + (record["elapsed"] / self.speed if self.speed else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        self.served += 1
+        extensions = {"http_version": record.get("http_version", "HTTP/1.1").encode("ascii")}
+
+        fault = self.faults.pick()
+        if fault == "throttle":
+            return httpx.Response(
+                429,
+                headers={"Retry-After": str(self.faults.retry_after_secs)},
+                json={"code": 429, "msg": "Too Many Requests"},
+                request=request,
+                extensions=extensions,
+            )
+        if fault == "error":
+            return httpx.Response(503, json={"msg": "service unavailable"}, request=request, extensions=extensions)
+        if fault == "empty":
+            return httpx.Response(200, json=_empty_payload(record), request=request, extensions=extensions)
+        return httpx.Response(
+            record["status"],
+            headers=record["headers"],
+            stream=httpx.ByteStream(base64.b64decode(record["body"])),
+            request=request,
+            extensions=extensions,
+        )
+
+
+def _empty_payload(record: Dict[str, Any]) -> Any:
+    """保留外层结构、清空数据：Bitget 返回 code=00000 但 data 为空，Binance 返回空列表。"""
+    response = httpx.Response(record["status"], headers=record["headers"], content=base64.b64decode(record["body"]))
+    try:
+        payload = orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        return {}
+    if isinstance(payload, list):
+        return []
+    if isinstance(payload, dict) and "data" in payload:
+        return {**payload, "data": [] if isinstance(payload["data"], list) else None}
+    return {}
@@ -0,0 +1,106 @@
+"""抓取失败的合约逐个重试。
+
+全量周期里没拿到的合约（单个请求失败、返回为空）不必等下一轮：
+按合约放进重试队列，指数退避加抖动，到期后用 fetch_symbols 单独补抓，成功即发布。
+连续失败 max_attempts 次（通常是已下架）后放弃。
+"""
+import heapq
+import random
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class RetryQueue:
+    def __init__(self, *, base_secs: float, max_secs: float, max_attempts: int) -> None:
+        self.base_secs = max(0.1, float(base_secs))
+        self.max_secs = max(self.base_secs, float(max_secs))
+        self.max_attempts = max(1, int(max_attempts))
+        # 与调度器相同：堆里过期的条目惰性丢弃，_entries 记录每个合约当前有效的 (due_at, 失败次数, 首次失败时间)
+        self._heaps: Dict[str, List[Tuple[float, str]]] = {}
+        self._entries: Dict[str, Dict[str, Tuple[float, int, float]]] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次失败后的等待时间：一半固定，一半随机，避免同一批合约同时重试。"""
+        delay = min(self.max_secs, self.base_secs * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def failed(self, exchange: str, symbols: Iterable[str], now: Optional[float] = None) -> List[str]:
+        """记录失败并排队；返回超过最大次数、被放弃的合约。"""
+        now = time.time() if now is None else now
+        entries = self._entries.setdefault(exchange, {})
+        abandoned: List[str] = []
+        for symbol in symbols:
+            _, attempts, first_failed = entries.get(symbol, (0.0, 0, now))
+            attempts += 1
+            if attempts > self.max_attempts:
+                del entries[symbol]
+                abandoned.append(symbol)
+                self._count(exchange, "abandoned")
+                continue
+            due_at = now + self.backoff(attempts)
+            entries[symbol] = (due_at, attempts, first_failed)
+            heapq.heappush(self._heaps.setdefault(exchange, []), (due_at, symbol))
+            self._count(exchange, "failures")
+        return abandoned
+
+    def succeeded(self, exchange: str, symbols: Iterable[str]) -> None:
+        entries = self._entries.get(exchange)
+        if not entries:
+            return
+        for symbol in symbols:
+            if entries.pop(symbol, None) is not None:
+                self._count(exchange, "recovered")
+
+    def forget(self, exchange: str, symbols: Iterable[str]) -> None:
+        """不再由本 worker 负责的合约直接移出队列，不计入 recovered。"""
+        entries = self._entries.get(exchange)
+        if not entries:
+            return
+        for symbol in symbols:
+            entries.pop(symbol, None)
+
+    def pop_due(self, exchange: str, now: Optional[float] = None) -> List[str]:
+        """取出到期的合约；它们仍留在 _entries 里，直到成功或再次失败。"""
+        now = time.time() if now is None else now
+        heap = self._heaps.get(exchange) or []
+        entries = self._entries.get(exchange, {})
+        due: List[str] = []
+        while heap and heap[0][0] <= now:
+            due_at, symbol = heapq.heappop(heap)
+            entry = entries.get(symbol)
+            if entry is not None and entry[0] == due_at:
+                due.append(symbol)
+        if due:
+            self._count(exchange, "retries", len(due))
+        return due
+
+    def next_due(self, exchange: str, now: Optional[float] = None) -> Optional[float]:
+        """距下一个到期合约的秒数；队列为空时返回 None。"""
+        now = time.time() if now is None else now
+        heap = self._heaps.get(exchange) or []
+        entries = self._entries.get(exchange, {})
+        while heap and (entries.get(heap[0][1]) or (None,))[0] != heap[0][0]:
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        return max(0.0, heap[0][0] - now)
+
+    def depth(self, exchange: str) -> int:
+        return len(self._entries.get(exchange, {}))
+
+    def health(self, exchange: str) -> Dict[str, Any]:
+        now = time.time()
+        entries = self._entries.get(exchange, {})
+        attempts = [entry[1] for entry in entries.values()]
+        oldest = min((entry[2] for entry in entries.values()), default=None)
+        return {
+            "depth": len(entries),
+            "max_attempts_pending": max(attempts, default=0),
+            "oldest_failure_age_secs": round(now - oldest, 1) if oldest is not None else None,
+            **self._counters.get(exchange, {}),
+        }
+
+    def _count(self, exchange: str, key: str, amount: int = 1) -> None:
+        counters = self._counters.setdefault(exchange, {})
+        counters[key] = counters.get(key, 0) + amount
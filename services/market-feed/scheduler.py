@@ -0,0 +1,190 @@
+"""按结算时间调度的轮询计划。
+
+每个 (exchange, symbol) 一个下次抓取时间，放在按交易所划分的最小堆里：
+离结算越近抓得越勤（hot），远离结算的合约很少抓（cold）；结算刚过（settle_grace_secs 内）也按 hot 处理，尽快拿到新周期的费率。
+交易所没给结算时间（next_funding_time_ms 为 0）或结算已过超过 grace 的合约按 warm 处理，等拿到新的结算时间再分档。
+有持仓或费率差接近开仓阈值的合约（见 priority.py）不看结算时间，一律按 hot 刷新。
+另外每隔 full_refresh_secs 做一次全量抓取，用来发现新合约并兜底。
+"""
+import heapq
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from libs.models.funding import FundingSnapshot
+
+HOT = "hot"
+WARM = "warm"
+COLD = "cold"
+
+
+class SettlementScheduler:
+    def __init__(
+        self,
+        *,
+        hot_window_secs: float,
+        hot_interval_secs: float,
+        warm_window_secs: float,
+        warm_interval_secs: float,
+        cold_interval_secs: float,
+        full_refresh_secs: float,
+        settle_grace_secs: float = 300.0,
+    ) -> None:
+        self.hot_window = float(hot_window_secs)
+        self.hot_interval = max(1.0, float(hot_interval_secs))
+        self.warm_window = max(self.hot_window, float(warm_window_secs))
+        self.warm_interval = max(self.hot_interval, float(warm_interval_secs))
+        self.cold_interval = max(self.warm_interval, float(cold_interval_secs))
+        self.full_refresh_secs = max(self.hot_interval, float(full_refresh_secs))
+        self.settle_grace = max(0.0, float(settle_grace_secs))
+        # exchange -> 堆 [(due_at, symbol)]；_due 记录每个合约当前有效的 due_at，堆里过期的条目惰性丢弃
+        self._heaps: Dict[str, List[Tuple[float, str]]] = {}
+        self._due: Dict[str, Dict[str, float]] = {}
+        self._tiers: Dict[str, Dict[str, str]] = {}
+        # exchange -> {symbol: 原因}
+        self._priority: Dict[str, Dict[str, str]] = {}
+        # exchange -> 各档位累计刷新的合约数
+        self._refreshed: Dict[str, Dict[str, int]] = {}
+        self._last_full: Dict[str, float] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def tier(self, snapshot: FundingSnapshot, now: float) -> Tuple[str, float]:
+        """返回 (档位, 距下次抓取的秒数)。"""
+        if snapshot.next_funding_time_ms <= 0:
+            return WARM, self.warm_interval
+        countdown = snapshot.next_funding_time_ms / 1000 - now
+        if countdown < -self.settle_grace:
+            # 结算时间早已过去、交易所还没更新：不当 hot 反复抓
+            return WARM, self.warm_interval
+        if countdown <= self.hot_window:
+            return HOT, self.hot_interval
+        if countdown <= self.warm_window:
+            # 不要越过 hot 窗口的起点
+            return WARM, min(self.warm_interval, countdown - self.hot_window)
+        return COLD, min(self.cold_interval, countdown - self.warm_window)
+
+    def update(self, exchange: str, snapshots: Iterable[FundingSnapshot], now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        tiers = self._tiers.setdefault(exchange, {})
+        priority = self._priority.get(exchange, {})
+        for snapshot in snapshots:
+            if snapshot.symbol in priority:
+                tier, delay = HOT, self.hot_interval
+            else:
+                tier, delay = self.tier(snapshot, now)
+            tiers[snapshot.symbol] = tier
+            self._schedule(exchange, snapshot.symbol, now + max(1.0, delay))
+
+    def set_priority(self, exchange: str, symbols: Dict[str, str], now: Optional[float] = None) -> bool:
+        """替换该交易所的优先合约；新加入的合约若排得比 hot 间隔还晚，提前到 hot 间隔后。返回是否有合约被提前。"""
+        now = time.time() if now is None else now
+        previous = self._priority.get(exchange, {})
+        self._priority[exchange] = dict(symbols)
+        due_map = self._due.get(exchange, {})
+        tiers = self._tiers.setdefault(exchange, {})
+        moved = False
+        for symbol in symbols:
+            if symbol in previous:
+                continue
+            tiers[symbol] = HOT
+            due_at = due_map.get(symbol)
+            if due_at is None or due_at > now + self.hot_interval:
+                self._schedule(exchange, symbol, now + self.hot_interval)
+                moved = True
+        # 移出优先的合约在下一次拿到快照时按结算时间重新分档
+        return moved
+
+    def forget(self, exchange: str, symbols: Iterable[str]) -> None:
+        """不再由本 worker 负责的合约：撤掉计划，堆里的条目惰性丢弃。"""
+        due_map = self._due.get(exchange, {})
+        tiers = self._tiers.get(exchange, {})
+        for symbol in symbols:
+            due_map.pop(symbol, None)
+            tiers.pop(symbol, None)
+
+    def request_full_refresh(self, exchange: str) -> None:
+        self._last_full.pop(exchange, None)
+
+    def retry(self, exchange: str, symbols: Iterable[str], now: Optional[float] = None) -> None:
+        """本轮没拿到结果的合约，按 warm 间隔重新排队。"""
+        now = time.time() if now is None else now
+        for symbol in symbols:
+            self._schedule(exchange, symbol, now + self.warm_interval)
+
+    def pop_due(self, exchange: str, now: Optional[float] = None) -> List[str]:
+        now = time.time() if now is None else now
+        heap = self._heaps.get(exchange) or []
+        due_map = self._due.get(exchange, {})
+        tiers = self._tiers.get(exchange, {})
+        refreshed = self._refreshed.setdefault(exchange, {HOT: 0, WARM: 0, COLD: 0})
+        due: List[str] = []
+        while heap and heap[0][0] <= now:
+            due_at, symbol = heapq.heappop(heap)
+            if due_map.get(symbol) == due_at:
+                del due_map[symbol]
+                due.append(symbol)
+                refreshed[tiers.get(symbol, WARM)] += 1
+        return due
+
+    def full_refresh_due(self, exchange: str, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        return now - self._last_full.get(exchange, 0.0) >= self.full_refresh_secs
+
+    def mark_full_refresh(self, exchange: str, now: Optional[float] = None) -> None:
+        self._last_full[exchange] = time.time() if now is None else now
+        self._count(exchange, "full_refreshes")
+
+    def mark_targeted(self, exchange: str, symbols: int) -> None:
+        self._count(exchange, "targeted_refreshes")
+        self._count(exchange, "targeted_symbols", symbols)
+
+    def next_wakeup(self, exchange: str, now: Optional[float] = None) -> float:
+        """距下一件事（到期合约或全量刷新）的秒数。"""
+        now = time.time() if now is None else now
+        heap = self._heaps.get(exchange) or []
+        due_map = self._due.get(exchange, {})
+        # 先清掉堆顶的过期条目
+        while heap and due_map.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        wakeups = [self._last_full.get(exchange, 0.0) + self.full_refresh_secs]
+        if heap:
+            wakeups.append(heap[0][0])
+        return max(0.0, min(wakeups) - now)
+
+    def health(self, exchange: str) -> Dict[str, Any]:
+        now = time.time()
+        tiers = self._tiers.get(exchange, {})
+        counts = {HOT: 0, WARM: 0, COLD: 0}
+        for tier in tiers.values():
+            counts[tier] += 1
+        reasons: Dict[str, int] = {}
+        for reason in self._priority.get(exchange, {}).values():
+            reasons[reason] = reasons.get(reason, 0) + 1
+        intervals = {HOT: self.hot_interval, WARM: self.warm_interval, COLD: self.cold_interval}
+        refreshed = self._refreshed.get(exchange, {})
+        last_full = self._last_full.get(exchange)
+        return {
+            "symbols": len(tiers),
+            "tiers": counts,
+            "priority": reasons,
+            # 按当前档位人数估算的每分钟合约刷新次数，以及实际累计刷新次数
+            "budgets": {
+                tier: {
+                    "interval_secs": intervals[tier],
+                    "symbols": counts[tier],
+                    "planned_per_min": round(counts[tier] * 60 / intervals[tier], 1),
+                    "refreshed_total": refreshed.get(tier, 0),
+                }
+                for tier in (HOT, WARM, COLD)
+            },
+            "next_wakeup_secs": round(self.next_wakeup(exchange, now), 1),
+            "last_full_refresh_age_secs": round(now - last_full, 1) if last_full else None,
+            **self._counters.get(exchange, {}),
+        }
+
+    def _schedule(self, exchange: str, symbol: str, due_at: float) -> None:
+        self._due.setdefault(exchange, {})[symbol] = due_at
+        heapq.heappush(self._heaps.setdefault(exchange, []), (due_at, symbol))
+
+    def _count(self, exchange: str, key: str, amount: int = 1) -> None:
+        counters = self._counters.setdefault(exchange, {})
+        counters[key] = counters.get(key, 0) + amount
@@ -0,0 +1,239 @@
+"""多个 market-feed worker 按合约分片，经 Redis 租约协调。
+
+统一符号按稳定哈希落到固定数量的分区（所有 worker 的 partitions 必须一致），
+分区再按 rendezvous hashing 分给当前存活的 worker：worker 加入或退出时只有约 1/N 的分区换主。
+每个分区一个租约键（SET NX PX，值为 worker id），持有者定期续约；
+存活名单是一个按心跳时间排序的 ZSET，超过租约时长没心跳的 worker 视为已退出。
+
+不重复发布靠本地截止时间：续约/抢占请求发出前记下时间，本地认为租约在 ttl - margin 后失效，
+早于 Redis 端过期；主动交出分区时先停止发布再删除租约。不丢合约靠租约过期：
+worker 崩溃后最多 ttl 秒，其它 worker 就会接手它的分区。
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger("market_feed.sharding")
+
+# 仅当值仍是自己时续约 / 删除，返回每个键是否成功
+RENEW_SCRIPT = """
+local results = {}
+for i, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        redis.call('PEXPIRE', key, ARGV[2])
+        results[i] = 1
+    else
+        results[i] = 0
+    end
+end
+return results
+"""
+RELEASE_SCRIPT = """
+local released = 0
+for _, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        redis.call('DEL', key)
+        released = released + 1
+    end
+end
+return released
+"""
+
+
+def partition_of(symbol: str, partitions: int) -> int:
+    digest = hashlib.blake2b(symbol.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % partitions
+
+
+def rendezvous_owner(partition: int, workers: Iterable[str]) -> Optional[str]:
+    """分区的首选 worker：对每个 worker 算 hash(分区, worker)，取最大者。"""
+    best, best_score = None, -1
+    for worker in workers:
+        score = int.from_bytes(hashlib.blake2b(f"{partition}:{worker}".encode(), digest_size=8).digest(), "big")
+        if score > best_score:
+            best, best_score = worker, score
+    return best
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class ShardCoordinator:
+    def __init__(
+        self,
+        redis,
+        *,
+        worker_id: Optional[str] = None,
+        partitions: int = 64,
+        lease_ttl_secs: float = 10.0,
+        key_prefix: str = "market_feed:shards",
+        on_change: Optional[Callable[[Set[int], Set[int]], Awaitable[None]]] = None,
+    ) -> None:
+        self._redis = redis
+        self.worker_id = worker_id or default_worker_id()
+        self.partitions = max(1, int(partitions))
+        self.lease_ttl = max(1.0, float(lease_ttl_secs))
+        # 本地提前认为租约失效的余量，覆盖续约往返与时钟漂移
+        self.margin = self.lease_ttl / 5
+        self.renew_interval = self.lease_ttl / 4
+        self._prefix = key_prefix
+        self._on_change = on_change
+        # partition -> 本地截止时间（monotonic）
+        self._owned: Dict[int, float] = {}
+        self._partition_cache: Dict[str, int] = {}
+        self.workers: List[str] = []
+        self._counters: Dict[str, int] = {"gained": 0, "lost": 0, "released": 0, "rebalances": 0, "errors": 0}
+        self.last_error: Optional[str] = None
+
+    def partition(self, symbol: str) -> int:
+        partition = self._partition_cache.get(symbol)
+        if partition is None:
+            partition = self._partition_cache[symbol] = partition_of(symbol, self.partitions)
+        return partition
+
+    def owns(self, symbol: str) -> bool:
+        deadline = self._owned.get(self.partition(symbol))
+        return deadline is not None and time.monotonic() < deadline
+
+    def owned(self) -> Set[int]:
+        now = time.monotonic()
+        return {partition for partition, deadline in self._owned.items() if now < deadline}
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.rebalance()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # Redis 不可用时不续约，本地截止时间一到自然停止发布
+                self._counters["errors"] += 1
+                error = str(exc) or type(exc).__name__
+                if error != self.last_error:
+                    logger.warning("shard rebalance failed: %s", error)
+                self.last_error = error
+                await self._expire_local()
+            await asyncio.sleep(self.renew_interval * random.uniform(0.8, 1.0))
+
+    async def rebalance(self) -> None:
+        """心跳、续约、交出不再属于自己的分区、抢占应属于自己的空闲分区。"""
+        members = f"{self._prefix}:workers"
+        now = time.time()
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.zadd(members, {self.worker_id: now})
+        pipe.zremrangebyscore(members, "-inf", now - self.lease_ttl)
+        pipe.zrange(members, 0, -1)
+        self.workers = sorted((await pipe.execute())[2])
+        self._counters["rebalances"] += 1
+        self.last_error = None
+
+        await self._expire_local()
+        desired = {
+            partition
+            for partition in range(self.partitions)
+            if rendezvous_owner(partition, self.workers) == self.worker_id
+        }
+        lost: Set[int] = set()
+        gained: Set[int] = set()
+
+        release = sorted(set(self._owned) - desired)
+        if release:
+            # 先停止发布，再删除租约让首选 worker 接手
+            for partition in release:
+                del self._owned[partition]
+            await self._notify(set(), set(release))
+            await self._redis.eval(RELEASE_SCRIPT, len(release), *map(self._lease_key, release), self.worker_id)
+            self._counters["released"] += len(release)
+
+        keep = sorted(self._owned)
+        if keep:
+            started = time.monotonic()
+            results = await self._redis.eval(
+                RENEW_SCRIPT, len(keep), *map(self._lease_key, keep), self.worker_id, int(self.lease_ttl * 1000)
+            )
+            for partition, renewed in zip(keep, results):
+                if int(renewed):
+                    self._owned[partition] = started + self.lease_ttl - self.margin
+                else:
+                    del self._owned[partition]
+                    lost.add(partition)
+
+        acquire = sorted(desired - set(self._owned))
+        if acquire:
+            started = time.monotonic()
+            pipe = self._redis.pipeline(transaction=False)
+            for partition in acquire:
+                pipe.set(self._lease_key(partition), self.worker_id, nx=True, px=int(self.lease_ttl * 1000))
+            for partition, acquired in zip(acquire, await pipe.execute()):
+                if acquired:
+                    self._owned[partition] = started + self.lease_ttl - self.margin
+                    gained.add(partition)
+
+        self._counters["gained"] += len(gained)
+        self._counters["lost"] += len(lost)
+        await self._notify(gained, lost)
+        if gained or lost or release:
+            logger.info(
+                "worker %s owns %d/%d partitions (+%d, -%d released, -%d lost; %d workers)",
+                self.worker_id,
+                len(self._owned),
+                self.partitions,
+                len(gained),
+                len(release),
+                len(lost),
+                len(self.workers),
+            )
+
+    async def release_all(self) -> None:
+        """正常退出时交出全部分区并退出存活名单，其它 worker 下一轮即可接手。"""
+        owned = sorted(self._owned)
+        self._owned = {}
+        if owned:
+            await self._notify(set(), set(owned))
+        try:
+            if owned:
+                await self._redis.eval(RELEASE_SCRIPT, len(owned), *map(self._lease_key, owned), self.worker_id)
+            await self._redis.zrem(f"{self._prefix}:workers", self.worker_id)
+        except Exception as exc:
+            logger.warning("release shard leases failed (they expire in %ss): %s", self.lease_ttl, exc)
+
+    def health(self) -> Dict[str, Any]:
+        owned = self.owned()
+        return {
+            "worker_id": self.worker_id,
+            "workers": list(self.workers),
+            "partitions": self.partitions,
+            "owned": len(owned),
+            "owned_partitions": sorted(owned),
+            "lease_ttl_secs": self.lease_ttl,
+            "last_error": self.last_error,
+            **self._counters,
+        }
+
+    async def _expire_local(self) -> None:
+        now = time.monotonic()
+        expired = {partition for partition, deadline in self._owned.items() if now >= deadline}
+        if not expired:
+            return
+        for partition in expired:
+            del self._owned[partition]
+        self._counters["lost"] += len(expired)
+        logger.warning("worker %s leases expired locally for %d partitions", self.worker_id, len(expired))
+        await self._notify(set(), expired)
+
+    async def _notify(self, gained: Set[int], lost: Set[int]) -> None:
+        if self._on_change is None or not (gained or lost):
+            return
+        try:
+            await self._on_change(gained, lost)
+        except Exception as exc:
+            logger.exception("shard change handler failed: %s", exc)
+
+    def _lease_key(self, partition: int) -> str:
+        return f"{self._prefix}:lease:{partition}"
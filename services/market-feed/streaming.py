@@ -0,0 +1,247 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+import websockets
+
+from libs.models.funding import FundingSnapshot
+
+logger = logging.getLogger("market_feed.stream")
+
+BINANCE_STREAM_URL = "wss://fstream.binance.com/ws/!markPrice@arr"
+BITGET_STREAM_URL = "wss://ws.bitget.com/v2/ws/public"
+
+
+def _now_ms() -> int:
+    return int(datetime.now(tz=timezone.utc).timestamp() * 1000)
+
+
+def _to_float(value: Any) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class StreamSource:
+    """单个交易所的 WebSocket 订阅：负责订阅、心跳和消息解析。"""
+
+    name = ""
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+
+    async def subscribe(self, ws, symbols: Iterable[str]) -> None:
+        return None
+
+    async def heartbeat(self, ws) -> None:
+        """默认依赖 websockets 自带的 ping/pong。"""
+        await asyncio.Future()
+
+    def parse(self, raw: str) -> List[FundingSnapshot]:
+        raise NotImplementedError
+
+
+class BinanceMarkPriceSource(StreamSource):
+    """订阅 !markPrice@arr，一条消息里包含全部合约的标记价与资金费率。"""
+
+    name = "binance"
+
+    def parse(self, raw: str) -> List[FundingSnapshot]:
+        message = json.loads(raw)
+        items = message if isinstance(message, list) else [message]
+        now_ms = _now_ms()
+        snapshots: List[FundingSnapshot] = []
+        for item in items:
+            if not isinstance(item, dict) or item.get("e") != "markPriceUpdate":
+                continue
+            symbol = item.get("s")
+            rate = _to_float(item.get("r"))
+            next_time = item.get("T")
+            if not symbol or rate is None or not next_time:
+                continue
+            snapshots.append(
+                FundingSnapshot(
+                    exchange="binance",
+                    symbol=symbol,
+                    funding_rate_raw=rate,
+                    settle_interval_hours=8,
+                    next_funding_time_ms=int(next_time),
+                    instrument=symbol,
+                    mark_price=_to_float(item.get("p")),
+                    index_price=_to_float(item.get("i")),
+                    captured_at_ms=now_ms,
+                )
+            )
+        return snapshots
+
+
+class BitgetTickerSource(StreamSource):
+    """订阅 Bitget v2 公共 ticker 频道，需要按合约逐个订阅并发送文本 ping。"""
+
+    name = "bitget"
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        inst_type: str,
+        lookup: Callable[[str], Optional[FundingSnapshot]],
+        batch_size: int = 50,
+        ping_interval: float = 25.0,
+    ) -> None:
+        super().__init__(url)
+        self._inst_type = inst_type
+        self._lookup = lookup
+        self._batch_size = max(1, batch_size)
+        self._ping_interval = ping_interval
+
+    async def subscribe(self, ws, symbols: Iterable[str]) -> None:
+        symbols = list(symbols)
+        if not symbols:
+            # REST 补齐失败时没有合约可订阅，抛出让连接按退避重试
+            raise RuntimeError("no bitget symbols to subscribe")
+        args = [
+            {"instType": self._inst_type, "channel": "ticker", "instId": symbol}
+            for symbol in symbols
+        ]
+        for start in range(0, len(args), self._batch_size):
+            await ws.send(json.dumps({"op": "subscribe", "args": args[start : start + self._batch_size]}))
+        logger.info("bitget stream subscribed %d tickers", len(args))
+
+    async def heartbeat(self, ws) -> None:
+        while True:
+            await asyncio.sleep(self._ping_interval)
+            await ws.send("ping")
+
+    def parse(self, raw: str) -> List[FundingSnapshot]:
+        if raw == "pong":
+            return []
+        message = json.loads(raw)
+        if not isinstance(message, dict):
+            return []
+        if message.get("event") == "error":
+            logger.warning("bitget stream error: %s", message)
+            return []
+        data = message.get("data")
+        if not isinstance(data, list):
+            return []
+        now_ms = _now_ms()
+        snapshots: List[FundingSnapshot] = []
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            symbol = item.get("instId") or item.get("symbol")
+            rate = _to_float(item.get("fundingRate"))
+            next_time = item.get("nextFundingTime")
+            if not symbol or rate is None or not next_time:
+                continue
+            # ticker 不带结算周期，沿用 REST 快照里的值
+            previous = self._lookup(symbol)
+            interval = previous.settle_interval_hours if previous else 8
+            snapshots.append(
+                FundingSnapshot(
+                    exchange="bitget",
+                    symbol=symbol,
+                    funding_rate_raw=rate,
+                    settle_interval_hours=interval,
+                    next_funding_time_ms=int(float(next_time)),
+                    instrument=symbol,
+                    mark_price=_to_float(item.get("markPrice")),
+                    index_price=_to_float(item.get("indexPrice")),
+                    captured_at_ms=now_ms,
+                )
+            )
+        return snapshots
+
+
+class StreamIngestor:
+    """维护一条 WebSocket 连接：断线按指数退避重连，每次（重新）连上先调用 on_resync 补齐缺口。"""
+
+    def __init__(
+        self,
+        source: StreamSource,
+        *,
+        on_snapshots: Callable[[List[FundingSnapshot]], None],
+        on_resync: Callable[[], Awaitable[Iterable[str]]],
+        backoff_initial: float = 1.0,
+        backoff_max: float = 60.0,
+    ) -> None:
+        self._source = source
+        self._on_snapshots = on_snapshots
+        self._on_resync = on_resync
+        self._backoff_initial = backoff_initial
+        self._backoff_max = backoff_max
+        self.connected = False
+        self.reconnects = 0
+        self.messages = 0
+        self.updates = 0
+        self.last_message_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return self._source.name
+
+    def health(self) -> Dict[str, Any]:
+        age = None
+        if self.last_message_at is not None:
+            age = round(time.time() - self.last_message_at, 1)
+        return {
+            "connected": self.connected,
+            "reconnects": self.reconnects,
+            "messages": self.messages,
+            "updates": self.updates,
+            "last_message_age_secs": age,
+            "last_error": self.last_error,
+        }
+
+    async def run(self) -> None:
+        backoff = self._backoff_initial
+        while True:
+            try:
+                async with websockets.connect(self._source.url, max_size=None) as ws:
+                    self.connected = True
+                    logger.info("%s stream connected: %s", self.name, self._source.url)
+                    symbols = await self._on_resync()
+                    await self._source.subscribe(ws, symbols)
+                    heartbeat = asyncio.create_task(self._source.heartbeat(ws))
+                    try:
+                        async for raw in ws:
+                            self._handle(raw)
+                            backoff = self._backoff_initial
+                    finally:
+                        heartbeat.cancel()
+                self.last_error = "closed by server"
+            except asyncio.CancelledError:
+                self.connected = False
+                raise
+            except Exception as exc:
+                self.last_error = str(exc) or type(exc).__name__
+                logger.warning("%s stream disconnected: %s", self.name, exc)
+            self.connected = False
+            self.reconnects += 1
+            delay = backoff * (0.5 + random.random() / 2)
+            logger.info("%s stream reconnecting in %.1fs", self.name, delay)
+            await asyncio.sleep(delay)
+            backoff = min(self._backoff_max, backoff * 2)
+
+    def _handle(self, raw) -> None:
+        self.messages += 1
+        self.last_message_at = time.time()
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        try:
+            snapshots = self._source.parse(raw)
+        except Exception as exc:
+            logger.warning("%s stream message parse failed: %s", self.name, exc)
+            return
+        if snapshots:
+            self.updates += len(snapshots)
+            self._on_snapshots(snapshots)
@@ -0,0 +1,177 @@
+"""行情抓取的 HTTP 传输层：按交易所的连接池（HTTP/2、keepalive）、限速/熔断接入点与快速 JSON 解码。"""
+import importlib.util
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+import httpx
+import orjson
+
+from breaker import CircuitBreaker, CircuitOpenError
+from ratelimit import RateLimiter
+from replay import Recorder, RecordingTransport
+
+logger = logging.getLogger("market_feed")
+
+# keepalive 要比轮询间隔长，否则每个周期都要重新建连接（含 TLS 握手）；httpx 默认只有 5 秒
+DEFAULT_KEEPALIVE_EXPIRY = 90.0
+CONNECT_TIMEOUT = 5.0
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def decode_json(resp: httpx.Response) -> Any:
+    """orjson 直接解析原始字节，比 resp.json() 的标准库路径快数倍。"""
+    return orjson.loads(resp.content)
+
+
+def latency_percentiles(samples: Sequence[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"p50_ms": None, "p90_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {"p50_ms": pick(0.5), "p90_ms": pick(0.9), "p99_ms": pick(0.99), "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+class CycleStats:
+    """单次抓取周期的请求计数、单请求延迟与耗时。"""
+
+    def __init__(self, exchange: str, mode: str) -> None:
+        self.exchange = exchange
+        self.mode = mode
+        self.requests = 0
+        self.fallback_symbols = 0
+        self.latencies: List[float] = []
+        self.started = time.perf_counter()
+        # 进程级 CPU 时间；多个管道并发时会包含其它管道的开销，仅作趋势参考
+        self.cpu_started = time.process_time()
+
+    @property
+    def wall_secs(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def cpu_secs(self) -> float:
+        return time.process_time() - self.cpu_started
+
+    def latency_percentiles(self) -> Dict[str, Optional[float]]:
+        return latency_percentiles(self.latencies)
+
+
+class ExchangeHttp:
+    """单个交易所的 HTTP 连接池与按 endpoint 的熔断器；限速交给整个 feed 共享的 RateLimiter。"""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        timeout: float,
+        max_connections: int,
+        limiter: RateLimiter,
+        http2: bool = False,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+        breaker_factory: Optional[Callable[[str], CircuitBreaker]] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        recorder: Optional[Recorder] = None,
+    ) -> None:
+        self.name = name
+        self._timeout = timeout
+        self._max_connections = max(1, int(max_connections))
+        self._http2 = http2 and http2_available()
+        if http2 and not self._http2:
+            logger.warning("%s: h2 not installed, falling back to HTTP/1.1 (pip install 'httpx[http2]')", name)
+        self._keepalive_expiry = keepalive_expiry
+        self._limiter = limiter
+        self._breaker_factory = breaker_factory or CircuitBreaker
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._transport = transport
+        self._recorder = recorder
+        self._client: Optional[httpx.AsyncClient] = None
+        self._requests = 0
+        self._http_versions: Dict[str, int] = {}
+
+    async def start(self) -> None:
+        if self._client is None:
+            limits = httpx.Limits(
+                max_connections=self._max_connections,
+                max_keepalive_connections=self._max_connections,
+                keepalive_expiry=self._keepalive_expiry,
+            )
+            transport = self._transport
+            if self._recorder is not None:
+                # 录制时仍用按交易所调好的连接池，只在外面包一层
+                inner = transport or httpx.AsyncHTTPTransport(http2=self._http2, limits=limits)
+                transport = RecordingTransport(inner, self._recorder)
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self._timeout, connect=min(self._timeout, CONNECT_TIMEOUT)),
+                limits=limits,
+                http2=self._http2,
+                transport=transport,
+            )
+
+    async def close(self) -> None:
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(
+        self,
+        url: str,
+        *,
+        cycle: CycleStats,
+        params: Optional[dict] = None,
+        headers: Optional[dict] = None,
+        weight: Optional[float] = None,
+    ) -> httpx.Response:
+        """该交易所的所有请求都走这里，统一限速并统计每个周期的请求数。"""
+        assert self._client is not None
+        parts = urlsplit(url)
+        breaker = self.breaker(f"{parts.hostname}{parts.path}")
+        # 排队前先看一眼，熔断中的 endpoint 不占用限速配额
+        if breaker.is_open():
+            breaker.skipped += 1
+            raise CircuitOpenError(f"circuit open for {breaker.name}")
+        host = self._limiter.for_url(url)
+        async with host.slot(parts.path, weight):
+            if not breaker.allow():
+                raise CircuitOpenError(f"circuit open for {breaker.name}")
+            cycle.requests += 1
+            self._requests += 1
+            started = time.perf_counter()
+            try:
+                resp = await self._client.get(url, params=params, headers=headers)
+            except httpx.TransportError:
+                breaker.record(False)
+                raise
+            cycle.latencies.append(time.perf_counter() - started)
+            self._http_versions[resp.http_version] = self._http_versions.get(resp.http_version, 0) + 1
+            await host.observe(parts.path, resp)
+        # 429/418 交给限速器处理；5xx 计为 endpoint 故障；其它 4xx 多是参数/合约问题，endpoint 本身可用
+        if resp.status_code not in (429, 418):
+            breaker.record(resp.status_code < 500)
+        # 304 只会出现在带条件头（If-None-Match 等）的请求里，交给调用方沿用缓存
+        if resp.status_code != 304:
+            resp.raise_for_status()
+        return resp
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = self._breakers[endpoint] = self._breaker_factory(endpoint)
+        return breaker
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "max_connections": self._max_connections,
+            "http2": self._http2,
+            "keepalive_expiry_secs": self._keepalive_expiry,
+            "http_versions": dict(self._http_versions),
+            "requests_total": self._requests,
+            "breakers": {name: breaker.health() for name, breaker in self._breakers.items()},
+        }
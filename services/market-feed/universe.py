@@ -0,0 +1,71 @@
+"""跨交易所可配对的合约集合。
+
+策略引擎只能对至少两家交易所都上市的合约开仓，其它合约的资金费率抓了也用不上。
+统一符号去掉倍数前缀（Binance 的 1000PEPEUSDT 与 Bitget 的 PEPEUSDT 都记作 PEPEUSDT），
+按合约缓存里各交易所的上市列表求交集；合约列表不变时直接复用上次的结果。
+"""
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from libs.models.symbols import canonical_symbol
+from contracts import ContractCache
+
+
+def parse_symbol_list(value: Any) -> Set[str]:
+    if not value:
+        return set()
+    items = value if isinstance(value, (list, tuple, set)) else str(value).split(",")
+    return {canonical_symbol(str(item).strip().upper()) for item in items if str(item).strip()}
+
+
+class SymbolUniverse:
+    """至少两家交易所都上市的统一符号，加上只用于监控的 overrides。"""
+
+    def __init__(
+        self,
+        contracts: ContractCache,
+        normalizers: Dict[str, Callable[[str], str]],
+        *,
+        overrides: Iterable[str] = (),
+    ) -> None:
+        self._contracts = contracts
+        # exchange -> 合约名到统一符号的转换
+        self._normalizers = dict(normalizers)
+        self.overrides = set(overrides)
+        self._version: Optional[Tuple[int, ...]] = None
+        self._tradable: Optional[Set[str]] = None
+        self._listed: Dict[str, int] = {}
+
+    def tradable(self) -> Optional[Set[str]]:
+        """返回可配对的统一符号；只启用一家交易所或有交易所还没有上市列表时返回 None（不做裁剪）。"""
+        version = tuple(self._contracts.version(exchange) for exchange in self._normalizers)
+        if version != self._version:
+            self._version = version
+            self._tradable = self._compute()
+        return self._tradable
+
+    def allows(self, symbol: str) -> bool:
+        tradable = self.tradable()
+        return tradable is None or symbol in tradable
+
+    def _compute(self) -> Optional[Set[str]]:
+        if len(self._normalizers) < 2:
+            return None
+        venues: Dict[str, int] = {}
+        self._listed = {}
+        for exchange, normalize in self._normalizers.items():
+            listed = {normalize(symbol) for symbol in self._contracts.symbols(exchange)}
+            if not listed:
+                return None
+            self._listed[exchange] = len(listed)
+            for symbol in listed:
+                venues[symbol] = venues.get(symbol, 0) + 1
+        return {symbol for symbol, count in venues.items() if count >= 2} | self.overrides
+
+    def health(self) -> Dict[str, Any]:
+        tradable = self.tradable()
+        return {
+            "active": tradable is not None,
+            "tradable": len(tradable) if tradable is not None else None,
+            "listed": dict(self._listed),
+            "overrides": sorted(self.overrides),
+        }
@@ -13,10 +13,11 @@ ROOT_DIR = Path(__file__).resolve().parents[2]
 if str(ROOT_DIR) not in sys.path:
     sys.path.append(str(ROOT_DIR))
 
-from libs.bus import ConfigSubscriber
+from libs.bus import ConfigSubscriber, get_latest
+from libs.bus import fetch_latest_prices as fetch_latest_price_ticks
 from libs.config import get_settings
 from libs.db.session import AsyncSessionLocal
-from libs.models import FundingSnapshot
+from libs.models import FundingSnapshot, PriceTick, canonical_symbol
 from libs.runtime_config import apply_update, get_runtime_config, load_initial
 from services.risk_daemon import repo, schemas
 
@@ -32,30 +33,28 @@ config_task: Optional[asyncio.Task] = None
 
 CHECK_INTERVAL_SECONDS = 10.0
 FUNDING_STREAM = "funding_snapshots"
+# 行情服务单独高频发布的持仓合约标记价；过旧时回退到资金费率快照里的价格
+PRICE_STREAM = getattr(settings, "price_stream_key", "price_ticks")
+PRICE_MAX_AGE_SECONDS = float(getattr(settings, "price_max_age_secs", 30.0))
 
 
 async def fetch_latest_snapshots(pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], FundingSnapshot]:
-    """Collect the most recent snapshots needed in a single Redis round trip."""
+    """Look the pairs up in the bus latest-value index in a single Redis round trip."""
     if not redis_client:
         return {}
+    return await get_latest(redis_client, pairs, stream_key=FUNDING_STREAM)
 
-    # deduplicate queries up front so we know when to stop scanning the stream
-    pending = set(pairs)
-    if not pending:
-        return {}
 
-    snapshots: Dict[Tuple[str, str], FundingSnapshot] = {}
-    entries = await redis_client.xrevrange(FUNDING_STREAM, "+", "-", count=500)
-    for _, fields in entries:
-        key = (fields.get("exchange"), fields.get("symbol"))
-        if key in pending and key not in snapshots:
-            try:
-                snapshots[key] = FundingSnapshot.from_stream(fields)
-            except Exception as exc:  # pragma: no cover
-                logger.warning("parse snapshot failed %s/%s: %s", key[0], key[1], exc)
-        if len(snapshots) == len(pending):
-            break
-    return snapshots
+async def fetch_latest_prices(pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], PriceTick]:
+    if not redis_client:
+        return {}
+    try:
+        return await fetch_latest_price_ticks(
+            redis_client, pairs, stream_key=PRICE_STREAM, max_age_secs=PRICE_MAX_AGE_SECONDS
+        )
+    except Exception as exc:
+        logger.warning("read price ticks failed, fall back to funding snapshots: %s", exc)
+        return {}
 
 
 def evaluate_group(
@@ -63,6 +62,7 @@ def evaluate_group(
     now: datetime,
     cfg,
     snapshots: Dict[Tuple[str, str], FundingSnapshot],
+    prices: Optional[Dict[Tuple[str, str], PriceTick]] = None,
 ) -> Optional[Tuple[schemas.CloseDecision, Dict[str, float]]]:
     thresholds = cfg.thresholds
 
@@ -74,13 +74,18 @@ def evaluate_group(
     if not long_leg or not short_leg:
         return None
 
-    long_snapshot = snapshots.get((long_leg.exchange, group.symbol))
-    short_snapshot = snapshots.get((short_leg.exchange, group.symbol))
+    # 行情按统一符号发布；迁移前写入的持仓可能还是交易所合约名（如 1000PEPEUSDT）
+    symbol = canonical_symbol(group.symbol)
+    long_snapshot = snapshots.get((long_leg.exchange, symbol))
+    short_snapshot = snapshots.get((short_leg.exchange, symbol))
     if not long_snapshot or not short_snapshot:
         return None
 
-    long_mark = long_snapshot.mark_price or long_snapshot.index_price
-    short_mark = short_snapshot.mark_price or short_snapshot.index_price
+    prices = prices or {}
+    long_tick = prices.get((long_leg.exchange, symbol))
+    short_tick = prices.get((short_leg.exchange, symbol))
+    long_mark = (long_tick.price if long_tick else None) or long_snapshot.mark_price or long_snapshot.index_price
+    short_mark = (short_tick.price if short_tick else None) or short_snapshot.mark_price or short_snapshot.index_price
     if long_mark is None or short_mark is None:
         return None
 
@@ -151,15 +156,16 @@ async def risk_loop():
                 continue
 
             pairs = {
-                (leg.exchange, group.symbol)
+                (leg.exchange, canonical_symbol(group.symbol))
                 for group in groups
                 for leg in getattr(group, "legs", [])
                 if leg.exchange and group.symbol
             }
             snapshots = await fetch_latest_snapshots(pairs)
+            prices = await fetch_latest_prices(pairs)
 
             for group in groups:
-                result = evaluate_group(group, now, cfg, snapshots)
+                result = evaluate_group(group, now, cfg, snapshots, prices)
                 if not result:
                     continue
                 decision, close_prices = result
@@ -184,7 +190,8 @@ async def _config_listener():
 async def on_startup():
     global redis_client, config_subscriber, config_task
     await load_initial()
-    redis_client = Redis.from_url(settings.redis_url, decode_responses=True)
+    # bytes 模式读取，兼容 compact 编码
+    redis_client = Redis.from_url(settings.redis_url)
     config_task = asyncio.create_task(_config_listener())
     asyncio.create_task(risk_loop())
 
@@ -40,7 +40,11 @@ app.add_middleware(
 )
 
 settings = get_settings()
-stats_service = StatsService(settings.redis_url)
+stats_service = StatsService(
+    settings.redis_url,
+    price_stream=getattr(settings, "price_stream_key", "price_ticks"),
+    price_max_age_secs=float(getattr(settings, "price_max_age_secs", 30.0)),
+)
 
 # 给 snapshot 调度任务做个全局引用
 config_task: Optional[asyncio.Task] = None
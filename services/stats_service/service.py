@@ -18,8 +18,9 @@ if str(ROOT_DIR) not in sys.path:
     sys.path.append(str(ROOT_DIR))
 
 from libs.db.models import PositionEvent, PositionGroup, StatsSnapshot
+from libs.bus import fetch_latest_prices, get_latest
 from libs.db.session import AsyncSessionLocal
-from libs.models import FundingSnapshot
+from libs.models import FundingSnapshot, PriceTick, canonical_symbol
 from services.stats_service.schemas import (
     DynamicStats,
     PositionGroupView,
@@ -32,10 +33,15 @@ logger = logging.getLogger(__name__)
 
 
 class StatsService:
-    def __init__(self, redis_url: str):
+    def __init__(self, redis_url: str, price_stream: str = "price_ticks", price_max_age_secs: float = 30.0):
         self._redis = Redis.from_url(redis_url, decode_responses=True)
+        # 资金费率 stream 可能是 compact 二进制编码，单独用 bytes 模式的连接读取
+        self._stream_redis = Redis.from_url(redis_url)
         self._dynamic_cache_key = "stats:dynamic"
         self._funding_stream = "funding_snapshots"
+        # 持仓收益优先用行情服务高频发布的标记价，过旧时回退到资金费率快照里的价格
+        self._price_stream = price_stream
+        self._price_max_age_secs = price_max_age_secs
 
         self._telegram_token = os.getenv("TELEGRAM_BOT_TOKEN")
         self._telegram_chat_id = os.getenv("TELEGRAM_CHAT_ID")
@@ -44,6 +50,7 @@ class StatsService:
 
     async def close(self) -> None:
         await self._redis.close()
+        await self._stream_redis.close()
 
     async def get_dynamic_stats(self) -> DynamicStats:
         cached = await self._safe_redis_get(self._dynamic_cache_key)
@@ -282,11 +289,16 @@ class StatsService:
         long_leg = next((leg for leg in group.legs if leg.side.upper() == "LONG"), None)
         short_leg = next((leg for leg in group.legs if leg.side.upper() == "SHORT"), None)
 
-        long_snapshot = await self._get_latest_snapshot(group.long_exchange, group.symbol)
-        short_snapshot = await self._get_latest_snapshot(group.short_exchange, group.symbol)
+        # 行情按统一符号发布；迁移前写入的持仓可能还是交易所合约名
+        symbol = canonical_symbol(group.symbol)
+        pairs = [(group.long_exchange, symbol), (group.short_exchange, symbol)]
+        snapshots = await self._get_latest_snapshots(pairs)
+        long_snapshot = snapshots.get(pairs[0])
+        short_snapshot = snapshots.get(pairs[1])
+        prices = await self._get_latest_prices(pairs)
 
-        long_return = _calc_leg_return(long_leg, long_snapshot, "LONG")
-        short_return = _calc_leg_return(short_leg, short_snapshot, "SHORT")
+        long_return = _calc_leg_return(long_leg, long_snapshot, "LONG", prices.get(pairs[0]))
+        short_return = _calc_leg_return(short_leg, short_snapshot, "SHORT", prices.get(pairs[1]))
         total_return = long_return + short_return
 
         if long_snapshot and short_snapshot:
@@ -332,17 +344,25 @@ class StatsService:
             legs=legs,
         )
 
-    async def _get_latest_snapshot(self, exchange: str, symbol: str) -> Optional[FundingSnapshot]:
-        entries = await self._safe_xrevrange(self._funding_stream, "+", "-", count=200)
-        if not entries:
-            return None
-        for _, fields in entries:
-            if fields.get("exchange") == exchange and fields.get("symbol") == symbol:
-                try:
-                    return FundingSnapshot.from_stream(fields)
-                except Exception:
-                    continue
-        return None
+    async def _get_latest_snapshots(self, pairs) -> Dict[tuple, FundingSnapshot]:
+        if self._stream_redis is None:
+            return {}
+        try:
+            return await get_latest(self._stream_redis, pairs, stream_key=self._funding_stream)
+        except RedisError as exc:
+            logger.warning("Redis 读取最新资金费率失败: %s", exc)
+            return {}
+
+    async def _get_latest_prices(self, pairs) -> Dict[tuple, PriceTick]:
+        if self._stream_redis is None:
+            return {}
+        try:
+            return await fetch_latest_prices(
+                self._stream_redis, pairs, stream_key=self._price_stream, max_age_secs=self._price_max_age_secs
+            )
+        except RedisError as exc:
+            logger.warning("Redis 读取价格失败: %s", exc)
+            return {}
 
     async def _safe_redis_get(self, key: str) -> str | None:
         if self._redis is None:
@@ -361,15 +381,6 @@ class StatsService:
         except RedisError as exc:
             logger.warning("Redis SET 失败: %s", exc)
 
-    async def _safe_xrevrange(self, stream: str, start: str, end: str, **kwargs) -> list[tuple[str, dict[str, str]]] | None:
-        if self._redis is None:
-            return None
-        try:
-            return await self._redis.xrevrange(stream, start, end, **kwargs)
-        except RedisError as exc:
-            logger.warning("Redis XREVRANGE 失败: %s", exc)
-            return None
-
 
 def _to_float(value: Optional[Decimal | float | int]) -> float:
     if value is None:
@@ -379,14 +390,16 @@ def _to_float(value: Optional[Decimal | float | int]) -> float:
     return float(value)
 
 
-def _calc_leg_return(leg, snapshot: Optional[FundingSnapshot], side: str) -> float:
+def _calc_leg_return(
+    leg, snapshot: Optional[FundingSnapshot], side: str, tick: Optional[PriceTick] = None
+) -> float:
     if not leg:
         return 0.0
     entry = leg.entry_price or 0.0
     if entry <= 0:
         return 0.0
-    price = None
-    if snapshot:
+    price = tick.price if tick else None
+    if price is None and snapshot:
         price = snapshot.mark_price or snapshot.index_price
     if price is None:
         return 0.0
@@ -1,10 +1,12 @@
 import asyncio
 import contextlib
 import logging
+import socket
 import sys
+import time
 from collections import defaultdict
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from fastapi import FastAPI
 from redis.asyncio import Redis
@@ -13,7 +15,15 @@ ROOT_DIR = Path(__file__).resolve().parents[2]
 if str(ROOT_DIR) not in sys.path:
     sys.path.append(str(ROOT_DIR))
 
-from libs.bus import ConfigSubscriber, OpportunityPublisher
+from libs.bus import (
+    ConfigSubscriber,
+    OpportunityPublisher,
+    StreamRetention,
+    decode_funding_entry,
+    get_latest,
+    load_latest,
+    stream_stats,
+)
 from libs.config import get_settings
 from libs.models import FundingSnapshot, Opportunity
 from libs.runtime_config import apply_update, get_runtime_config, load_initial
@@ -27,9 +37,63 @@ redis_client: Optional[Redis] = None
 config_subscriber: Optional[ConfigSubscriber] = None
 config_task: Optional[asyncio.Task] = None
 opportunity_publisher: Optional[OpportunityPublisher] = None
-last_id = "0-0"
+consumer_task: Optional[asyncio.Task] = None
+
+FUNDING_STREAM = getattr(settings, "funding_stream_key", "funding_snapshots")
+GROUP_NAME = getattr(settings, "strategy_consumer_group", "strategy_engine")
+# 稳定的名字，重启后能接着处理自己名下未确认的消息
+CONSUMER_NAME = getattr(settings, "strategy_consumer_name", None) or f"strategy-{socket.gethostname()}"
+CLAIM_IDLE_MS = int(float(getattr(settings, "strategy_claim_idle_secs", 30.0)) * 1000)
+READ_COUNT = max(1, int(getattr(settings, "strategy_read_count", 100)))
+STALE_CONSUMER_MS = 3600 * 1000
 
 latest_rates: Dict[str, Dict[str, FundingSnapshot]] = defaultdict(dict)
+# 状态来自最新值索引（预热或补齐对手方）、还没被评估过的 (exchange, symbol)
+index_loaded: Set[Tuple[str, str]] = set()
+consumer_stats: Dict[str, Any] = {
+    "warm_loaded": 0,
+    "processed": 0,
+    "acked": 0,
+    "claimed": 0,
+    "consumers_removed": 0,
+    "skipped": 0,
+    "stale": 0,
+    "last_id": None,
+    "last_error": None,
+}
+
+
+def _update_rate(snapshot: FundingSnapshot) -> bool:
+    """只接受不比当前旧的值：接手的旧消息不会覆盖更新的状态。返回是否已是最新值。"""
+    current = latest_rates[snapshot.exchange].get(snapshot.symbol)
+    if current is not None and current.captured_at_ms > snapshot.captured_at_ms:
+        return False
+    latest_rates[snapshot.exchange][snapshot.symbol] = snapshot
+    return True
+
+
+def _load_indexed(snapshot: FundingSnapshot) -> bool:
+    """从最新值索引读到的值：更新状态，但记为未评估。"""
+    if not _update_rate(snapshot):
+        return False
+    index_loaded.add((snapshot.exchange, snapshot.symbol))
+    return True
+
+
+def _accept_entry(snapshot: FundingSnapshot) -> Optional[FundingSnapshot]:
+    """stream 消息的快照；返回需要评估的快照，真正过期的返回 None。
+
+    索引里被压掉的快照也会刷新 captured_at，消费端落后时索引可能比正在处理的消息还新；
+    这时状态不回退，但索引值还没评估过，改为评估它，避免这次变化被当成旧消息丢掉。
+    """
+    key = (snapshot.exchange, snapshot.symbol)
+    if _update_rate(snapshot):
+        index_loaded.discard(key)
+        return snapshot
+    if key in index_loaded:
+        index_loaded.discard(key)
+        return latest_rates[snapshot.exchange][snapshot.symbol]
+    return None
 
 
 async def evaluate_opportunity(snapshot: FundingSnapshot) -> None:
@@ -39,17 +103,20 @@ async def evaluate_opportunity(snapshot: FundingSnapshot) -> None:
 
     exchange = snapshot.exchange
     symbol = snapshot.symbol
-    latest_rates[exchange][symbol] = snapshot
 
-    if "binance" not in latest_rates or "bitget" not in latest_rates:
+    # 与其它所有交易所比较，取费率差绝对值最大的一家配对
+    best: Optional[FundingSnapshot] = None
+    for other_exchange, rates in latest_rates.items():
+        if other_exchange == exchange:
+            continue
+        candidate = rates.get(symbol)
+        if candidate and (best is None or abs(snapshot.rate8h - candidate.rate8h) > abs(snapshot.rate8h - best.rate8h)):
+            best = candidate
+    if best is None:
         return
 
-    other_exchange = "bitget" if exchange == "binance" else "binance"
-    other_snapshot = latest_rates[other_exchange].get(symbol)
-    if not other_snapshot:
-        return
-
-    funding_diff = snapshot.rate8h - other_snapshot.rate8h
+    other_exchange = best.exchange
+    funding_diff = snapshot.rate8h - best.rate8h
     threshold = config.thresholds.aa
 
     if abs(funding_diff) < threshold:
@@ -83,32 +150,185 @@ async def evaluate_opportunity(snapshot: FundingSnapshot) -> None:
         logger.info("Published opportunity entry_id=%s", entry_id)
 
 
-async def process_entries(entries: List):
-    global last_id
-    for stream_name, stream_entries in entries:
-        for entry_id, fields in stream_entries:
-            snapshot = FundingSnapshot.from_stream(fields)
-            await evaluate_opportunity(snapshot)
-            last_id = entry_id
+def _entry_id(entry_id) -> str:
+    return entry_id.decode() if isinstance(entry_id, bytes) else str(entry_id)
+
+
+async def ensure_consumer_group(client: Redis) -> None:
+    # 新建的组从 "$" 开始：历史状态由最新值索引预热，不回放 stream；已有的组从上次确认的位置继续
+    try:
+        await client.xgroup_create(FUNDING_STREAM, GROUP_NAME, id="$", mkstream=True)
+        logger.info("Created consumer group %s on %s", GROUP_NAME, FUNDING_STREAM)
+    except Exception as exc:
+        if "BUSYGROUP" not in str(exc):
+            raise
+
+
+async def warm_load(client: Redis) -> None:
+    try:
+        latest = await load_latest(client, stream_key=FUNDING_STREAM)
+    except Exception as exc:
+        logger.warning("Warm load from latest-value index failed, start empty: %s", exc)
+        return
+    loaded = 0
+    for table in latest.values():
+        for snapshot in table.values():
+            if _load_indexed(snapshot):
+                loaded += 1
+    consumer_stats["warm_loaded"] = loaded
+    logger.info("Warm loaded %d funding snapshots from %d exchanges", loaded, len(latest))
+
+
+async def _refresh_counterparts(client: Redis, snapshots: List[FundingSnapshot]) -> None:
+    """多个实例分摊消息时，另一家交易所的更新可能由别的实例处理；配对前从最新值索引补齐。"""
+    own: Dict[str, Set[str]] = {}
+    for snapshot in snapshots:
+        own.setdefault(snapshot.symbol, set()).add(snapshot.exchange)
+    exchanges = set(latest_rates) | {snapshot.exchange for snapshot in snapshots}
+    # 只补其它交易所的值；本批消息自己的 key 以消息为准
+    pairs = [(exchange, symbol) for symbol, mine in own.items() for exchange in exchanges - mine]
+    if not pairs:
+        return
+    try:
+        latest = await get_latest(client, pairs, stream_key=FUNDING_STREAM)
+    except Exception as exc:
+        logger.warning("Refresh counterpart rates failed, use local state: %s", exc)
+        return
+    for snapshot in latest.values():
+        _load_indexed(snapshot)
+
+
+async def process_entries(client: Redis, entries: List) -> None:
+    """处理一批消息，处理完（或确定无法处理）的逐条 ACK；处理中途出错的留在 PEL 里等待接手。"""
+    decoded = []
+    done = []
+    for entry_id, fields in entries:
+        if not fields:
+            # 未确认期间已被 stream 保留策略裁掉
+            consumer_stats["skipped"] += 1
+            done.append(entry_id)
+            continue
+        try:
+            decoded.append((entry_id, decode_funding_entry(fields)))
+        except Exception as exc:
+            logger.warning("skip undecodable funding entry %s: %s", entry_id, exc)
+            consumer_stats["skipped"] += 1
+            done.append(entry_id)
+    try:
+        if decoded:
+            await _refresh_counterparts(client, [snapshot for _, snapshots in decoded for snapshot in snapshots])
+        for entry_id, snapshots in decoded:
+            # 列式帧一次带来整个交易所的一轮刷新，先全部更新再逐个评估，配对时看到的都是本轮的值
+            fresh = [accepted for accepted in map(_accept_entry, snapshots) if accepted is not None]
+            consumer_stats["stale"] += len(snapshots) - len(fresh)
+            for snapshot in fresh:
+                await evaluate_opportunity(snapshot)
+            consumer_stats["processed"] += len(snapshots)
+            consumer_stats["last_id"] = _entry_id(entry_id)
+            done.append(entry_id)
+    finally:
+        if done:
+            await client.xack(FUNDING_STREAM, GROUP_NAME, *done)
+            consumer_stats["acked"] += len(done)
+
+
+async def _drain_own_pending(client: Redis) -> None:
+    """同名实例重启：先把自己名下上次没确认的消息处理一遍。"""
+    start = "0"
+    while True:
+        reply = await client.xreadgroup(GROUP_NAME, CONSUMER_NAME, {FUNDING_STREAM: start}, count=READ_COUNT)
+        entries = reply[0][1] if reply else []
+        if not entries:
+            return
+        start = _entry_id(entries[-1][0])
+        await process_entries(client, entries)
+
+
+async def claim_stale(client: Redis, max_batches: int = 10) -> None:
+    """接手其它实例（已崩溃或卡住）空闲超过 claim_idle_secs 的未确认消息。"""
+    start = "0-0"
+    for _ in range(max_batches):
+        reply = await client.xautoclaim(
+            FUNDING_STREAM, GROUP_NAME, CONSUMER_NAME, CLAIM_IDLE_MS, start_id=start, count=READ_COUNT
+        )
+        start, entries = _entry_id(reply[0]), reply[1]
+        entries = [(entry_id, fields) for entry_id, fields in entries if entry_id is not None]
+        if entries:
+            consumer_stats["claimed"] += len(entries)
+            logger.info("Claimed %d idle funding entries", len(entries))
+            await process_entries(client, entries)
+        if start == "0-0":
+            return
+
+
+async def _remove_stale_consumers(client: Redis) -> None:
+    """删除组里其它空闲超过一小时、且名下没有未确认消息的 consumer（已下线或改名的实例）。"""
+    for consumer in await client.xinfo_consumers(FUNDING_STREAM, GROUP_NAME):
+        name = _entry_id(consumer["name"])
+        if name != CONSUMER_NAME and not consumer.get("pending") and consumer.get("idle", 0) > STALE_CONSUMER_MS:
+            await client.xgroup_delconsumer(FUNDING_STREAM, GROUP_NAME, name)
+            consumer_stats["consumers_removed"] += 1
+            logger.info("Removed idle consumer %s from %s", name, GROUP_NAME)
 
 
 async def consumer_loop():
     global redis_client
-    redis_client = Redis.from_url(settings.redis_url, decode_responses=True)
-    logger.info("Strategy consumer started, listening from %s", last_id)
+    # bytes 模式读取，compact 编码的条目才能解码
+    redis_client = Redis.from_url(settings.redis_url)
+    claim_interval = max(1.0, CLAIM_IDLE_MS / 1000 / 2)
+    started = False
     try:
+        next_claim = time.monotonic()
         while True:
-            entries = await redis_client.xread(
-                {"funding_snapshots": last_id},
-                count=100,
-                block=5000,
-            )
-            if entries:
-                await process_entries(entries)
+            try:
+                if not started:
+                    # 启动步骤也在重试范围内：Redis 暂时不可用时等它恢复，而不是让任务悄悄退出
+                    await ensure_consumer_group(redis_client)
+                    await warm_load(redis_client)
+                    await _drain_own_pending(redis_client)
+                    started = True
+                    logger.info("Strategy consumer %s started in group %s", CONSUMER_NAME, GROUP_NAME)
+                if time.monotonic() >= next_claim:
+                    await claim_stale(redis_client)
+                    await _remove_stale_consumers(redis_client)
+                    next_claim = time.monotonic() + claim_interval
+                entries = await redis_client.xreadgroup(
+                    GROUP_NAME,
+                    CONSUMER_NAME,
+                    {FUNDING_STREAM: ">"},
+                    count=READ_COUNT,
+                    block=int(min(5.0, claim_interval) * 1000),
+                )
+                for _, stream_entries in entries or []:
+                    await process_entries(redis_client, stream_entries)
+                consumer_stats["last_error"] = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                consumer_stats["last_error"] = str(exc) or type(exc).__name__
+                if started and "NOGROUP" in str(exc):
+                    # stream 被删除重建，消费组也要重建
+                    with contextlib.suppress(Exception):
+                        await ensure_consumer_group(redis_client)
+                    continue
+                logger.exception("Strategy consumer failed: %s", exc)
+                await asyncio.sleep(1.0)
     finally:
+        await _leave_group(redis_client)
         await redis_client.close()
 
 
+async def _leave_group(client: Redis) -> None:
+    """正常退出且名下没有未确认消息时删除 consumer；有未确认的留着，重启后由同名实例接着处理。"""
+    try:
+        for consumer in await client.xinfo_consumers(FUNDING_STREAM, GROUP_NAME):
+            name = _entry_id(consumer.get("name"))
+            if name == CONSUMER_NAME and not consumer.get("pending"):
+                await client.xgroup_delconsumer(FUNDING_STREAM, GROUP_NAME, CONSUMER_NAME)
+    except Exception as exc:
+        logger.warning("Leave consumer group failed: %s", exc)
+
+
 async def _config_listener():
     subscriber = ConfigSubscriber(settings.redis_url)
     await subscriber.start(apply_update)
@@ -117,16 +337,26 @@ async def _config_listener():
 
 @app.on_event("startup")
 async def on_startup():
-    global config_subscriber, config_task, opportunity_publisher
+    global config_subscriber, config_task, opportunity_publisher, consumer_task
     await load_initial()
     config_task = asyncio.create_task(_config_listener())
-    opportunity_publisher = OpportunityPublisher(settings.redis_url)
-    asyncio.create_task(consumer_loop())
+    opportunity_publisher = OpportunityPublisher(
+        settings.redis_url,
+        codec=settings.bus_codec,
+        retention=StreamRetention.from_settings(
+            settings, "opportunity_stream", retention_secs=6 * 3600.0, max_memory_mb=64.0
+        ),
+    )
+    consumer_task = asyncio.create_task(consumer_loop())
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
-    global config_subscriber, config_task, opportunity_publisher
+    global config_subscriber, config_task, opportunity_publisher, consumer_task
+    if consumer_task:
+        consumer_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await consumer_task
     if config_task:
         config_task.cancel()
         with contextlib.suppress(asyncio.CancelledError):
@@ -135,3 +365,25 @@ async def on_shutdown():
         await config_subscriber.stop()
     if opportunity_publisher:
         await opportunity_publisher.close()
+
+
+@app.get("/healthz")
+async def healthz():
+    health: Dict[str, Any] = {
+        "status": "ok",
+        "consumer": {"group": GROUP_NAME, "name": CONSUMER_NAME, **consumer_stats},
+    }
+    if redis_client:
+        try:
+            stats = await stream_stats(redis_client, FUNDING_STREAM)
+            health["consumer"]["group_state"] = next(
+                (group for group in stats["groups"] if group["name"] == GROUP_NAME), None
+            )
+        except Exception as exc:
+            health["consumer"]["group_state"] = {"error": str(exc) or type(exc).__name__}
+    if opportunity_publisher:
+        try:
+            health["opportunities"] = await opportunity_publisher.stream_stats()
+        except Exception as exc:
+            health["opportunities"] = {"error": str(exc) or type(exc).__name__}
+    return health